@@ -40,4 +40,10 @@ if [ ! -f "dist/index.js" ]; then
     exit 1
 fi
 
+# Memory-mapped chunk store the Python services read instead of parsing the JSON
+echo "Building chunk store..."
+python3 server/chunk_store.py build server/processed_chunks.json
+echo "Ranking case study context per illness..."
+python3 server/illness_index.py build server/processed_chunks.json
+
 echo "Build completed successfully!"
\ No newline at end of file
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Disk-backed answer cache for the Ghana STG RAG service.
+Stores generated answers in SQLite so repeat questions over the same guideline
+context skip the Mistral round trip, across restarts and worker processes.
+"""
+
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and reduce it to space-separated words."""
+    return ' '.join(re.findall(r'[a-z0-9]+', query.lower()))
+
+
+class AnswerCache:
+    """SQLite cache of generated answers with a TTL and a total size limit.
+
+    Entries are keyed on a hash of the normalized query, the retrieved chunk
+    ids, the model and the prompt template version, so a change to any of them
+    produces a fresh answer. When the stored answers exceed ``max_bytes`` the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets several worker processes share the file."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(query: str, chunk_ids: List[str], model: str, prompt_version: int) -> str:
+        payload = '\x1f'.join([normalize_query(query), ','.join(chunk_ids), model, str(prompt_version)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            now = time.time()
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"Error reading answer cache: {e}", file=sys.stderr)
+            return None
+
+    def put(self, key: str, answer: str) -> None:
+        try:
+            now = time.time()
+            size = len(answer.encode('utf-8'))
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers (key, answer, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, answer, size, now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Error writing answer cache: {e}", file=sys.stderr)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+                "SELECT key, size FROM answers ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
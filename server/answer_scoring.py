@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Local pre-scoring of case study answers for the Ghana STG case study service.
+Scores a student's diagnosis and treatment against the answer key by token
+overlap after synonym and spelling normalization, and by the drugs both name,
+so blank, exact and clearly wrong answers are scored without a Mistral call.
+Everything else, including any answer with a negation in it, is escalated to
+the LLM.
+"""
+
+import re
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Tuple, Optional, Set, Sequence
+from answer_cache import normalize_query
+from search_index import STOPWORDS
+
+# Abbreviations and alternative names -> the wording used for matching. Each
+# table applies only to its own field, since short abbreviations clash with
+# ordinary words in the other one ('cap' is a capsule in a treatment).
+DIAGNOSIS_SYNONYMS = {
+    'uti': 'urinary tract infection',
+    'pud': 'peptic ulcer disease',
+    'gerd': 'gastro esophageal reflux disease',
+    'gord': 'gastro esophageal reflux disease',
+    'gastroesophageal': 'gastro esophageal',
+    'dm': 'diabetes mellitus',
+    't1dm': 'type 1 diabetes mellitus',
+    't2dm': 'type 2 diabetes mellitus',
+    'dka': 'diabetic ketoacidosis',
+    'tb': 'tuberculosis',
+    'ptb': 'pulmonary tuberculosis',
+    'ra': 'rheumatoid arthritis',
+    'oa': 'osteoarthritis',
+    'jia': 'juvenile idiopathic arthritis',
+    'sti': 'sexually transmitted infection',
+    'std': 'sexually transmitted infection',
+    'aom': 'acute otitis media',
+    'csom': 'chronic otitis media',
+    'urti': 'upper respiratory tract infection',
+    'cap': 'community acquired pneumonia',
+    'anug': 'acute necrotizing ulcerative gingivitis',
+    'hsv': 'herpes simplex',
+    'shingles': 'herpes zoster',
+    'varicella': 'chicken pox',
+    'chickenpox': 'chicken pox',
+    'whooping cough': 'pertussis',
+    'nosebleed': 'epistaxis',
+    'hives': 'urticaria',
+    'tinea versicolor': 'pityriasis versicolor',
+    'enteric fever': 'typhoid fever',
+}
+
+# Abbreviations and brand names of drugs
+TREATMENT_SYNONYMS = {
+    'al': 'artemether lumefantrine',
+    'coartem': 'artemether lumefantrine',
+    'asaq': 'artesunate amodiaquine',
+    'acetaminophen': 'paracetamol',
+    'pcm': 'paracetamol',
+    'amoxil': 'amoxicillin',
+    'augmentin': 'amoxicillin clavulanate',
+    'co amoxiclav': 'amoxicillin clavulanate',
+    'clavulanic acid': 'clavulanate',
+    'flagyl': 'metronidazole',
+    'cipro': 'ciprofloxacin',
+    'septrin': 'cotrimoxazole',
+    'co trimoxazole': 'cotrimoxazole',
+    'oral rehydration salts': 'ors',
+    'oral rehydration solution': 'ors',
+    'albuterol': 'salbutamol',
+    'epinephrine': 'adrenaline',
+    'frusemide': 'furosemide',
+    'lignocaine': 'lidocaine',
+    'glibenclamide': 'glyburide',
+    'vitamin a': 'retinol',
+}
+
+# Drugs in the guidelines whose names the suffix pattern does not catch
+DRUG_NAMES = {
+    'artemether', 'lumefantrine', 'artesunate', 'amodiaquine', 'dihydroartemisinin', 'piperaquine',
+    'quinine', 'sulfadoxine', 'pyrimethamine', 'paracetamol', 'ibuprofen', 'aspirin', 'diclofenac',
+    'morphine', 'tramadol', 'codeine', 'metformin', 'insulin', 'glyburide', 'gliclazide',
+    'cotrimoxazole', 'clavulanate', 'gentamicin', 'streptomycin', 'doxycycline', 'tetracycline',
+    'chloramphenicol', 'nitrofurantoin', 'rifampicin', 'isoniazid', 'pyrazinamide', 'ethambutol',
+    'ors', 'zinc', 'loperamide', 'lactulose', 'bisacodyl', 'senna', 'retinol', 'folic', 'ferrous',
+    'albendazole', 'mebendazole', 'praziquantel', 'ivermectin', 'salbutamol', 'adrenaline',
+    'hydrocortisone', 'prednisolone', 'dexamethasone', 'chlorphenamine', 'promethazine',
+    'calamine', 'furosemide', 'lidocaine', 'nystatin', 'acyclovir', 'aciclovir', 'benzathine',
+    'penicillin', 'permethrin', 'allopurinol', 'colchicine', 'levothyroxine', 'carbimazole',
+    'propranolol', 'oxytocin', 'misoprostol', 'magnesium', 'omeprazole', 'ranitidine', 'antacid',
+    'hyoscine', 'sildenafil', 'chlorhexidine', 'silver', 'sulfadiazine', 'potassium', 'dextrose',
+}
+
+# Endings of drug class names: amoxicillin, azithromycin, fluconazole, ciprofloxacin, ...
+DRUG_SUFFIX_PATTERN = re.compile(
+    r'^cef\w+$|(?:cillin|mycin|micin|cycline|azole|floxacin|prazole|tidine|olol|pril|sartan|'
+    r'statin|dipine|vir|quine|sone|zepam|triptan|profen|gliptin|glitazone|thiazide|semide)$'
+)
+
+# Kept as terms although they are stopwords: "not malaria" must never match "malaria"
+NEGATIONS = {'not', 'no', 'non', 'nor', 'never', 'without', 'excluding', 'unlikely', 'negative'}
+
+def _synonym_pattern(synonyms: Dict[str, str]) -> re.Pattern:
+    return re.compile(
+        r'\b(' + '|'.join(re.escape(phrase) for phrase in sorted(synonyms, key=len, reverse=True)) + r')\b'
+    )
+
+_SYNONYMS = {
+    'diagnosis': (DIAGNOSIS_SYNONYMS, _synonym_pattern(DIAGNOSIS_SYNONYMS)),
+    'treatment': (TREATMENT_SYNONYMS, _synonym_pattern(TREATMENT_SYNONYMS)),
+}
+
+
+@lru_cache(maxsize=4096)
+def canonical_terms(text: str, field: str) -> Tuple[str, ...]:
+    """Normalized content terms and negations of a diagnosis or treatment answer.
+
+    Synonyms from the field's table and British spellings are folded.
+    """
+    synonyms, pattern = _SYNONYMS[field]
+    text = pattern.sub(lambda match: synonyms[match.group(1)], normalize_query(text))
+    terms = []
+    for token in text.split():
+        if token in NEGATIONS:
+            terms.append(token)
+            continue
+        if len(token) <= 1 or token in STOPWORDS:
+            continue
+        # anaemia/anemia, diarrhoea/diarrhea, oesophageal/esophageal, goitre/goiter
+        token = token.replace('ae', 'e').replace('oe', 'e')
+        token = re.sub(r'([^aeiou])re$', r'\1er', token)
+        if len(token) > 4 and token.endswith('s') and not token.endswith(('ss', 'is', 'us')):
+            token = token[:-1]
+        terms.append(token)
+    return tuple(terms)
+
+
+def drug_terms(terms: Sequence[str]) -> Set[str]:
+    return {term for term in terms if term in DRUG_NAMES or DRUG_SUFFIX_PATTERN.search(term)}
+
+
+class ScoreMemo:
+    """Bounded LRU of evaluations keyed on the answer key and the normalized student answers."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(correct_diagnosis: str, correct_treatment: str,
+            user_diagnosis: str, user_treatment: str) -> Tuple[str, str, str, str]:
+        return (correct_diagnosis, correct_treatment,
+                normalize_query(user_diagnosis), normalize_query(user_treatment))
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def put(self, key: Tuple, evaluation: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = dict(evaluation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class AnswerPrescorer:
+    """Scores answers locally and says whether the score is clear-cut enough to keep.
+
+    The diagnosis scores the F1 of its terms against the key's. The
+    treatment scores DRUG_WEIGHT times the F1 of the drugs named (when the
+    key names any) plus the rest times the share of the key's terms the
+    student gave. A blank field scores 0, and a score of at least HIGH_SCORE
+    is kept. Low scores are only kept for a treatment naming recognised
+    drugs, none of them in the key; a low diagnosis may be a related
+    condition and an unrecognised treatment may be a drug class ("ACT"), so
+    both go to the LLM for partial credit. A submission is decided when both
+    fields are and neither answer contains a negation.
+    """
+
+    LOW_SCORE = 10
+    HIGH_SCORE = 90
+    DRUG_WEIGHT = 0.6
+
+    def prescore(self, correct_diagnosis: str, correct_treatment: str,
+                 user_diagnosis: str, user_treatment: str) -> Optional[Dict[str, Any]]:
+        """A local evaluation for a clear-cut submission, or None to escalate it."""
+        if NEGATIONS.intersection(canonical_terms(user_diagnosis, 'diagnosis')
+                                  + canonical_terms(user_treatment, 'treatment')):
+            return None
+        diagnosis = self.score_diagnosis(correct_diagnosis, user_diagnosis)
+        treatment = self.score_treatment(correct_treatment, user_treatment)
+        if diagnosis is None or treatment is None:
+            return None
+        return {
+            "diagnosis_score": diagnosis[0],
+            "treatment_score": treatment[0],
+            "feedback": f"{diagnosis[1]}\n{treatment[1]}"
+        }
+
+    def score_diagnosis(self, correct: str, answer: str) -> Optional[Tuple[int, str]]:
+        key_terms, terms = set(canonical_terms(correct, 'diagnosis')), set(canonical_terms(answer, 'diagnosis'))
+        if not terms:
+            return 0, "Diagnosis: no diagnosis was given."
+        if not key_terms:
+            return None
+        score = round(100 * self._f1(terms & key_terms, terms, key_terms))
+        if score >= self.HIGH_SCORE:
+            return score, f"Diagnosis: correct, this is {correct}."
+        return None
+
+    def score_treatment(self, correct: str, answer: str) -> Optional[Tuple[int, str]]:
+        key_terms, terms = canonical_terms(correct, 'treatment'), canonical_terms(answer, 'treatment')
+        if not terms:
+            return 0, "Treatment: no treatment was given."
+        if not key_terms:
+            return None
+        key_drugs, drugs = drug_terms(key_terms), drug_terms(terms)
+        coverage = len(set(terms) & set(key_terms)) / len(set(key_terms))
+        if key_drugs:
+            drug_f1 = self._f1(drugs & key_drugs, drugs, key_drugs)
+            score = round(100 * (self.DRUG_WEIGHT * drug_f1 + (1 - self.DRUG_WEIGHT) * coverage))
+        else:
+            score = round(100 * coverage)
+        if score >= self.HIGH_SCORE:
+            return score, "Treatment: matches the Ghana STG protocol."
+        if score <= self.LOW_SCORE and drugs and key_drugs and not (drugs & key_drugs):
+            return score, ("Treatment: does not match the Ghana STG protocol, which uses "
+                           f"{', '.join(sorted(key_drugs))}.")
+        return None
+
+    @staticmethod
+    def _f1(matched: Set[str], answer: Set[str], key: Set[str]) -> float:
+        if not matched:
+            return 0.0
+        precision, recall = len(matched) / len(answer), len(matched) / len(key)
+        return 2 * precision * recall / (precision + recall)
+
+
+def main():
+    if len(sys.argv) != 5:
+        print("Usage: python answer_scoring.py <correct_diagnosis> <correct_treatment> "
+              "<user_diagnosis> <user_treatment>")
+        sys.exit(1)
+    prescorer = AnswerPrescorer()
+    print(f"diagnosis: {prescorer.score_diagnosis(sys.argv[1], sys.argv[3])}")
+    print(f"treatment: {prescorer.score_treatment(sys.argv[2], sys.argv[4])}")
+    print(f"decided: {prescorer.prescore(*sys.argv[1:5]) is not None}")
+
+if __name__ == "__main__":
+    main()
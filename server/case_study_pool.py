@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Pre-generated case study pool for the Ghana STG case study service.
+Keeps ready-made case studies per illness in SQLite so the generate path can
+serve one immediately instead of waiting on two Mistral round trips, and
+records which cases each session has seen so nobody is shown a case twice.
+"""
+
+import sys
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+
+
+class CaseStudyPool:
+    """SQLite store of generated case studies, each served fresh once and then reusable.
+
+    ``claim`` prefers cases nobody has been served yet; when those run out it
+    falls back to cases other sessions have seen but this one has not. Cases
+    older than ``max_age_seconds`` are dropped, since the guidelines they were
+    written from may have changed.
+    """
+
+    def __init__(self, path: str, max_age_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    illness TEXT NOT NULL,
+                    case_description TEXT NOT NULL,
+                    correct_diagnosis TEXT NOT NULL,
+                    correct_treatment TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    served_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cases_fresh ON cases (illness, served_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen (
+                    session_id TEXT NOT NULL,
+                    case_id INTEGER NOT NULL,
+                    seen_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, case_id)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets the refill worker and generators share the file."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, case_study: Dict[str, Any], seen_by: Optional[str] = None) -> None:
+        """Store a generated case; with seen_by it counts as already served to that session."""
+        try:
+            now = time.time()
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO cases (illness, case_description, correct_diagnosis, correct_treatment, "
+                    "created_at, served_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (case_study['illness'], case_study['case_description'], case_study['correct_diagnosis'],
+                     case_study['correct_treatment'], now, now if seen_by else None)
+                )
+                if seen_by:
+                    conn.execute("INSERT OR IGNORE INTO seen (session_id, case_id, seen_at) VALUES (?, ?, ?)",
+                                 (seen_by, cursor.lastrowid, now))
+        except sqlite3.Error as e:
+            print(f"Error writing case study pool: {e}", file=sys.stderr)
+
+    def claim(self, session_id: Optional[str] = None, illness: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Take a case the session has not seen, unserved ones first, or None if there is none."""
+        try:
+            now = time.time()
+            conn = self._connect()
+            # Take the write lock up front so two generators cannot claim the same fresh case
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM cases WHERE created_at < ?", (now - self.max_age_seconds,))
+                query = ("SELECT id, illness, case_description, correct_diagnosis, correct_treatment "
+                         "FROM cases WHERE id NOT IN (SELECT case_id FROM seen WHERE session_id = ?)")
+                params: List[Any] = [session_id or '']
+                if illness:
+                    query += " AND illness = ?"
+                    params.append(illness)
+                row = conn.execute(query + " ORDER BY served_at IS NOT NULL, RANDOM() LIMIT 1",
+                                   params).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE cases SET served_at = COALESCE(served_at, ?) WHERE id = ?", (now, row[0]))
+                    if session_id:
+                        conn.execute("INSERT OR IGNORE INTO seen (session_id, case_id, seen_at) VALUES (?, ?, ?)",
+                                     (session_id, row[0], now))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"Error reading case study pool: {e}", file=sys.stderr)
+            return None
+        if row is None:
+            return None
+        return {
+            "illness": row[1],
+            "case_description": row[2],
+            "correct_diagnosis": row[3],
+            "correct_treatment": row[4]
+        }
+
+    def fresh_counts(self) -> Dict[str, int]:
+        """Unserved, unexpired cases per illness."""
+        with self._connect() as conn:
+            return dict(conn.execute(
+                "SELECT illness, COUNT(*) FROM cases WHERE served_at IS NULL AND created_at >= ? GROUP BY illness",
+                (time.time() - self.max_age_seconds,)
+            ).fetchall())
+
+    def neediest(self, illnesses: List[str], depth: int) -> Optional[str]:
+        """The illness furthest below depth fresh cases, or None when all are topped up."""
+        counts = self.fresh_counts()
+        illness = min(illnesses, key=lambda name: counts.get(name, 0), default=None)
+        if illness is None or counts.get(illness, 0) >= depth:
+            return None
+        return illness
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            total, fresh = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(served_at IS NULL), 0) FROM cases").fetchone()
+            sessions = conn.execute("SELECT COUNT(DISTINCT session_id) FROM seen").fetchone()[0]
+        return {'cases': total, 'fresh': fresh, 'sessions': sessions}
@@ -4,12 +4,24 @@ Case Study Generator service for Ghana Standard Treatment Guidelines.
 Generates realistic medical case studies and evaluates student answers using Mistral AI.
 """
 
+import time
+# First, so every import below counts towards the 'imports' stage
+_IMPORT_START = time.perf_counter()
 import os
 import sys
 import json
 import random
-from typing import List, Dict, Any, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Sequence
 import re
+from answer_cache import normalize_query
+from answer_scoring import AnswerPrescorer, ScoreMemo
+from chunk_store import load_chunks
+from case_study_pool import CaseStudyPool
+from illness_index import IllnessIndex, ILLNESSES
+from llm_client import get_client
+from metrics import Timings, metrics_log, prompt_log_rate, log_prompt
 try:
     from mistralai.client import MistralClient
     from mistralai.models.chat_completion import ChatMessage
@@ -21,91 +33,135 @@ except ImportError:
     except ImportError:
         MISTRAL_AVAILABLE = False
 
+# Seconds the refill worker waits before re-checking a topped-up pool
+POOL_IDLE_SECONDS = 30
+
+
+def _exit_when_stdin_closes() -> None:
+    """Stop a watching refill worker once the server that spawned it goes away."""
+    for _ in sys.stdin:
+        pass
+    os._exit(0)
+
+
 class CaseStudyGenerator:
     def __init__(self):
         if MISTRAL_AVAILABLE and os.getenv('MISTRAL_CASE_STUDY_API_KEY'):
             try:
-                self.mistral_client = MistralClient(
-                    api_key=os.getenv('MISTRAL_CASE_STUDY_API_KEY')
-                )
+                # Shared per process: pooled connections, deadlines, retries and a circuit breaker
+                self.mistral_client = get_client(os.getenv('MISTRAL_CASE_STUDY_API_KEY'))
             except Exception as e:
                 print(f"Error initializing Mistral client for case studies: {e}", file=sys.stderr)
                 self.mistral_client = None
         else:
             self.mistral_client = None
+        self.prompt_log_rate = prompt_log_rate()
+        # Runs the case description and answer key requests concurrently
+        self.llm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='case-study')
         
         # Load medical knowledge base
         self.chunks_file = os.path.join(os.path.dirname(__file__), 'processed_chunks.json')
         self.chunks_data = self.load_chunks_data()
         
         # Curated list of illnesses for case study generation
-        self.illnesses = [
-            "Diarrhoea", "Rotavirus Disease and Diarrhoea", "Constipation", "Peptic Ulcer Disease",
-            "Gastro-oesophageal Reflux Disease", "Haemorrhoids", "Vomiting", "Anaemia", "Measles",
-            "Pertussis", "Common cold", "Pneumonia", "Headache", "Boils", "Impetigo", "Buruli ulcer",
-            "Yaws", "Superficial Fungal Skin infections", "Pityriasis Versicolor", "Herpes Simplex Infections",
-            "Herpes Zoster Infections", "Chicken pox", "Large Chronic Ulcers", "Pruritus", "Urticaria",
-            "Reactive Erythema and Bullous Reaction", "Acne Vulgaris", "Eczema", "Intertrigo",
-            "Diabetes Mellitus", "Diabetic Ketoacidosis", "Diabetes in Pregnancy", "Treatment-Induced Hypoglycemia",
-            "Dyslipidaemia", "Goitre", "Hypothyroidism", "Hyperthyroidism", "Overweight and Obesity",
-            "Dysmenorrhoea", "Abortion", "Abnormal Vaginal Bleeding", "Abnormal Vaginal Discharge",
-            "Acute Lower Abdominal Pain", "Menopause", "Erectile Dysfunction", "Urinary Tract Infection",
-            "Sexually Transmitted Infections in Adults", "STI-related Urethral Discharge in Males",
-            "Mycoplasma genitalum", "STI-related Persistent or Recurrent Urethral Discharge",
-            "STI-related Vaginal Discharge", "STI-related Lower Abdominal Pain in Women",
-            "STI-related Genital Ulcer", "STI-related Scrotal Swelling", "STI-related Inguinal Bubo",
-            "STI-related Genital Warts", "STI-related Ano-rectal Related Syndromes", "Fever",
-            "Tuberculosis", "Typhoid fever", "Malaria", "Uncomplicated Malaria", "Severe Malaria",
-            "Malaria in Pregnancy", "Worm Infestation", "Xerophthalmia", "Foreign body in the eye",
-            "Neonatal conjunctivitis", "Red eye", "Stridor", "Acute Epiglottitis", "Retropharyngeal Abscess",
-            "Pharyngitis and Tonsillitis", "Acute Sinusitis", "Acute otitis Media", "Chronic Otitis Media",
-            "Epistaxis", "Dental Caries", "Oral Candidiasis", "Acute Necrotizing Ulcerative Gingivitis",
-            "Acute Bacterial Sialoadenitis", "Chronic Periodontal Infections", "Mouth Ulcers",
-            "Odontogenic Infections", "Osteoarthritis", "Rheumatoid arthritis", "Juvenile Idiopathic Arthritis",
-            "Back pain", "Gout", "Dislocations", "Open Fractures", "Cellulitis", "Burns", "Wounds",
-            "Bites and Stings", "Shock", "Acute Allergic Reaction"
-        ]
-
-    def load_chunks_data(self) -> List[Dict[str, Any]]:
-        """Load processed chunks from local JSON file."""
+        self.illnesses = list(ILLNESSES)
+        
+        # Best guideline chunks per illness, ranked at ingest
+        self.illness_index = None
+        if self.chunks_data:
+            self.illness_index = IllnessIndex.load(self.chunks_data, self.chunks_file, self.illnesses)
+        
+        # Ready-made case studies filled by the refill worker (CASE_STUDY_POOL=off disables)
+        self.case_pool = None
+        if os.getenv('CASE_STUDY_POOL', 'on').lower() not in ('off', 'false', '0'):
+            try:
+                self.case_pool = CaseStudyPool(
+                    os.getenv('CASE_STUDY_POOL_PATH',
+                              os.path.join(os.path.dirname(__file__), 'case_pool.sqlite3')),
+                    max_age_seconds=float(os.getenv('CASE_STUDY_POOL_MAX_AGE', str(30 * 24 * 3600)))
+                )
+            except Exception as e:
+                print(f"Error opening case study pool: {e}", file=sys.stderr)
+        
+        # Clear-cut answers are scored locally (CASE_STUDY_PRESCORE=off sends all to Mistral)
+        self.prescorer = None
+        if os.getenv('CASE_STUDY_PRESCORE', 'on').lower() not in ('off', 'false', '0'):
+            self.prescorer = AnswerPrescorer()
+        self.score_memo = ScoreMemo(int(os.getenv('CASE_STUDY_EVAL_CACHE_SIZE', '1024')))
+
+    def load_chunks_data(self) -> Sequence[Dict[str, Any]]:
+        """Load processed chunks from the memory-mapped store, or the local JSON file."""
         try:
-            if os.path.exists(self.chunks_file):
-                with open(self.chunks_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return load_chunks(self.chunks_file)
         except Exception as e:
             print(f"Error loading chunks data: {e}", file=sys.stderr)
         return []
 
     def get_relevant_medical_context(self, illness: str) -> List[Dict[str, Any]]:
-        """Retrieve relevant medical context for the specified illness."""
-        relevant_chunks = []
-        illness_lower = illness.lower()
-        
-        for chunk in self.chunks_data:
-            content_lower = chunk.get('content', '').lower()
-            title_lower = chunk.get('title', '').lower()
-            
-            # Check for exact illness match or related keywords
-            if (illness_lower in content_lower or 
-                illness_lower in title_lower or
-                any(word in content_lower for word in illness_lower.split())):
-                relevant_chunks.append(chunk)
-        
-        # Sort by relevance and return top chunks
-        return relevant_chunks[:5]
+        """Retrieve the guideline chunks most relevant to the specified illness."""
+        if self.illness_index is None:
+            return []
+        return [self.chunks_data[position] for position in self.illness_index.lookup(illness)]
 
-    def generate_case_study(self, illness: str = None) -> Dict[str, Any]:
-        """Generate a realistic case study for the specified illness."""
+    def generate_case_study(self, illness: str = None, timings: Timings = None,
+                            session_id: str = None) -> Dict[str, Any]:
+        """Generate a realistic case study for the specified illness.
+
+        A pooled case the session has not seen is served when available;
+        otherwise one is generated now. The result carries a ``timings`` block
+        with per-stage milliseconds, a ``source`` of pool, llm or fallback and
+        a ``key_source`` saying whether the answer key came from llm or fallback.
+        """
+        timings = timings or Timings()
+        result = None
+        if self.case_pool:
+            with timings.span('pool'):
+                result = self.case_pool.claim(session_id, illness)
+            if result is not None:
+                # Only cases with a generated answer key are pooled
+                result['source'], result['key_source'] = 'pool', 'llm'
+        if result is None:
+            result = self._generate_case_study(illness, timings)
+            if self.case_pool and result['source'] == 'llm' and result['key_source'] == 'llm':
+                # Reusable by other sessions once the fresh ones run out; cases
+                # with the template answer key are served once and not kept
+                self.case_pool.add(result, seen_by=session_id)
+        result['timings'] = timings.as_dict()
+        metrics_log.record('case_study', timings, illness=result['illness'], source=result['source'],
+                           key_source=result['key_source'])
+        return result
+
+    def _generate_case_study(self, illness: str, timings: Timings) -> Dict[str, Any]:
         if not illness:
             illness = random.choice(self.illnesses)
         
+        if self.mistral_client:
+            try:
+                result = self._generate_llm_case_study(illness, timings)
+                result['source'] = 'llm'
+                return result
+            except Exception as e:
+                print(f"Error generating case study with Mistral: {e}", file=sys.stderr)
+        
+        # Fallback case study generation
+        result = self._generate_fallback_case_study(illness)
+        result['source'] = result['key_source'] = 'fallback'
+        return result
+
+    def _generate_llm_case_study(self, illness: str, timings: Timings,
+                                 require_answer_key: bool = False) -> Dict[str, Any]:
+        """Generate a case study and its answer key with Mistral, raising on failure.
+
+        If only the answer key fails, the fallback key is used (and
+        ``key_source`` is fallback rather than llm) unless require_answer_key
+        is set.
+        """
         # Get relevant medical context
-        context_chunks = self.get_relevant_medical_context(illness)
+        with timings.span('context'):
+            context_chunks = self.get_relevant_medical_context(illness)
         context_text = "\n\n".join([chunk.get('content', '') for chunk in context_chunks[:3]])
         
-        if self.mistral_client:
-            try:
-                prompt = f"""
+        prompt = f"""
 Generate a concise medical case study for pharmacists based on Ghana Standard Treatment Guidelines.
 
 Medical Context:
@@ -126,38 +182,92 @@ Requirements:
 
 Format exactly as shown above with clear section headers.
 """
+        log_prompt(prompt, self.prompt_log_rate, "Case Study Prompt")
 
+        # Both calls depend only on the illness and its context, so they run
+        # side by side under one deadline
+        expires = time.monotonic() + self.mistral_client.deadline
+
+        def remaining() -> float:
+            return max(0.0, expires - time.monotonic())
+
+        def describe_case() -> str:
+            with timings.span('case_llm'):
                 response = self.mistral_client.chat(
                     model="mistral-large-latest",
                     messages=[ChatMessage(role="user", content=prompt)],
-                    max_tokens=300
+                    max_tokens=300,
+                    deadline=remaining()
                 )
-                
-                case_description = response.choices[0].message.content.strip()
-                
-                # Generate correct answers
-                diagnosis, treatment = self._generate_correct_answers(illness, context_chunks)
-                
-                return {
-                    "illness": illness,
-                    "case_description": case_description,
-                    "correct_diagnosis": diagnosis,
-                    "correct_treatment": treatment
-                }
-                
+            return response.choices[0].message.content.strip()
+
+        def answer_key() -> Tuple[str, str]:
+            with timings.span('answers_llm'):
+                return self._generate_correct_answers(illness, context_chunks, remaining())
+
+        case_future = self.llm_executor.submit(describe_case)
+        answers_future = self.llm_executor.submit(answer_key)
+        with timings.span('llm'):
+            case_description = case_future.result(timeout=remaining())
+            try:
+                diagnosis, treatment = answers_future.result(timeout=remaining())
+                key_source = 'llm'
             except Exception as e:
-                print(f"Error generating case study with Mistral: {e}", file=sys.stderr)
+                if require_answer_key:
+                    raise
+                print(f"Error generating correct answers: {e}", file=sys.stderr)
+                diagnosis, treatment = illness, f"Standard treatment for {illness} as per Ghana STG"
+                key_source = 'fallback'
         
-        # Fallback case study generation
-        return self._generate_fallback_case_study(illness)
+        return {
+            "illness": illness,
+            "case_description": case_description,
+            "correct_diagnosis": diagnosis,
+            "correct_treatment": treatment,
+            "key_source": key_source
+        }
+
+    def refill_case_pool(self, depth: int, cases_per_minute: float, watch: bool = False) -> int:
+        """Top every illness up to depth fresh pooled cases, pacing the Mistral calls.
+
+        Failures back off exponentially (up to 5 minutes), which also waits out
+        rate limiting and an open circuit breaker. Returns the number of cases
+        added; with watch set, keeps topping up instead of returning.
+        """
+        if not self.case_pool or not self.mistral_client:
+            print("Case study pool refill needs the pool and a Mistral API key", file=sys.stderr)
+            return 0
+        interval = 60.0 / cases_per_minute if cases_per_minute > 0 else 0.0
+        backoff = max(interval, 1.0)
+        added = 0
+        while True:
+            illness = self.case_pool.neediest(self.illnesses, depth)
+            if illness is None:
+                if not watch:
+                    return added
+                time.sleep(POOL_IDLE_SECONDS)
+                continue
+            started = time.monotonic()
+            try:
+                timings = Timings()
+                # Pooled cases live for weeks, so only complete ones are kept
+                self.case_pool.add(self._generate_llm_case_study(illness, timings, require_answer_key=True))
+                metrics_log.record('case_pool_refill', timings, illness=illness)
+                added += 1
+                backoff = max(interval, 1.0)
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+            except Exception as e:
+                print(f"Error refilling case study pool ({illness}): {e}; retrying in {backoff:.0f}s",
+                      file=sys.stderr)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 300.0)
 
-    def _generate_correct_answers(self, illness: str, context_chunks: List[Dict[str, Any]]) -> Tuple[str, str]:
-        """Generate correct diagnosis and treatment based on medical guidelines."""
+    def _generate_correct_answers(self, illness: str, context_chunks: List[Dict[str, Any]],
+                                  deadline: float = None) -> Tuple[str, str]:
+        """Generate correct diagnosis and treatment based on medical guidelines, raising on failure."""
         context_text = "\n\n".join([chunk.get('content', '') for chunk in context_chunks[:3]])
         
-        if self.mistral_client:
-            try:
-                prompt = f"""
+        prompt = f"""
 Based on the Ghana Standard Treatment Guidelines, provide:
 
 1. DIAGNOSIS: The correct medical diagnosis for {illness}
@@ -172,28 +282,25 @@ TREATMENT: [detailed treatment protocol]
 
 Be specific and follow the exact guidelines provided in the context.
 """
+        log_prompt(prompt, self.prompt_log_rate, "Answer Key Prompt")
 
-                response = self.mistral_client.chat(
-                    model="mistral-large-latest",
-                    messages=[ChatMessage(role="user", content=prompt)],
-                    max_tokens=400
-                )
-                
-                content = response.choices[0].message.content.strip()
-                
-                # Parse diagnosis and treatment
-                diagnosis_match = re.search(r'DIAGNOSIS:\s*(.+?)(?=TREATMENT:|$)', content, re.IGNORECASE | re.DOTALL)
-                treatment_match = re.search(r'TREATMENT:\s*(.+)', content, re.IGNORECASE | re.DOTALL)
-                
-                diagnosis = diagnosis_match.group(1).strip() if diagnosis_match else illness
-                treatment = treatment_match.group(1).strip() if treatment_match else "Standard treatment as per Ghana STG"
-                
-                return diagnosis, treatment
-                
-            except Exception as e:
-                print(f"Error generating correct answers: {e}", file=sys.stderr)
+        response = self.mistral_client.chat(
+            model="mistral-large-latest",
+            messages=[ChatMessage(role="user", content=prompt)],
+            max_tokens=400,
+            deadline=deadline
+        )
+        
+        content = response.choices[0].message.content.strip()
+        
+        # Parse diagnosis and treatment
+        diagnosis_match = re.search(r'DIAGNOSIS:\s*(.+?)(?=TREATMENT:|$)', content, re.IGNORECASE | re.DOTALL)
+        treatment_match = re.search(r'TREATMENT:\s*(.+)', content, re.IGNORECASE | re.DOTALL)
+        
+        diagnosis = diagnosis_match.group(1).strip() if diagnosis_match else illness
+        treatment = treatment_match.group(1).strip() if treatment_match else "Standard treatment as per Ghana STG"
         
-        return illness, f"Standard treatment for {illness} as per Ghana STG"
+        return diagnosis, treatment
 
     def _generate_fallback_case_study(self, illness: str) -> Dict[str, Any]:
         """Generate a fallback case study when Mistral is unavailable."""
@@ -215,11 +322,102 @@ Be specific and follow the exact guidelines provided in the context.
 
     def evaluate_answers(self, correct_diagnosis: str, correct_treatment: str, 
                         user_diagnosis: str, user_treatment: str) -> Dict[str, Any]:
-        """Evaluate user answers and provide scoring and feedback."""
+        """Evaluate user answers and provide scoring and feedback.
+
+        Answers seen before for the same answer key come from the memo; blank,
+        exact and clearly wrong answers are scored locally; the rest go to
+        Mistral. The result's ``source`` is memo, local, llm or fallback.
+        """
+        key = ScoreMemo.key(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment)
+        result = self.score_memo.get(key)
+        if result is not None:
+            result['source'] = 'memo'
+            return result
+        
+        if self.prescorer:
+            result = self.prescorer.prescore(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment)
+            if result is not None:
+                result['source'] = 'local'
+                self.score_memo.put(key, result)
+                return result
         
         if self.mistral_client:
             try:
-                prompt = f"""
+                result = self._evaluate_with_llm(correct_diagnosis, correct_treatment,
+                                                 user_diagnosis, user_treatment)
+                result['source'] = 'llm'
+                self.score_memo.put(key, result)
+                return result
+            except Exception as e:
+                print(f"Error evaluating answers: {e}", file=sys.stderr)
+        
+        # Fallback evaluation, not memoized so the next attempt can reach Mistral
+        result = self._fallback_evaluation(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment)
+        result['source'] = 'fallback'
+        return result
+
+    def evaluate_batch(self, submissions: List[Dict[str, Any]],
+                       max_concurrency: int = None) -> List[Dict[str, Any]]:
+        """Evaluate many submissions at once, returning one result per submission in order.
+
+        Each submission carries ``correct_diagnosis``, ``correct_treatment``,
+        ``user_diagnosis``, ``user_treatment`` and an optional ``id``.
+        Submissions are grouped by case and identical answers (after
+        normalization) to the same case are scored once; the distinct
+        evaluations then run on a bounded thread pool
+        (CASE_STUDY_EVAL_CONCURRENCY, default 8), where only the ambiguous
+        ones wait on Mistral. Results carry the ``id`` and the ``source`` given
+        by ``evaluate_answers``; invalid submissions, and those whose evaluation
+        raised, get an ``error`` instead.
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('CASE_STUDY_EVAL_CONCURRENCY', '8'))
+        timings = Timings()
+        fields = ('correct_diagnosis', 'correct_treatment', 'user_diagnosis', 'user_treatment')
+        results: List[Dict[str, Any]] = [None] * len(submissions)
+        # case -> normalized answers -> positions of the submissions that gave them
+        cases: Dict[Tuple[str, str], Dict[Tuple[str, str], List[int]]] = {}
+        for position, submission in enumerate(submissions):
+            submission_id = submission.get('id', position) if isinstance(submission, dict) else position
+            if not isinstance(submission, dict) or not all(isinstance(submission.get(field), str)
+                                                           for field in fields):
+                results[position] = {'id': submission_id,
+                                     'error': f"Submission needs string fields: {', '.join(fields)}"}
+                continue
+            answers = cases.setdefault((submission['correct_diagnosis'], submission['correct_treatment']), {})
+            key = (normalize_query(submission['user_diagnosis']), normalize_query(submission['user_treatment']))
+            answers.setdefault(key, []).append(position)
+
+        def evaluate(position: int) -> Dict[str, Any]:
+            return self.evaluate_answers(*(submissions[position][field] for field in fields))
+
+        # The first submission of each distinct answer is evaluated on behalf of the rest
+        groups = [positions for answers in cases.values() for positions in answers.values()]
+        escalated = failed = 0
+        with timings.span('evaluate'):
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency),
+                                    thread_name_prefix='case-study-eval') as executor:
+                futures = [executor.submit(evaluate, positions[0]) for positions in groups]
+                for positions, future in zip(groups, futures):
+                    try:
+                        evaluation = future.result()
+                        escalated += evaluation['source'] in ('llm', 'fallback')
+                    except Exception as e:
+                        # Only the submissions sharing this answer are affected
+                        print(f"Error evaluating batch submission {submissions[positions[0]].get('id')}: {e}",
+                              file=sys.stderr)
+                        evaluation = {'error': f"Evaluation failed: {e}"}
+                        failed += 1
+                    for position in positions:
+                        results[position] = {'id': submissions[position].get('id', position), **evaluation}
+        metrics_log.record('case_study_evaluate_batch', timings, submissions=len(submissions),
+                           evaluations=len(groups), escalated=escalated, failed=failed, cases=len(cases))
+        return results
+
+    def _evaluate_with_llm(self, correct_diagnosis: str, correct_treatment: str,
+                           user_diagnosis: str, user_treatment: str) -> Dict[str, Any]:
+        """Score answers with Mistral, raising on failure."""
+        prompt = f"""
 Evaluate the following medical student answers against the correct answers from Ghana Standard Treatment Guidelines:
 
 CORRECT DIAGNOSIS: {correct_diagnosis}
@@ -240,35 +438,30 @@ FEEDBACK: [detailed feedback]
 
 Be fair but thorough in evaluation. Consider partial credit for related conditions or alternative valid treatments.
 """
+        log_prompt(prompt, self.prompt_log_rate, "Evaluation Prompt")
 
-                response = self.mistral_client.chat(
-                    model="mistral-large-latest",
-                    messages=[ChatMessage(role="user", content=prompt)],
-                    max_tokens=600
-                )
-                
-                content = response.choices[0].message.content.strip()
-                
-                # Parse scores and feedback
-                diag_score_match = re.search(r'DIAGNOSIS_SCORE:\s*(\d+)', content, re.IGNORECASE)
-                treat_score_match = re.search(r'TREATMENT_SCORE:\s*(\d+)', content, re.IGNORECASE)
-                feedback_match = re.search(r'FEEDBACK:\s*(.+)', content, re.IGNORECASE | re.DOTALL)
-                
-                diagnosis_score = int(diag_score_match.group(1)) if diag_score_match else 0
-                treatment_score = int(treat_score_match.group(1)) if treat_score_match else 0
-                feedback = feedback_match.group(1).strip() if feedback_match else "Evaluation completed."
-                
-                return {
-                    "diagnosis_score": diagnosis_score,
-                    "treatment_score": treatment_score,
-                    "feedback": feedback
-                }
-                
-            except Exception as e:
-                print(f"Error evaluating answers: {e}", file=sys.stderr)
+        response = self.mistral_client.chat(
+            model="mistral-large-latest",
+            messages=[ChatMessage(role="user", content=prompt)],
+            max_tokens=600
+        )
+        
+        content = response.choices[0].message.content.strip()
         
-        # Fallback evaluation
-        return self._fallback_evaluation(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment)
+        # Parse scores and feedback
+        diag_score_match = re.search(r'DIAGNOSIS_SCORE:\s*(\d+)', content, re.IGNORECASE)
+        treat_score_match = re.search(r'TREATMENT_SCORE:\s*(\d+)', content, re.IGNORECASE)
+        feedback_match = re.search(r'FEEDBACK:\s*(.+)', content, re.IGNORECASE | re.DOTALL)
+        
+        diagnosis_score = int(diag_score_match.group(1)) if diag_score_match else 0
+        treatment_score = int(treat_score_match.group(1)) if treat_score_match else 0
+        feedback = feedback_match.group(1).strip() if feedback_match else "Evaluation completed."
+        
+        return {
+            "diagnosis_score": diagnosis_score,
+            "treatment_score": treatment_score,
+            "feedback": feedback
+        }
 
     def _fallback_evaluation(self, correct_diagnosis: str, correct_treatment: str,
                            user_diagnosis: str, user_treatment: str) -> Dict[str, Any]:
@@ -291,18 +484,129 @@ For detailed feedback, please ensure the AI service is properly configured.
             "feedback": feedback
         }
 
+def read_submissions(path: str) -> List[Dict[str, Any]]:
+    """Read evaluation submissions from a JSONL file ('-' for stdin), skipping invalid lines."""
+    submissions = []
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                submission = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping invalid batch line: {e}", file=sys.stderr)
+                continue
+            if isinstance(submission, dict) and 'id' not in submission:
+                submission['id'] = len(submissions)
+            submissions.append(submission)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return submissions
+
+def serve(generator: CaseStudyGenerator, workers: int = 4) -> None:
+    """Answer newline-delimited JSON requests from stdin until EOF.
+
+    Each request is ``{"id": ..., "command": ...}`` with command ``generate``
+    (optional ``illness`` and ``session_id``), ``evaluate`` (the four answer
+    fields), ``evaluate_batch`` (a ``submissions`` list) or ``stats``. Each
+    response line is ``{"id": ..., "result": {...}}`` or
+    ``{"id": ..., "error": "..."}``. Up to ``workers`` requests are handled
+    concurrently, so responses may arrive out of order and must be matched
+    on ``id``.
+    """
+    write_lock = threading.Lock()
+
+    def emit(message: Dict[str, Any]) -> None:
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def handle(request: Dict[str, Any]) -> None:
+        request_id = request.get('id')
+        command = request.get('command')
+        try:
+            if command == 'generate':
+                result = generator.generate_case_study(request.get('illness'),
+                                                       session_id=request.get('session_id'))
+            elif command == 'evaluate':
+                fields = ('correct_diagnosis', 'correct_treatment', 'user_diagnosis', 'user_treatment')
+                if not all(isinstance(request.get(field), str) for field in fields):
+                    emit({'id': request_id, 'error': f"Request needs string fields: {', '.join(fields)}"})
+                    return
+                result = generator.evaluate_answers(*(request[field] for field in fields))
+            elif command == 'evaluate_batch':
+                submissions = request.get('submissions')
+                if not isinstance(submissions, list):
+                    emit({'id': request_id, 'error': 'Request is missing a submissions list'})
+                    return
+                result = {'results': generator.evaluate_batch(submissions, request.get('concurrency'))}
+            elif command == 'stats':
+                result = {'case_pool': generator.case_pool.stats() if generator.case_pool else None,
+                          'score_memo': generator.score_memo.stats()}
+                if generator.mistral_client is not None:
+                    result['mistral_circuit'] = generator.mistral_client.breaker.state
+            else:
+                emit({'id': request_id, 'error': f"Unknown command: {command}"})
+                return
+            emit({'id': request_id, 'result': result})
+        except Exception as e:
+            print(f"Error handling worker request {request_id}: {e}", file=sys.stderr)
+            emit({'id': request_id, 'error': str(e)})
+
+    # Signal the parent that the index and client are loaded
+    emit({'id': None, 'ready': True, 'chunks': len(generator.chunks_data)})
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                emit({'id': None, 'error': f"Invalid request: {e}"})
+                continue
+            executor.submit(handle, request)
+
 def main():
     """Main function for command line usage."""
     if len(sys.argv) > 1:
         command = sys.argv[1]
         
-        generator = CaseStudyGenerator()
+        # A one-shot process also pays for interpreter imports and chunk loading
+        timings = Timings()
+        timings.add('imports', (timings.started - _IMPORT_START) * 1000)
+        with timings.span('init'):
+            generator = CaseStudyGenerator()
         
         if command == "generate":
-            illness = sys.argv[2] if len(sys.argv) > 2 else None
-            result = generator.generate_case_study(illness)
+            args = sys.argv[2:]
+            session_id = None
+            if '--session' in args:
+                index = args.index('--session')
+                session_id = args[index + 1] if index + 1 < len(args) else None
+                del args[index:index + 2]
+            illness = args[0] if args else None
+            result = generator.generate_case_study(illness, timings, session_id)
             print(json.dumps(result))
             
+        elif command == "refill":
+            watch = '--watch' in sys.argv[2:]
+            if watch:
+                threading.Thread(target=_exit_when_stdin_closes, daemon=True).start()
+            added = generator.refill_case_pool(
+                depth=int(os.getenv('CASE_STUDY_POOL_DEPTH', '2')),
+                cases_per_minute=float(os.getenv('CASE_STUDY_POOL_RATE', '4')),
+                watch=watch
+            )
+            stats = generator.case_pool.stats() if generator.case_pool else {}
+            print(json.dumps(dict(stats, added=added)))
+            
         elif command == "evaluate":
             if len(sys.argv) != 6:
                 print("Usage: python case_study_service.py evaluate <correct_diagnosis> <correct_treatment> <user_diagnosis> <user_treatment>")
@@ -311,8 +615,28 @@ def main():
             result = generator.evaluate_answers(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5])
             print(json.dumps(result))
             
+        elif command == "evaluate-batch":
+            args = sys.argv[2:]
+            concurrency = None
+            if '--concurrency' in args:
+                index = args.index('--concurrency')
+                concurrency = int(args[index + 1]) if index + 1 < len(args) else None
+                del args[index:index + 2]
+            if len(args) != 1:
+                print("Usage: python case_study_service.py evaluate-batch <FILE|-> [--concurrency N]")
+                sys.exit(1)
+            for result in generator.evaluate_batch(read_submissions(args[0]), concurrency):
+                print(json.dumps(result))
+            
+        elif command == "serve":
+            args = sys.argv[2:]
+            workers = int(os.getenv('CASE_STUDY_WORKER_THREADS', '4'))
+            if '--workers' in args and args.index('--workers') + 1 < len(args):
+                workers = int(args[args.index('--workers') + 1])
+            serve(generator, workers)
+            
         else:
-            print("Unknown command. Use 'generate' or 'evaluate'")
+            print("Unknown command. Use 'generate', 'evaluate', 'evaluate-batch', 'refill' or 'serve'")
             sys.exit(1)
     else:
         print("Usage: python case_study_service.py <command> [args]")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Binary chunk store for the Ghana Standard Treatment Guidelines knowledge base.
+Stores processed chunks column-wise (offsets plus a contiguous UTF-8 text blob,
+an interned section table, integer keyword term ids and content token postings)
+in a single file that is opened with mmap, so pages are shared between processes
+and the search index is rebuilt from stored postings instead of chunk text.
+The store is written at ingest; processed_chunks.json remains the export format.
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from collections.abc import Sequence
+from typing import List, Dict, Any, Union, Optional, Tuple
+
+from search_index import TOKEN_PATTERN
+
+MAGIC = b'STGCHNK1'
+HEADER = struct.Struct('<8sI')
+BLOCK_ENTRY = struct.Struct('<16sQQ')
+ALIGNMENT = 8
+
+
+def store_path(chunks_file: str) -> str:
+    """Location of the binary store built from a processed_chunks.json file."""
+    return os.path.splitext(chunks_file)[0] + '.bin'
+
+
+def _u32(values: List[int]) -> bytes:
+    data = array('I', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _string_table(strings: List[str]) -> List[bytes]:
+    """Encode strings as (u32 end offsets with a leading 0, UTF-8 blob)."""
+    offsets = [0]
+    parts = []
+    for value in strings:
+        encoded = value.encode('utf-8')
+        parts.append(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+    return [_u32(offsets), b''.join(parts)]
+
+
+class ChunkStore(Sequence):
+    """Read-only, memory-mapped view of processed chunks.
+
+    Indexing returns the same dict shape as an entry of processed_chunks.json.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The mapping keeps its own descriptor, so an unreferenced store is fully
+        # released by garbage collection without an explicit close()
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        # Views over the mapping, released on close()
+        self._views: List[memoryview] = []
+        self._blocks = self._read_blocks()
+
+        self._text = self._strings('text')
+        self._ids = self._strings('ids')
+        self._chunk_ids = self._strings('cids')
+        self._interned = self._strings('strings')
+        self._terms = self._strings('terms')
+        self._meta = self._array('meta')
+        self._keyword_offsets = self._array('kw.offsets')
+        self._keyword_ids = self._array('kw.ids')
+        # Near-duplicate back-references as JSON; absent in stores written before dedup
+        self._refs = self._strings('refs') if 'refs.offsets' in self._blocks else None
+        # Content token postings; absent in stores written before they were persisted
+        self._tokens = self._strings('tokens') if 'tokens.offsets' in self._blocks else None
+        if self._tokens is not None:
+            self._token_offsets = self._array('tok.offsets')
+            self._token_ids = self._array('tok.ids')
+
+        # The interned table is small, so decode it once
+        self.strings = [self._decode(self._interned, i) for i in range(len(self._interned[0]) - 1)]
+        self._terms_cache: List[str] = None
+
+    def _read_blocks(self) -> Dict[str, memoryview]:
+        magic, count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a chunk store")
+        blocks = {}
+        for i in range(count):
+            name, offset, length = BLOCK_ENTRY.unpack_from(self._buffer, HEADER.size + i * BLOCK_ENTRY.size)
+            view = self._buffer[offset:offset + length]
+            self._views.append(view)
+            blocks[name.rstrip(b'\0').decode('ascii')] = view
+        return blocks
+
+    def _array(self, name: str) -> Union[memoryview, array]:
+        block = self._blocks[name]
+        if sys.byteorder == 'little':
+            view = block.cast('I')
+            self._views.append(view)
+            return view
+        data = array('I', bytes(block))
+        data.byteswap()
+        return data
+
+    def _strings(self, name: str):
+        return self._array(name + '.offsets'), self._blocks[name + '.blob']
+
+    @staticmethod
+    def _decode(table, i: int) -> str:
+        offsets, blob = table
+        return str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    def __len__(self) -> int:
+        return len(self._text[0]) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('chunk index out of range')
+        chunk = {
+            'id': self._decode(self._ids, i),
+            'content': self.content(i),
+            'title': self.strings[self._meta[3 * i]],
+            'section': self.section(i),
+            'chunk_id': self._decode(self._chunk_ids, i),
+            'type': self.strings[self._meta[3 * i + 2]],
+            'keywords': [self.term(t) for t in self.keyword_ids(i)]
+        }
+        if self._refs is not None:
+            refs = self._decode(self._refs, i)
+            if refs:
+                chunk['also_in'] = json.loads(refs)
+        return chunk
+
+    def content(self, i: int) -> str:
+        return self._decode(self._text, i)
+
+    def section_id(self, i: int) -> int:
+        """Interned id of the chunk's section, shared by all its chunks."""
+        return self._meta[3 * i + 1]
+
+    def section(self, i: int) -> str:
+        return self.strings[self.section_id(i)]
+
+    def keyword_ids(self, i: int) -> List[int]:
+        return list(self._keyword_ids[self._keyword_offsets[i]:self._keyword_offsets[i + 1]])
+
+    def ids(self) -> List[str]:
+        """Ids of all chunks, decoded without the rest of each chunk."""
+        return [self._decode(self._ids, i) for i in range(len(self))]
+
+    def postings(self) -> Optional[Tuple[Dict[str, List[int]], Dict[str, List[int]]]]:
+        """Keyword and content token posting lists, or None if the store has no token postings."""
+        if self._tokens is None:
+            return None
+        keyword_postings: Dict[int, List[int]] = {}
+        offsets, term_ids = self._keyword_offsets, self._keyword_ids
+        for position in range(len(self)):
+            for term_id in set(term_ids[offsets[position]:offsets[position + 1]]):
+                keyword_postings.setdefault(term_id, []).append(position)
+        terms = self.terms
+        offsets, blob = self._tokens
+        token_postings = {
+            str(blob[offsets[t]:offsets[t + 1]], 'utf-8'):
+                self._token_ids[self._token_offsets[t]:self._token_offsets[t + 1]].tolist()
+            for t in range(len(offsets) - 1)
+        }
+        return {terms[t]: postings for t, postings in keyword_postings.items()}, token_postings
+
+    @property
+    def terms(self) -> List[str]:
+        """Keyword vocabulary, indexed by term id."""
+        if self._terms_cache is None:
+            self._terms_cache = [self._decode(self._terms, t) for t in range(len(self._terms[0]) - 1)]
+        return self._terms_cache
+
+    def term(self, term_id: int) -> str:
+        return self.terms[term_id]
+
+    def close(self) -> None:
+        """Release the mapping; chunks must not be accessed afterwards."""
+        for view in reversed(self._views):
+            view.release()
+        self._buffer.release()
+        self._mmap.close()
+
+    @staticmethod
+    def write(chunks: List[Dict[str, Any]], path: str) -> None:
+        """Write chunks to a binary store, atomically replacing any existing file."""
+        interned: Dict[str, int] = {}
+        terms: Dict[str, int] = {}
+        meta = []
+        keyword_offsets = [0]
+        keyword_ids = []
+
+        def intern(table: Dict[str, int], value: str) -> int:
+            if value not in table:
+                table[value] = len(table)
+            return table[value]
+
+        for chunk in chunks:
+            meta.extend([
+                intern(interned, chunk.get('title', '')),
+                intern(interned, chunk.get('section', '')),
+                intern(interned, chunk.get('type', ''))
+            ])
+            keyword_ids.extend(intern(terms, keyword) for keyword in chunk.get('keywords', []))
+            keyword_offsets.append(len(keyword_ids))
+
+        # Same postings InvertedIndex builds from content, in chunk order
+        token_postings: Dict[str, List[int]] = {}
+        for position, chunk in enumerate(chunks):
+            for token in set(TOKEN_PATTERN.findall(chunk.get('content', '').lower())):
+                token_postings.setdefault(token, []).append(position)
+        token_offsets = [0]
+        token_ids = []
+        for postings in token_postings.values():
+            token_ids.extend(postings)
+            token_offsets.append(len(token_ids))
+
+        blocks = {}
+        for name, values in [
+            ('text', [chunk.get('content', '') for chunk in chunks]),
+            ('ids', [chunk.get('id', '') for chunk in chunks]),
+            ('cids', [str(chunk.get('chunk_id', '')) for chunk in chunks]),
+            ('strings', list(interned)),
+            ('terms', list(terms)),
+            ('tokens', list(token_postings)),
+            ('refs', [json.dumps(chunk['also_in'], ensure_ascii=False) if chunk.get('also_in') else ''
+                      for chunk in chunks])
+        ]:
+            blocks[name + '.offsets'], blocks[name + '.blob'] = _string_table(values)
+        blocks['meta'] = _u32(meta)
+        blocks['kw.offsets'] = _u32(keyword_offsets)
+        blocks['kw.ids'] = _u32(keyword_ids)
+        blocks['tok.offsets'] = _u32(token_offsets)
+        blocks['tok.ids'] = _u32(token_ids)
+
+        offset = HEADER.size + BLOCK_ENTRY.size * len(blocks)
+        entries = []
+        payload = []
+        for name, data in blocks.items():
+            padding = -offset % ALIGNMENT
+            payload.append(b'\0' * padding)
+            offset += padding
+            entries.append(BLOCK_ENTRY.pack(name.encode('ascii'), offset, len(data)))
+            payload.append(data)
+            offset += len(data)
+
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(blocks)))
+            f.write(b''.join(entries))
+            f.write(b''.join(payload))
+        os.replace(tmp_path, path)
+
+
+def export_json(chunks: Sequence, path: str) -> None:
+    """Export chunks in the processed_chunks.json format."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([chunks[i] for i in range(len(chunks))], f, ensure_ascii=False, indent=2)
+
+
+def load_chunks(chunks_file: str) -> Sequence:
+    """Open the binary store for a chunks file.
+
+    Falls back to the parsed JSON list if the store is missing, stale or cannot
+    be used; the store itself is only written at ingest or by ``build``.
+    """
+    bin_path = store_path(chunks_file)
+    json_exists = os.path.exists(chunks_file)
+    try:
+        if os.path.exists(bin_path) and (
+                not json_exists or os.path.getmtime(bin_path) >= os.path.getmtime(chunks_file)):
+            return ChunkStore(bin_path)
+    except Exception as e:
+        print(f"Error opening chunk store: {e}", file=sys.stderr)
+
+    if not json_exists:
+        return []
+    print(f"Chunk store {bin_path} is missing or stale, reading {chunks_file}; "
+          f"rebuild it with: python chunk_store.py build {chunks_file}", file=sys.stderr)
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    usage = "Usage: python chunk_store.py build <chunks.json> [store.bin] | export <store.bin> <chunks.json>"
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'export'):
+        print(usage)
+        sys.exit(1)
+
+    command, source = sys.argv[1], sys.argv[2]
+    if command == 'build':
+        target = sys.argv[3] if len(sys.argv) > 3 else store_path(source)
+        with open(source, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        ChunkStore.write(chunks, target)
+        print(f"Wrote {len(chunks)} chunks to {target}")
+    else:
+        if len(sys.argv) != 4:
+            print(usage)
+            sys.exit(1)
+        store = ChunkStore(source)
+        export_json(store, sys.argv[3])
+        print(f"Exported {len(store)} chunks to {sys.argv[3]}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted context packing for the Ghana STG RAG prompt.
+Splits retrieved chunks into sentences and lines, scores windows of them
+against the query, drops text already packed from an overlapping chunk, and
+fills a token budget best-first, so the prompt carries the dosage line that
+matched rather than the first 500 characters of each chunk.
+"""
+
+import re
+import math
+from typing import List, Dict, Any, Tuple
+from search_index import tokenize
+
+# Rough tokens per character for English clinical text; no tokenizer is shipped
+CHARS_PER_TOKEN = 4
+SENTENCE_PATTERN = re.compile(r'(?<=[.;:!?])\s+(?=[A-Z0-9(])|\n+')
+# Words of a sentence, matched against query term stems
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+MIN_SENTENCE_CHARS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split chunk text into sentences and lines (dosage tables are one item per line)."""
+    sentences = (sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence)
+    # Chunk boundaries cut words, leaving fragments such as "Re"
+    return [sentence for sentence in sentences if len(sentence) >= MIN_SENTENCE_CHARS]
+
+
+def term_stem(term: str) -> str:
+    """Crude stem so 'treatment' matches 'treat' and 'infections' matches 'infection'."""
+    return term[:6] if len(term) > 6 else term
+
+
+class ContextPacker:
+    """Selects the best-matching sentence windows from ranked chunks within a token budget.
+
+    A window is a matching sentence plus ``window`` neighbours on each side.
+    Windows score by the summed weight of distinct query terms they contain,
+    discounted by the rank of their chunk; they are packed best-first and
+    then printed in document order, grouped under their chunk's section.
+    """
+
+    # Score multiplier lost per retrieval rank, so ties go to better chunks
+    RANK_DISCOUNT = 0.1
+    # Windows scoring below this share of the best one are not worth their tokens
+    MIN_RELATIVE_SCORE = 0.3
+
+    def __init__(self, token_budget: int = 300, window: int = 1):
+        self.token_budget = token_budget
+        self.window = window
+
+    def pack(self, query: str, chunks: List[Dict[str, Any]],
+             term_weights: Dict[str, float] = None) -> str:
+        """Return the packed context text for a query.
+
+        term_weights maps query terms to their importance (e.g. IDF); terms
+        default to a weight of 1.
+        """
+        terms = {term_stem(term): (term_weights or {}).get(term, 1.0) for term in tokenize(query)}
+        sentences: List[Tuple[int, int, str]] = []     # (chunk rank, sentence index, text)
+        per_chunk: List[List[str]] = []
+        for rank, chunk in enumerate(chunks):
+            split = split_sentences(chunk.get('content', ''))
+            per_chunk.append(split)
+            sentences.extend((rank, index, sentence) for index, sentence in enumerate(split))
+
+        windows = []
+        for rank, index, sentence in sentences:
+            matched = self._matched_terms(sentence, terms)
+            if not matched:
+                continue
+            start = max(0, index - self.window)
+            end = min(len(per_chunk[rank]), index + self.window + 1)
+            window_terms = set()
+            for neighbour in per_chunk[rank][start:end]:
+                window_terms |= self._matched_terms(neighbour, terms)
+            score = sum(terms[stem] for stem in window_terms) * (1 - self.RANK_DISCOUNT * min(rank, 5))
+            windows.append((score, rank, start, end))
+
+        if windows:
+            best = max(window[0] for window in windows)
+            windows = [window for window in windows if window[0] >= best * self.MIN_RELATIVE_SCORE]
+        else:
+            # No query term appears verbatim: lead with the opening of the best chunks
+            windows = [(0.0, rank, 0, len(split)) for rank, split in enumerate(per_chunk)]
+        windows.sort(key=lambda window: (-window[0], window[1], window[2]))
+
+        selected: Dict[int, set] = {}
+        seen = set()
+        used = 0
+        for _, rank, start, end in windows:
+            for index in range(start, end):
+                sentence = per_chunk[rank][index]
+                # Chunks overlap by ~100 characters, and boilerplate repeats across sections;
+                # matching whole words keeps "500 mg" when "1500 mg daily" was packed
+                key = f" {' '.join(WORD_PATTERN.findall(sentence.lower()))} "
+                if index in selected.get(rank, ()) or any(key in packed for packed in seen):
+                    continue
+                cost = estimate_tokens(sentence) + 1
+                if used + cost > self.token_budget:
+                    continue
+                seen.add(key)
+                selected.setdefault(rank, set()).add(index)
+                used += cost
+
+        parts = []
+        for rank in sorted(selected):
+            lines = []
+            previous = None
+            for index in sorted(selected[rank]):
+                if previous is not None and index != previous + 1:
+                    lines.append('...')
+                lines.append(per_chunk[rank][index])
+                previous = index
+            parts.append(f"{chunks[rank].get('section', '')}:\n" + '\n'.join(lines))
+        return '\n\n'.join(parts)
+
+    @staticmethod
+    def _matched_terms(sentence: str, terms: Dict[str, float]) -> set:
+        words = WORD_PATTERN.findall(sentence.lower())
+        return {stem for stem in terms if any(word.startswith(stem) for word in words)}
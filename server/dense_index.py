@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Local dense-vector retrieval for the Ghana Standard Treatment Guidelines knowledge base.
+Embeds chunks offline with hashed n-gram TF-IDF reduced by latent semantic analysis
+(a truncated SVD), so paraphrases such as "loose stools" and "diarrhoea" land near
+each other without any network calls. Requires NumPy.
+
+Experimental: on the labelled retrieval benchmark dense and hybrid retrieval
+recall less than BM25 alone, so ingest only builds the embeddings when
+RAG_RETRIEVAL_MODE selects them.
+"""
+
+import os
+import sys
+import json
+import zlib
+import math
+from typing import List, Dict, Any, Tuple, Optional, Set
+from search_index import tokenize, chunk_ids
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Hashed feature space and LSA dimensionality
+NUM_FEATURES = 1 << 15
+NUM_COMPONENTS = 128
+# Columns of the TF-IDF matrix densified at a time while building
+BLOCK_SIZE = 4096
+
+
+def dense_retrieval_configured() -> bool:
+    """Whether RAG_RETRIEVAL_MODE selects dense or hybrid retrieval."""
+    return NUMPY_AVAILABLE and os.getenv('RAG_RETRIEVAL_MODE', 'keyword').lower() in ('dense', 'hybrid')
+
+
+def _feature_id(feature: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(feature.encode('utf-8')) & (NUM_FEATURES - 1)
+
+
+def extract_features(text: str) -> Dict[int, float]:
+    """Hashed counts of word unigrams, word bigrams and character 4-grams."""
+    tokens = tokenize(text)
+    counts: Dict[int, float] = {}
+
+    def add(feature: str, weight: float = 1.0) -> None:
+        feature_id = _feature_id(feature)
+        counts[feature_id] = counts.get(feature_id, 0.0) + weight
+
+    for token in tokens:
+        add('w:' + token)
+        # Character n-grams tolerate spelling variants (diarrhea / diarrhoea)
+        padded = f"<{token}>"
+        for i in range(len(padded) - 3):
+            add('c:' + padded[i:i + 4], 0.25)
+    for first, second in zip(tokens, tokens[1:]):
+        add(f"b:{first} {second}")
+    return counts
+
+
+class DenseIndex:
+    """Chunk embeddings plus the projection that maps queries into the same space."""
+
+    def __init__(self, embeddings, projection, idf, chunk_ids: List[str]):
+        self.embeddings = embeddings      # (num_chunks, k) float32, unit rows
+        self.projection = projection      # (NUM_FEATURES, k) float32
+        self.idf = idf                    # (NUM_FEATURES,) float32
+        self.chunk_ids = chunk_ids
+
+    @staticmethod
+    def paths(chunks_file: str) -> Tuple[str, str]:
+        """Embedding matrix (.npy) and query model (.npz) stored next to a chunks file."""
+        base = os.path.splitext(chunks_file)[0]
+        return base + '.dense.npy', base + '.dense_model.npz'
+
+    @classmethod
+    def build(cls, chunks: List[Dict[str, Any]], num_components: int = NUM_COMPONENTS) -> 'DenseIndex':
+        """Fit TF-IDF weights and an LSA projection over the chunks."""
+        rows, cols, values = [], [], []
+        for position, chunk in enumerate(chunks):
+            for feature_id, count in extract_features(chunk.get('content', '')).items():
+                rows.append(position)
+                cols.append(feature_id)
+                values.append(1.0 + math.log(count) if count >= 1 else count)
+        num_chunks = len(chunks)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+
+        df = np.bincount(cols, minlength=NUM_FEATURES).astype(np.float32)
+        idf = np.where(df > 0, np.log((1 + num_chunks) / (1 + df)) + 1, 0).astype(np.float32)
+        values *= idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=num_chunks))
+        values /= np.maximum(norms, 1e-12)[rows].astype(np.float32)
+
+        # Truncated SVD via the eigendecomposition of X X^T, which is only
+        # num_chunks square; X is densified one column block at a time.
+        gram = np.zeros((num_chunks, num_chunks), dtype=np.float64)
+        for block in cls._column_blocks(rows, cols, values, num_chunks):
+            gram += block @ block.T
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        k = min(num_components, num_chunks)
+        order = np.argsort(eigenvalues)[::-1][:k]
+        singular = np.sqrt(np.maximum(eigenvalues[order], 1e-12))
+        left = eigenvectors[:, order]
+
+        embeddings = (left * singular).astype(np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        # V_k = X^T U_k S_k^-1 maps a TF-IDF vector into the latent space
+        projection = np.zeros((NUM_FEATURES, k), dtype=np.float32)
+        for start, block in zip(range(0, NUM_FEATURES, BLOCK_SIZE),
+                                cls._column_blocks(rows, cols, values, num_chunks)):
+            projection[start:start + block.shape[1]] = (block.T @ left) / singular
+
+        return cls(embeddings, projection, idf, [chunk.get('id') for chunk in chunks])
+
+    @staticmethod
+    def _column_blocks(rows, cols, values, num_chunks: int):
+        for start in range(0, NUM_FEATURES, BLOCK_SIZE):
+            mask = (cols >= start) & (cols < start + BLOCK_SIZE)
+            block = np.zeros((num_chunks, BLOCK_SIZE), dtype=np.float32)
+            block[rows[mask], cols[mask] - start] = values[mask]
+            yield block
+
+    def fold_in(self, chunks: List[Dict[str, Any]]) -> 'DenseIndex':
+        """Index chunks with this index's fitted model, without refitting it.
+
+        Embeddings of chunks already indexed are reused by chunk id; new
+        chunks are projected like queries (the standard LSA fold-in), which
+        equals their embedding under a refit as long as the vocabulary
+        statistics barely move.
+        """
+        rows = {chunk_id: row for row, chunk_id in enumerate(self.chunk_ids)}
+        embeddings = np.zeros((len(chunks), self.projection.shape[1]), dtype=np.float32)
+        for position, chunk in enumerate(chunks):
+            row = rows.get(chunk.get('id'))
+            if row is not None:
+                embeddings[position] = self.embeddings[row]
+            else:
+                vector = self.embed_query(chunk.get('content', ''))
+                if vector is not None:
+                    embeddings[position] = vector
+        return DenseIndex(embeddings, self.projection, self.idf, [chunk.get('id') for chunk in chunks])
+
+    def save(self, chunks_file: str) -> None:
+        """Write both files under temporary names and rename them into place."""
+        embeddings_path, model_path = self.paths(chunks_file)
+        suffix = f".tmp{os.getpid()}"
+        with open(embeddings_path + suffix, 'wb') as f:
+            np.save(f, self.embeddings)
+        with open(model_path + suffix, 'wb') as f:
+            np.savez(f, projection=self.projection, idf=self.idf,
+                     chunk_ids=np.asarray(self.chunk_ids))
+        os.replace(embeddings_path + suffix, embeddings_path)
+        os.replace(model_path + suffix, model_path)
+
+    @classmethod
+    def remove(cls, chunks_file: str) -> None:
+        """Delete saved embeddings, which would otherwise go stale as chunks change."""
+        for path in cls.paths(chunks_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def read(cls, chunks_file: str) -> Optional['DenseIndex']:
+        """The saved index, whatever chunks it was built for, or None if there is none."""
+        embeddings_path, model_path = cls.paths(chunks_file)
+        try:
+            if os.path.exists(embeddings_path) and os.path.exists(model_path):
+                with np.load(model_path) as model:
+                    return cls(np.load(embeddings_path, mmap_mode='r'), model['projection'],
+                               model['idf'], model['chunk_ids'].tolist())
+        except Exception as e:
+            print(f"Error loading dense index: {e}", file=sys.stderr)
+        return None
+
+    @classmethod
+    def load(cls, chunks: List[Dict[str, Any]], chunks_file: str) -> 'DenseIndex':
+        """Load ingest-time embeddings, rebuilding them in memory if missing or stale.
+
+        Nothing is written here; the embeddings are saved at ingest or by
+        running this module on the chunks file.
+        """
+        index = cls.read(chunks_file)
+        if index is not None and index.chunk_ids == chunk_ids(chunks):
+            return index
+
+        print(f"Dense index for {chunks_file} is missing or stale, building it in memory; "
+              f"save it with: python dense_index.py {chunks_file}", file=sys.stderr)
+        return cls.build(chunks)
+
+    def embed_query(self, query: str):
+        """Project a query into the latent space as a unit vector."""
+        features = extract_features(query)
+        if not features:
+            return None
+        feature_ids = np.fromiter(features.keys(), dtype=np.int64)
+        counts = np.fromiter(features.values(), dtype=np.float32)
+        weights = np.where(counts >= 1, 1 + np.log(np.maximum(counts, 1)), counts) * self.idf[feature_ids]
+        vector = weights @ self.projection[feature_ids]
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def search(self, query: str, top_k: int = 5,
+               candidates: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Return (chunk position, cosine similarity) pairs for the nearest chunks.
+
+        When candidates is given, only those chunk positions are scored.
+        """
+        vector = self.embed_query(query)
+        if vector is None:
+            return []
+        if candidates is not None:
+            positions = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            scores = np.asarray(self.embeddings[positions]) @ vector
+        else:
+            positions = None
+            scores = self.embeddings @ vector
+        top_k = min(top_k, len(scores))
+        if top_k == 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = top[np.argsort(-scores[top], kind='stable')]
+        if positions is not None:
+            return [(int(positions[i]), float(scores[i])) for i in ranked]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], top_k: int = 5,
+                           k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several (position, score) rankings by summing 1 / (k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (position, _) in enumerate(ranking, 1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python dense_index.py <processed_chunks.json>")
+        sys.exit(1)
+    if not NUMPY_AVAILABLE:
+        print("NumPy is required to build the dense index")
+        sys.exit(1)
+
+    chunks_file = sys.argv[1]
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    DenseIndex.build(chunks).save(chunks_file)
+    print(f"Built dense index for {len(chunks)} chunks")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 """
 Document processor for Ghana Standard Treatment Guidelines.
-Processes the DOCX file, chunks the content, and stores embeddings in Pinecone.
+Processes the DOCX file, chunks the content, and stores chunks with local
+retrieval indexes next to processed_chunks.json through index_writer.
 """
 
 import os
 import sys
 import json
 from pathlib import Path
-from typing import List, Dict, Any
-import docx
+from typing import List, Dict, Any, Iterable, Iterator
+from near_duplicates import deduplicate_chunks
+from docx_stream import iter_sections
+from index_writer import write_index
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import hashlib
 import json
@@ -31,69 +34,45 @@ class DocumentProcessor:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
 
-    def extract_text_from_docx(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text content from DOCX file with metadata."""
+    def extract_text_from_docx(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Stream sections from a DOCX file, split at its heading-styled paragraphs."""
         try:
-            doc = docx.Document(file_path)
-            sections = []
-            current_section = ""
-            current_title = "Introduction"
-            
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if not text:
-                    continue
-                
-                # Detect chapter/section headers
-                if any(keyword in text.lower() for keyword in ['chapter', 'section', 'introduction', 'preface']):
-                    if current_section:
-                        sections.append({
-                            'title': current_title,
-                            'content': current_section.strip(),
-                            'type': 'section'
-                        })
-                    current_title = text
-                    current_section = ""
-                else:
-                    current_section += f"\n{text}"
-            
-            # Add the last section
-            if current_section:
-                sections.append({
-                    'title': current_title,
-                    'content': current_section.strip(),
-                    'type': 'section'
-                })
-            
-            return sections
-            
+            yield from iter_sections(file_path, is_heading=self.is_heading)
         except Exception as e:
             print(f"Error extracting text from DOCX: {e}")
-            return []
+            raise
+
+    @staticmethod
+    def is_heading(text: str) -> bool:
+        """Header heuristic for documents without heading styles."""
+        return any(keyword in text.lower() for keyword in ['chapter', 'section', 'introduction', 'preface'])
 
-    def create_chunks(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Split sections into smaller chunks for better retrieval."""
-        chunks = []
+    def create_chunks(self, sections: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Split sections into smaller chunks for better retrieval, as they stream in."""
+        section_count = 0
+        chunk_count = 0
         
         for section in sections:
+            section_count += 1
             section_chunks = self.text_splitter.split_text(section['content'])
             
             for i, chunk in enumerate(section_chunks):
-                chunks.append({
+                yield {
                     'content': chunk,
                     'title': section['title'],
                     'section': section['title'],
-                    'chunk_id': f"{len(chunks)}_{i}",
+                    'chunk_id': f"{chunk_count}_{i}",
                     'type': section['type']
-                })
+                }
+                chunk_count += 1
         
-        return chunks
+        print(f"Extracted {section_count} sections, created {chunk_count} chunks")
 
     def generate_simple_hash(self, text: str) -> str:
         """Generate a simple hash for text similarity matching."""
         return hashlib.md5(text.encode()).hexdigest()
 
-    def store_chunks_locally(self, chunks: List[Dict[str, Any]]) -> bool:
+    def store_chunks_locally(self, chunks: Iterable[Dict[str, Any]]) -> bool:
         """Store chunks locally in JSON format for retrieval."""
         try:
             processed_chunks = []
@@ -109,11 +88,17 @@ class DocumentProcessor:
                 }
                 processed_chunks.append(processed_chunk)
             
-            # Save to local JSON file
-            with open(self.processed_chunks_file, 'w', encoding='utf-8') as f:
-                json.dump(processed_chunks, f, ensure_ascii=False, indent=2)
+            if not processed_chunks:
+                print("No content extracted from document")
+                return False
+            
+            # Collapse near-duplicate chunks (repeated dosing tables, referral notes)
+            dedup_threshold = float(os.getenv('RAG_DEDUP_THRESHOLD', '0.8'))
+            if dedup_threshold > 0:
+                processed_chunks = deduplicate_chunks(processed_chunks, dedup_threshold)
             
-            print(f"Successfully stored {len(processed_chunks)} chunks locally")
+            # Chunks, chunk store and search sidecars, each replaced atomically
+            write_index(processed_chunks, self.processed_chunks_file)
             return True
             
         except Exception as e:
@@ -144,17 +129,10 @@ class DocumentProcessor:
         """Main processing pipeline."""
         print(f"Processing document: {file_path}")
         
-        # Extract text from DOCX
+        # Paragraphs stream from the DOCX through chunking and keyword
+        # extraction; only the finished chunks are held for the index writes
         sections = self.extract_text_from_docx(file_path)
-        if not sections:
-            print("No content extracted from document")
-            return False
-        
-        print(f"Extracted {len(sections)} sections")
-        
-        # Create chunks
         chunks = self.create_chunks(sections)
-        print(f"Created {len(chunks)} chunks")
         
         # Store chunks locally
         success = self.store_chunks_locally(chunks)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Streaming DOCX reader for the Ghana STG ingest pipeline.
+Iterparses word/document.xml straight from the zip archive and yields one
+paragraph at a time, discarding each element once read, so memory stays flat
+however large the document is. Headings are recognised from paragraph styles
+and outline levels (resolved through word/styles.xml) rather than keywords.
+"""
+
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, Iterator, Optional
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCUMENT_PART = 'word/document.xml'
+STYLES_PART = 'word/styles.xml'
+HEADING_NAME = re.compile(r'^heading\s*(\d)$', re.IGNORECASE)
+
+
+def load_heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
+    """Map paragraph style ids to heading levels (1 = top), following basedOn chains."""
+    try:
+        root = ET.fromstring(archive.read(STYLES_PART))
+    except KeyError:
+        return {}
+
+    direct: Dict[str, Optional[int]] = {}
+    based_on: Dict[str, str] = {}
+    for style in root.iter(W + 'style'):
+        if style.get(W + 'type') != 'paragraph':
+            continue
+        style_id = style.get(W + 'styleId')
+        name = style.find(W + 'name')
+        name = name.get(W + 'val', '') if name is not None else ''
+        outline = style.find(f'{W}pPr/{W}outlineLvl')
+        level = None
+        if outline is not None and outline.get(W + 'val', '').isdigit() and int(outline.get(W + 'val')) < 9:
+            level = int(outline.get(W + 'val')) + 1
+        elif HEADING_NAME.match(name):
+            level = int(HEADING_NAME.match(name).group(1))
+        elif name.lower() == 'title':
+            level = 1
+        direct[style_id] = level
+        parent = style.find(W + 'basedOn')
+        if parent is not None:
+            based_on[style_id] = parent.get(W + 'val')
+
+    levels = {}
+    for style_id in direct:
+        current, seen = style_id, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            if direct.get(current) is not None:
+                levels[style_id] = direct[current]
+                break
+            current = based_on.get(current)
+    return levels
+
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == W + 't' and node.text:
+            parts.append(node.text)
+        elif node.tag == W + 'tab':
+            parts.append('\t')
+        elif node.tag in (W + 'br', W + 'cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def iter_paragraphs(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Yield ``{'text', 'style', 'heading_level'}`` for each non-empty paragraph in order.
+
+    heading_level is None for body text. Paragraphs inside tables are
+    included, in reading order.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        heading_levels = load_heading_levels(archive)
+        with archive.open(DOCUMENT_PART) as document:
+            stack = []
+            for event, element in ET.iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(element)
+                    continue
+                stack.pop()
+                if element.tag != W + 'p':
+                    continue
+                # Nested paragraphs (text boxes) are read with their outer paragraph
+                if any(ancestor.tag == W + 'p' for ancestor in stack):
+                    continue
+
+                text = _paragraph_text(element).strip()
+                style = element.find(f'{W}pPr/{W}pStyle')
+                style = style.get(W + 'val') if style is not None else None
+                outline = element.find(f'{W}pPr/{W}outlineLvl')
+                if outline is not None and outline.get(W + 'val', '').isdigit() and int(outline.get(W + 'val')) < 9:
+                    level = int(outline.get(W + 'val')) + 1
+                else:
+                    level = heading_levels.get(style)
+
+                # Drop the parsed paragraph so the tree never grows
+                if stack:
+                    stack[-1].remove(element)
+                element.clear()
+
+                if text:
+                    yield {'text': text, 'style': style, 'heading_level': level}
+
+
+def has_headings(file_path: str) -> bool:
+    """Whether any paragraph is styled as a heading; stops at the first one."""
+    return any(paragraph['heading_level'] is not None for paragraph in iter_paragraphs(file_path))
+
+
+def iter_sections(file_path: str, max_heading_level: int = 3,
+                  is_heading=None) -> Iterator[Dict[str, Any]]:
+    """Group paragraphs into ``{'title', 'content', 'type'}`` sections as they stream in.
+
+    A paragraph starts a new section when it is styled as a heading of at
+    most max_heading_level. Documents without heading styles (such as
+    PDF conversions) fall back to the is_heading(text) predicate.
+    """
+    use_styles = has_headings(file_path)
+    if not use_styles and is_heading is None:
+        print("No heading styles found; the document will be one section", file=sys.stderr)
+
+    title = "Introduction"
+    lines = []
+    for paragraph in iter_paragraphs(file_path):
+        text = paragraph['text']
+        if use_styles:
+            heading = paragraph['heading_level'] is not None and paragraph['heading_level'] <= max_heading_level
+        else:
+            heading = is_heading is not None and is_heading(text)
+        if heading:
+            if lines:
+                yield {'title': title, 'content': '\n'.join(lines).strip(), 'type': 'section'}
+            title = text
+            lines = []
+        else:
+            lines.append(text)
+    if lines:
+        yield {'title': title, 'content': '\n'.join(lines).strip(), 'type': 'section'}
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python docx_stream.py <docx_file_path>")
+        sys.exit(1)
+    count = 0
+    for section in iter_sections(sys.argv[1]):
+        count += 1
+        print(f"{section['title'][:70]!r}: {len(section['content'])} chars")
+    print(f"{count} sections")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Mistral chat completions API, for load testing.
+Serves POST /v1/chat/completions (plain and streamed) with configurable
+latency, token rate and error injection, so the RAG and case study services
+can run against it by setting MISTRAL_BASE_URL without spending API credits.
+Replies follow the formats the services parse (DIAGNOSIS:/TREATMENT:,
+DIAGNOSIS_SCORE:, case sections), so every code path downstream is exercised.
+"""
+
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List
+
+FILLER = ("Based on the Ghana Standard Treatment Guidelines the recommended approach is "
+          "supportive care with close monitoring and referral when danger signs are present").split()
+
+
+def reply_for(prompt: str, max_tokens: int, reply_tokens: int) -> str:
+    """Build a reply in the format the calling service expects for this prompt."""
+    words = max(1, min(max_tokens, reply_tokens))
+    body = ' '.join(FILLER[i % len(FILLER)] for i in range(words))
+    if 'DIAGNOSIS_SCORE' in prompt:
+        return (f"DIAGNOSIS_SCORE: {random.randint(40, 100)}\n"
+                f"TREATMENT_SCORE: {random.randint(40, 100)}\nFEEDBACK: {body}")
+    if 'DIAGNOSIS:' in prompt and 'TREATMENT:' in prompt:
+        return f"DIAGNOSIS: Simulated diagnosis\nTREATMENT: {body}"
+    if 'PATIENT INFO' in prompt:
+        return ("PATIENT INFO: Kofi Mensah, 34, male, trader\n"
+                f"PRESENTING COMPLAINTS: {body}\nMEDICAL HISTORY: None")
+    return body
+
+
+class FakeMistral:
+    """Latency model and counters shared by all request handlers."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, tokens_per_second: float,
+                 reply_tokens: int, error_rate: float, rate_limit_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'in_flight': 0, 'peak_in_flight': 0}
+
+    def count(self, name: str, delta: int = 1) -> None:
+        with self.lock:
+            self.counts[name] += delta
+            if name == 'in_flight':
+                self.counts['peak_in_flight'] = max(self.counts['peak_in_flight'], self.counts['in_flight'])
+
+    def first_token_delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+def make_handler(fake: FakeMistral):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip('/') == '/stats':
+                with fake.lock:
+                    self.send_json(200, dict(fake.counts))
+            else:
+                self.send_json(404, {'message': 'Not found'})
+
+        def do_POST(self) -> None:
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self.send_json(404, {'message': 'Not found'})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self.send_json(400, {'message': 'Invalid JSON body'})
+                return
+
+            fake.count('requests')
+            roll = random.random()
+            if roll < fake.rate_limit_rate:
+                fake.count('rate_limited')
+                self.send_json(429, {'message': 'Requests rate limit exceeded'})
+                return
+            if roll < fake.rate_limit_rate + fake.error_rate:
+                fake.count('errors')
+                self.send_json(500, {'message': 'Injected server error'})
+                return
+
+            fake.count('in_flight')
+            try:
+                prompt = ' '.join(str(message.get('content', '')) for message in request.get('messages', []))
+                content = reply_for(prompt, int(request.get('max_tokens') or 800), fake.reply_tokens)
+                if request.get('stream'):
+                    self.stream(request, content)
+                else:
+                    self.complete(request, prompt, content)
+            finally:
+                fake.count('in_flight', -1)
+
+        def complete(self, request: Dict[str, Any], prompt: str, content: str) -> None:
+            tokens = content.split(' ')
+            time.sleep(fake.first_token_delay() + fake.token_delay() * len(tokens))
+            self.send_json(200, {
+                'id': uuid.uuid4().hex,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'mistral-large-latest'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(tokens),
+                          'total_tokens': len(prompt.split()) + len(tokens)}
+            })
+
+        def stream(self, request: Dict[str, Any], content: str) -> None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            completion_id = uuid.uuid4().hex
+            model = request.get('model', 'mistral-large-latest')
+
+            def send(delta: Dict[str, Any], finish_reason: str = None) -> None:
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                         'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            time.sleep(fake.first_token_delay())
+            send({'role': 'assistant', 'content': ''})
+            tokens: List[str] = content.split(' ')
+            for i, token in enumerate(tokens):
+                send({'content': token if i == 0 else ' ' + token})
+                time.sleep(fake.token_delay())
+            send({}, 'stop')
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Mistral chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=400, help="Time to first token")
+    parser.add_argument('--jitter-ms', type=float, default=100, help="Uniform +/- jitter on latency")
+    parser.add_argument('--tokens-per-second', type=float, default=60,
+                        help="Generation speed; 0 returns the whole reply at once")
+    parser.add_argument('--reply-tokens', type=int, default=150, help="Reply length, capped by max_tokens")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of requests failing with 429")
+    args = parser.parse_args()
+
+    fake = FakeMistral(args.latency_ms, args.jitter_ms, args.tokens_per_second, args.reply_tokens,
+                       args.error_rate, args.rate_limit_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    server.daemon_threads = True
+    print(f"Fake Mistral listening on http://{args.host}:{args.port} "
+          f"(set MISTRAL_BASE_URL to this address)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Illness -> chunk index for case study generation.
+Ranks the guideline chunks for every curated illness once, at ingest, by
+section-title match, exact mention of the illness name and
+BM25 relevance, so fetching case study context is a dictionary lookup that
+returns the best chunks rather than the first ones in file order.
+"""
+
+import os
+import sys
+import json
+from typing import List, Dict, Any, Optional, Sequence
+from search_index import (BM25Index, PhraseIndex, PHRASE_TOKEN_PATTERN, tokenize,
+                          read_stats, write_stats)
+
+# Curated list of illnesses for case study generation
+ILLNESSES = [
+    "Diarrhoea", "Rotavirus Disease and Diarrhoea", "Constipation", "Peptic Ulcer Disease",
+    "Gastro-oesophageal Reflux Disease", "Haemorrhoids", "Vomiting", "Anaemia", "Measles",
+    "Pertussis", "Common cold", "Pneumonia", "Headache", "Boils", "Impetigo", "Buruli ulcer",
+    "Yaws", "Superficial Fungal Skin infections", "Pityriasis Versicolor", "Herpes Simplex Infections",
+    "Herpes Zoster Infections", "Chicken pox", "Large Chronic Ulcers", "Pruritus", "Urticaria",
+    "Reactive Erythema and Bullous Reaction", "Acne Vulgaris", "Eczema", "Intertrigo",
+    "Diabetes Mellitus", "Diabetic Ketoacidosis", "Diabetes in Pregnancy", "Treatment-Induced Hypoglycemia",
+    "Dyslipidaemia", "Goitre", "Hypothyroidism", "Hyperthyroidism", "Overweight and Obesity",
+    "Dysmenorrhoea", "Abortion", "Abnormal Vaginal Bleeding", "Abnormal Vaginal Discharge",
+    "Acute Lower Abdominal Pain", "Menopause", "Erectile Dysfunction", "Urinary Tract Infection",
+    "Sexually Transmitted Infections in Adults", "STI-related Urethral Discharge in Males",
+    "Mycoplasma genitalum", "STI-related Persistent or Recurrent Urethral Discharge",
+    "STI-related Vaginal Discharge", "STI-related Lower Abdominal Pain in Women",
+    "STI-related Genital Ulcer", "STI-related Scrotal Swelling", "STI-related Inguinal Bubo",
+    "STI-related Genital Warts", "STI-related Ano-rectal Related Syndromes", "Fever",
+    "Tuberculosis", "Typhoid fever", "Malaria", "Uncomplicated Malaria", "Severe Malaria",
+    "Malaria in Pregnancy", "Worm Infestation", "Xerophthalmia", "Foreign body in the eye",
+    "Neonatal conjunctivitis", "Red eye", "Stridor", "Acute Epiglottitis", "Retropharyngeal Abscess",
+    "Pharyngitis and Tonsillitis", "Acute Sinusitis", "Acute otitis Media", "Chronic Otitis Media",
+    "Epistaxis", "Dental Caries", "Oral Candidiasis", "Acute Necrotizing Ulcerative Gingivitis",
+    "Acute Bacterial Sialoadenitis", "Chronic Periodontal Infections", "Mouth Ulcers",
+    "Odontogenic Infections", "Osteoarthritis", "Rheumatoid arthritis", "Juvenile Idiopathic Arthritis",
+    "Back pain", "Gout", "Dislocations", "Open Fractures", "Cellulitis", "Burns", "Wounds",
+    "Bites and Stings", "Shock", "Acute Allergic Reaction"
+]
+
+
+class IllnessIndex:
+    """Ranked chunk positions per illness, validated against the chunk ids like the other sidecars.
+
+    A chunk scores its BM25 relevance to the illness name (scaled so the best
+    chunk scores 1), plus PHRASE_WEIGHT if it mentions the full name, plus
+    TITLE_WEIGHT times the IDF-weighted share of the name's terms found in
+    its section title (or the title of a section its near-duplicates came
+    from). Contents and index pages are skipped.
+    """
+
+    TITLE_WEIGHT = 1.0
+    PHRASE_WEIGHT = 1.0
+    # Chunks with at least this share of page-number tokens are never returned
+    LISTING_SHARE = 0.15
+    # BM25 hits considered per illness, besides chunks of matching sections
+    CANDIDATES = 100
+    # Ranked chunks kept per illness
+    RANKED_CHUNKS = 10
+
+    def __init__(self, stats: Dict[str, Any], chunks: Sequence[Dict[str, Any]] = None,
+                 chunks_file: str = None):
+        self.ranked: Dict[str, List[int]] = stats['ranked']
+        self.chunks = chunks
+        self.chunks_file = chunks_file
+        self._ranker: Optional['IllnessRanker'] = None
+
+    @staticmethod
+    def build_stats(chunks: Sequence[Dict[str, Any]], illnesses: List[str] = None,
+                    bm25: BM25Index = None, phrase_index: PhraseIndex = None) -> Dict[str, Any]:
+        illnesses = illnesses if illnesses is not None else ILLNESSES
+        ranker = IllnessRanker(chunks, bm25, phrase_index)
+        return {
+            'chunk_ids': [chunk.get('id') for chunk in chunks],
+            'illnesses': illnesses,
+            'ranked': {illness.lower(): ranker.rank(illness, IllnessIndex.RANKED_CHUNKS)
+                       for illness in illnesses}
+        }
+
+    @staticmethod
+    def stats_path(chunks_file: str) -> str:
+        """Location of the illness index stored alongside a chunks file."""
+        return os.path.splitext(chunks_file)[0] + '.illnesses.json'
+
+    @staticmethod
+    def save_stats(stats: Dict[str, Any], path: str) -> None:
+        write_stats(stats, path)
+
+    @classmethod
+    def load(cls, chunks: Sequence[Dict[str, Any]], chunks_file: str,
+             illnesses: List[str] = None) -> 'IllnessIndex':
+        """Load the ingest-time index without writing anything.
+
+        If it is missing, stale or was built for other illnesses, each illness
+        is ranked on first lookup instead.
+        """
+        illnesses = illnesses if illnesses is not None else ILLNESSES
+        path = cls.stats_path(chunks_file)
+        stats = read_stats(path, chunks, 'illness index')
+        if stats is None or stats.get('illnesses') != illnesses:
+            print(f"Illness index {path} is missing or stale, ranking illnesses on demand; "
+                  f"rebuild it with: python illness_index.py build {chunks_file}", file=sys.stderr)
+            stats = {'ranked': {}}
+        return cls(stats, chunks, chunks_file)
+
+    def lookup(self, illness: str, top_k: int = 5) -> List[int]:
+        """Best chunk positions for an illness; illnesses missing from the index are ranked on demand."""
+        ranked = self.ranked.get(illness.lower())
+        if ranked is None:
+            if self._ranker is None:
+                self._ranker = IllnessRanker(self.chunks,
+                                             BM25Index.load(self.chunks, self.chunks_file),
+                                             PhraseIndex.load(self.chunks, self.chunks_file))
+            ranked = self.ranked[illness.lower()] = self._ranker.rank(illness, self.RANKED_CHUNKS)
+        return ranked[:top_k]
+
+
+class IllnessRanker:
+    """Scores chunks against illness names; see ``IllnessIndex`` for the formula."""
+
+    def __init__(self, chunks: Sequence[Dict[str, Any]], bm25: BM25Index = None,
+                 phrase_index: PhraseIndex = None):
+        self.bm25 = bm25 or BM25Index(BM25Index.build_stats(chunks))
+        self.phrase_index = phrase_index or PhraseIndex(PhraseIndex.build_stats(chunks))
+        # section title -> (title terms, chunk positions filed under it)
+        self.sections: Dict[str, Any] = {}
+        for position in range(len(chunks)):
+            chunk = chunks[position]
+            titles = [chunk.get('section', '')]
+            titles += [reference.get('section', '') for reference in chunk.get('also_in', ())]
+            for title in titles:
+                if title not in self.sections:
+                    self.sections[title] = (set(tokenize(title)), [])
+                self.sections[title][1].append(position)
+        # Contents pages and the back-of-book index name every illness but teach nothing
+        self.listings = set()
+        for position in range(len(chunks)):
+            tokens = PHRASE_TOKEN_PATTERN.findall(chunks[position].get('content', '').lower())
+            if tokens and sum(token.isdigit() for token in tokens) / len(tokens) >= IllnessIndex.LISTING_SHARE:
+                self.listings.add(position)
+
+    def rank(self, illness: str, top_k: int) -> List[int]:
+        terms = set(tokenize(illness))
+        if not terms:
+            return []
+        scores: Dict[int, float] = {}
+        hits = self.bm25.search(illness, IllnessIndex.CANDIDATES)
+        best = hits[0][1] if hits else 1.0
+        for position, score in hits:
+            scores[position] = score / best
+
+        # Title matches weigh terms by IDF, so a section titled "... kidney
+        # disease" barely counts towards "Rotavirus Disease and Diarrhoea"
+        term_weights = {term: self.bm25.idf.get(term, 0.0) for term in terms}
+        total_weight = sum(term_weights.values()) or 1.0
+        title_scores: Dict[int, float] = {}
+        for title_terms, positions in self.sections.values():
+            share = sum(weight for term, weight in term_weights.items() if term in title_terms) / total_weight
+            if share > 0:
+                for position in positions:
+                    title_scores[position] = max(title_scores.get(position, 0.0), share)
+        for position, share in title_scores.items():
+            scores[position] = scores.get(position, 0.0) + IllnessIndex.TITLE_WEIGHT * share
+
+        phrase = tuple(PHRASE_TOKEN_PATTERN.findall(illness.lower()))
+        for position in self.phrase_index.phrase_matches(phrase):
+            scores[position] = scores.get(position, 0.0) + IllnessIndex.PHRASE_WEIGHT
+
+        ranked = sorted(((position, score) for position, score in scores.items()
+                         if position not in self.listings),
+                        key=lambda item: (-item[1], item[0]))
+        return [position for position, _ in ranked[:top_k]]
+
+
+def main():
+    usage = "Usage: python illness_index.py build <processed_chunks.json> | <processed_chunks.json> [illness]"
+    if len(sys.argv) < 2 or (sys.argv[1] == 'build' and len(sys.argv) != 3):
+        print(usage)
+        sys.exit(1)
+    if sys.argv[1] == 'build':
+        chunks_file = sys.argv[2]
+        with open(chunks_file, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        stats = IllnessIndex.build_stats(chunks, bm25=BM25Index.load(chunks, chunks_file),
+                                         phrase_index=PhraseIndex.load(chunks, chunks_file))
+        IllnessIndex.save_stats(stats, IllnessIndex.stats_path(chunks_file))
+        print(f"Ranked {len(stats['ranked'])} illnesses over {len(chunks)} chunks")
+        return
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    index = IllnessIndex.load(chunks, sys.argv[1])
+    for illness in ([sys.argv[2]] if len(sys.argv) > 2 else ILLNESSES):
+        print(f"{illness}:")
+        for position in index.lookup(illness, 3):
+            print(f"  [{chunks[position].get('section', '')[:50]}] {chunks[position].get('content', '')[:70]!r}")
+
+if __name__ == "__main__":
+    main()
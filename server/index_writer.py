@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Index writer shared by the document processors.
+Builds the search sidecars for a set of processed chunks and writes every file
+of the new index version under a temporary name before renaming it into place.
+"""
+
+from typing import List, Dict, Any
+from search_index import BM25Index, PhraseIndex
+from chunk_store import ChunkStore, store_path
+from dense_index import DenseIndex, dense_retrieval_configured
+from illness_index import IllnessIndex
+from ingest_manifest import write_json_atomic
+
+
+def write_index(processed_chunks: List[Dict[str, Any]], chunks_file: str,
+                dense_index: DenseIndex = None) -> None:
+    """Build the search sidecars, then write every file of the new index version.
+
+    processed_chunks.json, whose mtime the services watch, is replaced after
+    the sidecars so a reload never pairs new chunks with the old statistics
+    for longer than the renames take. The chunk store follows it, since a
+    store older than the JSON is treated as stale.
+    """
+    bm25_stats = BM25Index.build_stats(processed_chunks)
+    phrase_stats = PhraseIndex.build_stats(processed_chunks)
+    illness_stats = IllnessIndex.build_stats(processed_chunks, bm25=BM25Index(bm25_stats),
+                                             phrase_index=PhraseIndex(phrase_stats))
+    if dense_index is None and dense_retrieval_configured():
+        # Offline LSA embeddings, only needed for dense and hybrid retrieval
+        dense_index = DenseIndex.build(processed_chunks)
+
+    # Precomputed BM25 term statistics and positional phrase index
+    BM25Index.save_stats(bm25_stats, BM25Index.stats_path(chunks_file))
+    PhraseIndex.save_stats(phrase_stats, PhraseIndex.stats_path(chunks_file))
+    # Ranked case study context per illness
+    IllnessIndex.save_stats(illness_stats, IllnessIndex.stats_path(chunks_file))
+    if dense_index is not None:
+        dense_index.save(chunks_file)
+    else:
+        DenseIndex.remove(chunks_file)
+
+    write_json_atomic(processed_chunks, chunks_file, ensure_ascii=False, indent=2)
+
+    # Compact memory-mapped copy used by the services; it must not be older than the JSON
+    ChunkStore.write(processed_chunks, store_path(chunks_file))
+
+    print(f"Successfully stored {len(processed_chunks)} chunks locally")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Ingest manifest for re-processing the Ghana STG document.
+Records a fingerprint of the source DOCX and, for every section, an MD5 hash
+of its title and content together with the processed chunks it produced, so a
+re-run skips the document entirely when it is unchanged and otherwise only
+re-chunks sections whose hash changed, dropping the chunks of sections that
+disappeared. Parsing and the sidecar indexes still cover the whole document.
+"""
+
+import os
+import sys
+import json
+import hashlib
+from typing import List, Dict, Any, Optional
+
+
+def manifest_path(chunks_file: str) -> str:
+    """Location of the ingest manifest stored alongside a chunks file."""
+    return os.path.splitext(chunks_file)[0] + '.manifest.json'
+
+
+def write_json_atomic(data: Any, path: str, **dump_kwargs: Any) -> None:
+    """Write JSON to a temporary file and rename it over path, so readers never see it half-written."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+def section_hash(section: Dict[str, Any]) -> str:
+    """MD5 of a section's title and content."""
+    return hashlib.md5(f"{section['title']}\0{section['content']}".encode()).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Per-section hashes and chunks from the last ingest, plus the index version it wrote."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.source: Dict[str, Any] = {}
+        self.sections: List[Dict[str, Any]] = []
+        # Chunks folded into the dense index since it was last fitted
+        self.dense_folded = 0
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.version = data.get('version', 0)
+                self.source = data.get('source', {})
+                self.sections = data.get('sections', [])
+                self.dense_folded = data.get('dense_folded', 0)
+        except Exception as e:
+            print(f"Error loading ingest manifest: {e}", file=sys.stderr)
+
+    @staticmethod
+    def fingerprint(file_path: str) -> Dict[str, Any]:
+        stat = os.stat(file_path)
+        return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def source_unchanged(self, fingerprint: Dict[str, Any]) -> bool:
+        """Whether the source matches the last ingest, hashing it only when size or mtime moved."""
+        if not self.source or self.source.get('size') != fingerprint['size']:
+            return False
+        if self.source.get('mtime') == fingerprint['mtime']:
+            return True
+        # Copied or touched but possibly identical
+        return self.source.get('sha256') == file_sha256(fingerprint['path'])
+
+    def chunks_by_hash(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {section['hash']: section['chunks'] for section in self.sections}
+
+    def chunk_ids(self) -> set:
+        return {chunk['id'] for section in self.sections for chunk in section['chunks']}
+
+    def save(self, fingerprint: Dict[str, Any], sections: List[Dict[str, Any]], dense_folded: int) -> None:
+        """Record a new index version; written last so it only describes complete ingests."""
+        self.version += 1
+        self.source = dict(fingerprint, sha256=file_sha256(fingerprint['path']))
+        self.sections = sections
+        self.dense_folded = dense_folded
+        write_json_atomic({
+            'version': self.version,
+            'source': self.source,
+            'dense_folded': self.dense_folded,
+            'sections': self.sections
+        }, self.path, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Shared Mistral client for the Ghana STG Python services.
+Keeps one pooled keep-alive SDK client per API key and process, and wraps its
+calls with a per-call deadline, jittered exponential backoff on 429/5xx and
+connection errors, optional hedged requests, and a circuit breaker that fails
+calls immediately while the upstream is unhealthy, so callers fall back to
+their local responses instead of waiting.
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+try:
+    from mistralai.client import MistralClient
+    from mistralai.exceptions import MistralException, MistralAPIException
+    MISTRAL_AVAILABLE = True
+except ImportError:
+    MISTRAL_AVAILABLE = False
+
+DEFAULT_ENDPOINT = 'https://api.mistral.ai'
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call, including its retries and hedges, runs past its deadline."""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and stays open for ``cooldown`` seconds.
+
+    Once the cooldown has passed a single trial call is let through; its
+    outcome closes the breaker or opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or (self.threshold > 0 and self.failures >= self.threshold):
+                if self.opened_at is None or self.trial_in_flight:
+                    print(f"Mistral circuit breaker open for {self.cooldown:.0f}s "
+                          f"after {self.failures} failures", file=sys.stderr)
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """End a call that says nothing about upstream health, leaving the breaker as it was."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, upstream 5xx and connection failures are worth retrying.
+
+    The SDK raises a plain MistralException for httpx request errors (read
+    timeouts, dropped connections) and for 5xx codes outside its own retry
+    set, so those count as upstream failures too.
+    """
+    if isinstance(error, MistralAPIException):
+        return error.http_status is None or error.http_status in RETRY_STATUS_CODES or \
+            error.http_status >= 500
+    return isinstance(error, (MistralException, TimeoutError, ConnectionError))
+
+
+class LLMClient:
+    """Thread-safe Mistral chat client with deadlines, retries, hedging and a circuit breaker.
+
+    Exposes ``chat`` and ``chat_stream`` with the SDK's signatures, so it is a
+    drop-in replacement for ``MistralClient`` in the services.
+    """
+
+    def __init__(self, api_key: str, endpoint: str = DEFAULT_ENDPOINT, deadline: float = 30.0,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge_after: float = 0.0, breaker: CircuitBreaker = None):
+        # The SDK's httpx client pools keep-alive connections; its own retries
+        # (fixed 2^n sleeps, no jitter) are disabled in favour of the policy here
+        self.client = MistralClient(api_key=api_key, endpoint=endpoint, max_retries=1, timeout=deadline)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='mistral')
+
+    @classmethod
+    def from_env(cls, api_key: str) -> 'LLMClient':
+        return cls(
+            api_key=api_key,
+            endpoint=os.getenv('MISTRAL_BASE_URL', DEFAULT_ENDPOINT),
+            deadline=float(os.getenv('MISTRAL_TIMEOUT', '30')),
+            max_retries=int(os.getenv('MISTRAL_MAX_RETRIES', '2')),
+            hedge_after=float(os.getenv('MISTRAL_HEDGE_AFTER_MS', '0')) / 1000,
+            breaker=CircuitBreaker(
+                threshold=int(os.getenv('MISTRAL_BREAKER_THRESHOLD', '5')),
+                cooldown=float(os.getenv('MISTRAL_BREAKER_COOLDOWN', '30'))
+            )
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry number (1-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def chat(self, model: str, messages: List[Any], deadline: float = None, **kwargs: Any):
+        """Return a chat completion, retrying and hedging within the deadline."""
+        def request():
+            return self.client.chat(model=model, messages=messages, **kwargs)
+
+        return self._call(lambda remaining, budget: self._hedged(request, remaining, budget), deadline)
+
+    def chat_stream(self, model: str, messages: List[Any], deadline: float = None,
+                    **kwargs: Any) -> Iterator[Any]:
+        """Stream a chat completion within the deadline. Retries happen only before the first chunk arrives."""
+        budget = deadline or self.deadline
+        expires = time.monotonic() + budget
+
+        def first_chunk() -> Tuple[Any, Iterator[Any]]:
+            stream = self.client.chat_stream(model=model, messages=messages, **kwargs)
+            return next(stream, None), stream
+
+        first, stream = self._call(lambda remaining, budget: self._run(first_chunk, remaining(), budget), budget)
+        chunk = first
+        while chunk is not None:
+            yield chunk
+            # The rest of the stream shares the deadline, so a stalled read cannot hang the caller
+            chunk = self._run(lambda: next(stream, None), max(0.0, expires - time.monotonic()), budget)
+
+    def _call(self, attempt_fn, deadline: Optional[float]):
+        """Run attempt_fn(remaining, budget) under the breaker, retrying until the deadline."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Mistral API unavailable (circuit open)")
+        budget = deadline or self.deadline
+        expires = time.monotonic() + budget
+
+        def remaining() -> float:
+            return max(0.0, expires - time.monotonic())
+
+        attempt = 0
+        while True:
+            try:
+                result = attempt_fn(remaining, budget)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                attempt += 1
+                delay = self.backoff(attempt)
+                if (not is_retryable(e) and not isinstance(e, DeadlineExceeded)) or \
+                        attempt > self.max_retries or delay >= remaining():
+                    if is_retryable(e) or isinstance(e, DeadlineExceeded):
+                        self.breaker.record_failure()
+                    else:
+                        # A bad request says nothing about upstream health
+                        self.breaker.release_trial()
+                    raise
+                print(f"Mistral call failed ({e}); retry {attempt} in {delay:.2f}s", file=sys.stderr)
+                time.sleep(delay)
+
+    def _run(self, fn, timeout: float, budget: float):
+        """Run fn on the pool, giving up (without cancelling it) after timeout."""
+        future = self._executor.submit(fn)
+        done, _ = wait([future], timeout=timeout)
+        if not done:
+            raise DeadlineExceeded(f"Mistral call exceeded its {budget:g}s deadline")
+        return future.result()
+
+    def _hedged(self, fn, remaining, budget: float):
+        """Run fn, starting a second identical request if the first is slower than hedge_after.
+
+        The first successful response wins; the loser is left to finish in the background.
+        """
+        if self.hedge_after <= 0 or self.hedge_after >= remaining():
+            return self._run(fn, remaining(), budget)
+        futures = {self._executor.submit(fn)}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            futures.add(self._executor.submit(fn))
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"Mistral call exceeded its {budget:g}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+_clients: Dict[Tuple[str, str], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: Optional[str]) -> Optional[LLMClient]:
+    """Process-wide client for an API key, or None when the SDK or key is missing."""
+    if not MISTRAL_AVAILABLE or not api_key:
+        return None
+    key = (api_key, os.getenv('MISTRAL_BASE_URL', DEFAULT_ENDPOINT))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient.from_env(api_key)
+        return _clients[key]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the Ghana STG web API.
+Replays concurrent user sessions against a running server: a few chat
+questions through /api/search, then generating a case study and submitting
+answers to it. Reports throughput, latency percentiles and error rates per
+endpoint as JSON. Run the server against fake_mistral.py (MISTRAL_BASE_URL)
+to measure the application rather than the Mistral API.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from retrieval_benchmark import DEFAULT_QUERIES, load_queries, percentile
+
+
+class Recorder:
+    """Latencies and failures per endpoint, shared by all session threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, milliseconds: float, error: Optional[str]) -> None:
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(milliseconds)
+            if error:
+                counts = self.errors.setdefault(endpoint, {})
+                counts[error] = counts.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        with self.lock:
+            for endpoint, latencies in self.latencies.items():
+                latencies = sorted(latencies)
+                errors = self.errors.get(endpoint, {})
+                failed = sum(errors.values())
+                endpoints[endpoint] = {
+                    'requests': len(latencies),
+                    'errors': failed,
+                    'error_rate': round(failed / len(latencies), 4),
+                    'error_kinds': errors,
+                    'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+                    'p50_ms': round(percentile(latencies, 0.50), 1),
+                    'p95_ms': round(percentile(latencies, 0.95), 1),
+                    'p99_ms': round(percentile(latencies, 0.99), 1),
+                    'max_ms': round(latencies[-1], 1)
+                }
+        return endpoints
+
+
+def post_json(base_url: str, path: str, payload: Dict[str, Any], timeout: float,
+              stream: bool = False) -> Tuple[int, Any]:
+    """POST JSON and return (status, parsed body); streamed responses return the raw SSE text."""
+    request = urllib.request.Request(
+        base_url.rstrip('/') + path,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json',
+                 'Accept': 'text/event-stream' if stream else 'application/json'},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = response.read().decode('utf-8')
+        if stream:
+            return response.status, body
+        return response.status, json.loads(body)
+
+
+def timed(recorder: Recorder, endpoint: str, call) -> Optional[Any]:
+    """Run one request, recording its latency and any failure; returns the body or None."""
+    start = time.perf_counter()
+    error = None
+    body = None
+    try:
+        _, body = call()
+        if isinstance(body, str) and 'event: error' in body:
+            error = 'stream_error'
+    except urllib.error.HTTPError as e:
+        error = f"http_{e.code}"
+    except urllib.error.URLError as e:
+        error = 'timeout' if 'timed out' in str(e.reason) else 'connection'
+    except TimeoutError:
+        error = 'timeout'
+    except (ValueError, OSError) as e:
+        error = type(e).__name__
+    recorder.record(endpoint, (time.perf_counter() - start) * 1000, error)
+    return None if error else body
+
+
+def run_session(number: int, args: argparse.Namespace, questions: List[str], recorder: Recorder) -> None:
+    session_id = f"loadtest_{os.getpid()}_{number}"
+    rng = random.Random(number)
+
+    def think() -> None:
+        if args.think_ms > 0:
+            time.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    for _ in range(args.searches):
+        question = rng.choice(questions)
+        timed(recorder, 'search_stream' if args.stream else 'search',
+              lambda: post_json(args.base_url, '/api/search', {'question': question, 'sessionId': session_id},
+                                args.timeout, args.stream))
+        think()
+
+    if not args.case_studies:
+        return
+    case_study = timed(recorder, 'case_study_generate',
+                       lambda: post_json(args.base_url, '/api/case-study/generate',
+                                         {'sessionId': session_id}, args.timeout))
+    if not case_study or 'id' not in case_study:
+        return
+    think()
+    timed(recorder, 'case_study_submit',
+          lambda: post_json(args.base_url, '/api/case-study/submit', {
+              'caseStudyId': case_study['id'],
+              'diagnosis': case_study.get('illness', 'Malaria'),
+              'treatment': 'Oral artemether-lumefantrine twice daily for three days with paracetamol for fever'
+          }, args.timeout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent sessions against the web API")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--sessions', type=int, default=50, help="Total sessions to run")
+    parser.add_argument('--concurrency', type=int, default=10, help="Sessions running at once")
+    parser.add_argument('--searches', type=int, default=3, help="Chat questions per session")
+    parser.add_argument('--no-case-studies', dest='case_studies', action='store_false',
+                        help="Only exercise /api/search")
+    parser.add_argument('--stream', action='store_true', help="Request server-sent events from /api/search")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean pause between a session's requests")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument('--queries', default=DEFAULT_QUERIES, help="JSONL file of questions to ask")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    questions = [item['query'] for item in load_queries(args.queries)]
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = [executor.submit(run_session, number, args, questions, recorder)
+                   for number in range(args.sessions)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    report = json.dumps({
+        'base_url': args.base_url,
+        'sessions': args.sessions,
+        'concurrency': args.concurrency,
+        'stream': args.stream,
+        'elapsed_seconds': round(elapsed, 2),
+        'sessions_per_second': round(args.sessions / elapsed, 2) if elapsed > 0 else 0.0,
+        'endpoints': recorder.summary(elapsed)
+    }, indent=2)
+    for endpoint, stats in recorder.summary(elapsed).items():
+        print(f"{endpoint:20} {stats['requests']:5} req  {stats['requests_per_second']:7.2f}/s  "
+              f"p50 {stats['p50_ms']:8.1f}ms  p95 {stats['p95_ms']:8.1f}ms  p99 {stats['p99_ms']:8.1f}ms  "
+              f"errors {stats['error_rate']:.1%}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
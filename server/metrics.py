@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Latency instrumentation for the Ghana STG Python services.
+Records wall-clock spans for each stage of a request, optionally appends them
+to a JSON-lines metrics file, and decides when full prompts are logged.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+
+class Timings:
+    """Durations of named request stages in milliseconds.
+
+    A stage entered more than once accumulates; ``as_dict`` adds a ``total``
+    covering the time since the Timings was created.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, milliseconds: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + milliseconds
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            result = OrderedDict((name, round(ms, 2)) for name, ms in self.spans.items())
+        result['total'] = round((time.perf_counter() - self.started) * 1000, 2)
+        return result
+
+
+class MetricsLog:
+    """Appends one JSON object per timed request to a file shared by all workers.
+
+    Disabled when path is empty. Lines are small enough that appends from
+    several processes do not interleave.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, event: str, timings: Timings, **fields: Any) -> None:
+        if not self.path:
+            return
+        line = json.dumps({
+            'ts': round(time.time(), 3),
+            'event': event,
+            'pid': os.getpid(),
+            'timings': timings.as_dict(),
+            **fields
+        })
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing metrics: {e}", file=sys.stderr)
+
+
+def prompt_log_rate() -> float:
+    """Share of prompts to log, from RAG_LOG_PROMPTS: off (default), on, or a rate in [0, 1]."""
+    value = os.getenv('RAG_LOG_PROMPTS', 'off').strip().lower()
+    if value in ('', 'off', 'false', '0'):
+        return 0.0
+    if value in ('on', 'true', 'all'):
+        return 1.0
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except ValueError:
+        print(f"Invalid RAG_LOG_PROMPTS '{value}', prompt logging disabled", file=sys.stderr)
+        return 0.0
+
+
+def log_prompt(prompt: str, rate: float, label: str = "Mistral Prompt") -> None:
+    """Print a prompt to stderr for a sampled share of calls."""
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+    print(f"=== {label} ===", file=sys.stderr)
+    print(prompt, file=sys.stderr)
+    print("=== End Prompt ===", file=sys.stderr)
+
+
+# Shared by every service in the process; RAG_METRICS_FILE enables it
+metrics_log = MetricsLog(os.getenv('RAG_METRICS_FILE'))
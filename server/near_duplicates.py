@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate chunk detection for the Ghana STG ingest pipeline.
+Signs each chunk with MinHash over word shingles, finds candidate pairs with
+locality-sensitive hashing (banding), confirms them by exact Jaccard
+similarity and keeps one canonical chunk per cluster, recording the sections
+its dropped copies came from.
+"""
+
+import sys
+import json
+import zlib
+import random
+from typing import List, Dict, Any, Set, Tuple
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard almost always share a band
+BANDS = 16
+MERSENNE_PRIME = (1 << 31) - 1
+DEFAULT_THRESHOLD = 0.8
+
+
+def shingles(text: str) -> Set[int]:
+    """Hashed word n-grams of a chunk's text."""
+    words = text.lower().split()
+    if len(words) < SHINGLE_SIZE:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'))
+            for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a*x + b) mod p, seeded for reproducibility."""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self.a = [rng.randrange(1, MERSENNE_PRIME) for _ in range(num_permutations)]
+        self.b = [rng.randrange(0, MERSENNE_PRIME) for _ in range(num_permutations)]
+        if NUMPY_AVAILABLE:
+            self._a = np.asarray(self.a, dtype=np.uint64)[:, None]
+            self._b = np.asarray(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        if not hashes:
+            return tuple([MERSENNE_PRIME] * len(self.a))
+        if NUMPY_AVAILABLE:
+            values = np.fromiter((h % MERSENNE_PRIME for h in hashes), dtype=np.uint64, count=len(hashes))
+            return tuple((((self._a * values) + self._b) % MERSENNE_PRIME).min(axis=1).tolist())
+        values = [h % MERSENNE_PRIME for h in hashes]
+        return tuple(min((a * v + b) % MERSENNE_PRIME for v in values) for a, b in zip(self.a, self.b))
+
+
+def jaccard(first: Set[int], second: Set[int]) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def find_clusters(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[List[int]]:
+    """Group positions of texts whose shingle Jaccard similarity reaches threshold.
+
+    Returns clusters of two or more positions, each sorted, in order of their
+    first member.
+    """
+    shingle_sets = [shingles(text) for text in texts]
+    hasher = MinHasher()
+    rows = NUM_PERMUTATIONS // BANDS
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for position, hashes in enumerate(shingle_sets):
+        signature = hasher.signature(hashes)
+        for band in range(BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows])
+            buckets.setdefault(key, []).append(position)
+
+    parent = list(range(len(texts)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked: Set[Tuple[int, int]] = set()
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if (first, second) in checked or find(first) == find(second):
+                    continue
+                checked.add((first, second))
+                if jaccard(shingle_sets[first], shingle_sets[second]) >= threshold:
+                    parent[find(second)] = find(first)
+
+    clusters: Dict[int, List[int]] = {}
+    for position in range(len(texts)):
+        clusters.setdefault(find(position), []).append(position)
+    return sorted((members for members in clusters.values() if len(members) > 1), key=lambda m: m[0])
+
+
+def deduplicate_chunks(chunks: List[Dict[str, Any]],
+                       threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Drop near-duplicate chunks, keeping the first of each cluster in document order.
+
+    The kept chunk gains an ``also_in`` list with the section, title and
+    chunk_id of every copy that was dropped.
+    """
+    clusters = find_clusters([chunk.get('content', '') for chunk in chunks], threshold)
+    dropped = set()
+    for members in clusters:
+        canonical = chunks[members[0]]
+        references = []
+        for position in members[1:]:
+            copy = chunks[position]
+            dropped.add(position)
+            references.append({'section': copy.get('section', ''), 'title': copy.get('title', ''),
+                               'chunk_id': copy.get('chunk_id')})
+        canonical['also_in'] = canonical.get('also_in', []) + references
+    if dropped:
+        print(f"Removed {len(dropped)} near-duplicate chunks in {len(clusters)} clusters", file=sys.stderr)
+    return [chunk for position, chunk in enumerate(chunks) if position not in dropped]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python near_duplicates.py <processed_chunks.json> [threshold]")
+        sys.exit(1)
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_THRESHOLD
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    clusters = find_clusters([chunk.get('content', '') for chunk in chunks], threshold)
+    duplicates = sum(len(members) - 1 for members in clusters)
+    print(f"{len(chunks)} chunks, {len(clusters)} near-duplicate clusters, {duplicates} removable at {threshold}")
+    for members in clusters[:10]:
+        print(f"  {members}: {chunks[members[0]].get('content', '')[:80]!r}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process";
+import readline from "readline";
+
+export type WorkerEventHandler = (event: any) => void;
+
+interface PendingRequest {
+  onEvent?: WorkerEventHandler;
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+/**
+ * A long-lived Python process speaking newline-delimited JSON on stdin/stdout.
+ * Requests carry an `id`; responses are matched back to callers by that id,
+ * so several requests can be in flight on the same process. Intermediate
+ * `{id, event}` lines are passed to the request's event handler.
+ */
+class PythonWorker {
+  private process: ChildProcessWithoutNullStreams | null = null;
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 1;
+
+  constructor(
+    private readonly name: string,
+    private readonly script: string,
+    private readonly args: string[],
+    private readonly timeoutMs: number,
+  ) {}
+
+  get inFlight(): number {
+    return this.pending.size;
+  }
+
+  private start(): ChildProcessWithoutNullStreams {
+    const child = spawn('python3', [this.script, ...this.args]);
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      let message: any;
+      try {
+        message = JSON.parse(line);
+      } catch (error) {
+        console.error(`${this.name} worker emitted invalid JSON: ${line}`);
+        return;
+      }
+      if (message.id === null || message.id === undefined) {
+        if (message.error) {
+          console.error(`${this.name} worker error: ${message.error}`);
+        }
+        return;
+      }
+      const request = this.pending.get(message.id);
+      if (!request) return;
+      if (message.event !== undefined) {
+        request.onEvent?.(message.event);
+        return;
+      }
+      this.pending.delete(message.id);
+      clearTimeout(request.timer);
+      if (message.error) {
+        request.reject(new Error(`${this.name} worker failed: ${message.error}`));
+      } else {
+        request.resolve(message.result);
+      }
+    });
+
+    child.stdin.on('error', (error) => {
+      console.error(`${this.name} worker stdin error: ${error.message}`);
+    });
+
+    child.stderr.on('data', (data) => {
+      process.stderr.write(data);
+    });
+
+    const fail = (reason: string) => {
+      if (this.process === child) {
+        this.process = null;
+      }
+      this.pending.forEach((request) => {
+        clearTimeout(request.timer);
+        request.reject(new Error(`${this.name} worker ${reason}`));
+      });
+      this.pending.clear();
+    };
+    child.on('exit', (code) => fail(`exited with code ${code}`));
+    child.on('error', (error) => fail(`failed to start: ${error.message}`));
+
+    return child;
+  }
+
+  request(payload: Record<string, any>, onEvent?: WorkerEventHandler): Promise<any> {
+    if (!this.process) {
+      this.process = this.start();
+    }
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`${this.name} worker timed out after ${this.timeoutMs}ms`));
+      }, this.timeoutMs);
+      this.pending.set(id, { onEvent, resolve, reject, timer });
+      this.process!.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+    });
+  }
+
+  stop() {
+    this.process?.kill();
+    this.process = null;
+  }
+}
+
+/**
+ * A fixed-size pool of persistent Python workers. Each request goes to the
+ * worker with the fewest requests in flight; workers that exit are restarted
+ * lazily on their next request.
+ */
+export class PythonWorkerPool {
+  private workers: PythonWorker[];
+
+  constructor(name: string, script: string, args: string[], size: number, timeoutMs = 120000) {
+    this.workers = Array.from({ length: size }, () => new PythonWorker(name, script, args, timeoutMs));
+  }
+
+  get size(): number {
+    return this.workers.length;
+  }
+
+  request(payload: Record<string, any>, onEvent?: WorkerEventHandler): Promise<any> {
+    const worker = this.workers.reduce((least, current) =>
+      current.inFlight < least.inFlight ? current : least
+    );
+    return worker.request(payload, onEvent);
+  }
+
+  stop() {
+    this.workers.forEach((worker) => worker.stop());
+  }
+}
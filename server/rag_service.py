@@ -4,45 +4,274 @@ RAG service for Ghana Standard Treatment Guidelines chatbot.
 Retrieves relevant context from Pinecone and generates responses using Mistral.
 """
 
+import time
+# Taken before any other import so the 'imports' timing covers them all
+_IMPORT_START = time.perf_counter()
 import os
 import sys
 import json
-from typing import List, Dict, Any
+import argparse
+import threading
+import math
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Sequence, Optional, Tuple, Iterator, Set
 import re
-try:
-    from mistralai.client import MistralClient
-    from mistralai.models.chat_completion import ChatMessage
-    MISTRAL_AVAILABLE = True
-except ImportError:
-    try:
-        from mistralai import Mistral
-        MISTRAL_AVAILABLE = True
-    except ImportError:
-        MISTRAL_AVAILABLE = False
+from chunk_store import load_chunks, store_path
+from llm_client import get_client, MISTRAL_AVAILABLE
+from answer_cache import AnswerCache
+from search_index import (InvertedIndex, BM25Index, SectionIndex, PhraseIndex, TrigramIndex,
+                          tokenize, STOPWORDS, PHRASE_TOKEN_PATTERN)
+from dense_index import DenseIndex, reciprocal_rank_fusion, NUMPY_AVAILABLE
+from context_packer import ContextPacker
+from metrics import Timings, metrics_log, prompt_log_rate, log_prompt
+
+class QueryCache:
+    """Bounded LRU cache of ranked retrieval results with a time-to-live.
+
+    Maps a normalized query key to its ranked (chunk position, score) pairs.
+    A max_size of 0 disables caching.
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+class IndexSnapshot:
+    """Chunks and the indexes built over them, replaced together on reload."""
+
+    def __init__(self, chunks_version: Tuple[Optional[float], Optional[float]],
+                 chunks_data: Sequence[Dict[str, Any]]):
+        self.chunks_version = chunks_version
+        self.chunks_data = chunks_data
+        self.index: InvertedIndex = None
+        self.phrase_index: Optional[PhraseIndex] = None
+        self.trigram_index: Optional[TrigramIndex] = None
+        self.section_index: Optional[SectionIndex] = None
+        self.bm25_index: Optional[BM25Index] = None
+        self.dense_index: Optional[DenseIndex] = None
 
 class RAGService:
-    def __init__(self):
+    # Query terms that boost chunks mentioning them
+    MEDICAL_TERMS = ['treatment', 'therapy', 'medicine', 'drug', 'dose',
+                     'symptom', 'diagnosis', 'patient', 'disease', 'condition']
+
+    RETRIEVAL_MODES = ('keyword', 'bm25', 'dense', 'hybrid')
+    # Candidates taken from each ranking before hybrid fusion
+    HYBRID_DEPTH = 50
+
+    # Keyword-mode bonus per word of a phrase matched verbatim
+    PHRASE_WEIGHT = 2
+    # Short terms in more than this share of chunks are too common to boost
+    SHORT_TERM_MAX_SHARE = 0.05
+
+    MODEL = "mistral-large-latest"
+    # Part of the answer cache key; bump when build_prompt changes
+    PROMPT_VERSION = 2
+
+    def __init__(self, retrieval_mode: str = None, section_candidates: int = None,
+                 correct_typos: bool = None, match_phrases: bool = None):
         if MISTRAL_AVAILABLE and os.getenv('MISTRAL_API_KEY'):
             try:
-                self.mistral_client = MistralClient(
-                    api_key=os.getenv('MISTRAL_API_KEY')
-                )
+                # Shared per process: pooled connections, deadlines, retries and a circuit breaker
+                self.mistral_client = get_client(os.getenv('MISTRAL_API_KEY'))
             except Exception as e:
                 print(f"Error initializing Mistral client: {e}", file=sys.stderr)
                 self.mistral_client = None
         else:
             self.mistral_client = None
         
+        # Retrieval strategy: 'keyword' (default), 'bm25', 'dense' or 'hybrid' (bm25 + dense);
+        # dense and hybrid are experimental and trail bm25 on the retrieval benchmark
+        self.retrieval_mode = (retrieval_mode or os.getenv('RAG_RETRIEVAL_MODE', 'keyword')).lower()
+        if self.retrieval_mode not in self.RETRIEVAL_MODES:
+            print(f"Unknown retrieval mode '{self.retrieval_mode}', using keyword", file=sys.stderr)
+            self.retrieval_mode = 'keyword'
+        if self.retrieval_mode in ('dense', 'hybrid') and not NUMPY_AVAILABLE:
+            print(f"NumPy is required for {self.retrieval_mode} retrieval, using bm25", file=sys.stderr)
+            self.retrieval_mode = 'bm25'
+        
+        # Two-stage retrieval: score only chunks in the N best matching sections (0 = off)
+        if section_candidates is None:
+            section_candidates = int(os.getenv('RAG_SECTION_CANDIDATES', '0'))
+        self.section_candidates = section_candidates
+        
+        # Map misspelled query terms to corpus terms before scoring (opt-in until
+        # the retrieval benchmark shows it improves recall)
+        if correct_typos is None:
+            correct_typos = os.getenv('RAG_TYPO_CORRECTION', 'off').lower() in ('on', 'true', '1')
+        self.correct_typos = correct_typos
+        
+        # Quoted and detected multi-word phrases, answered from a positional index
+        # (opt-in: it reorders default keyword results without a measured gain)
+        if match_phrases is None:
+            match_phrases = os.getenv('RAG_PHRASE_MATCHING', 'off').lower() in ('on', 'true', '1')
+        self.match_phrases = match_phrases
+        
+        # Prompt context is packed to a token budget rather than truncated per chunk
+        self.context_packer = ContextPacker(token_budget=int(os.getenv('RAG_CONTEXT_TOKENS', '300')))
+        
+        # Full prompts are logged only for a sampled share of calls (RAG_LOG_PROMPTS)
+        self.prompt_log_rate = prompt_log_rate()
+        
+        # Ranked results for recent queries, keyed on their normalized terms
+        self.query_cache = QueryCache(
+            max_size=int(os.getenv('RAG_QUERY_CACHE_SIZE', '256')),
+            ttl_seconds=float(os.getenv('RAG_QUERY_CACHE_TTL', '3600'))
+        )
+        
+        # Generated answers shared across restarts and workers (RAG_ANSWER_CACHE=off disables)
+        self.answer_cache = None
+        if self.mistral_client and os.getenv('RAG_ANSWER_CACHE', 'on').lower() not in ('off', 'false', '0'):
+            try:
+                self.answer_cache = AnswerCache(
+                    os.getenv('RAG_ANSWER_CACHE_PATH',
+                              os.path.join(os.path.dirname(__file__), 'answer_cache.sqlite3')),
+                    ttl_seconds=float(os.getenv('RAG_ANSWER_CACHE_TTL', str(7 * 24 * 3600))),
+                    max_bytes=int(os.getenv('RAG_ANSWER_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+                )
+            except Exception as e:
+                print(f"Error opening answer cache: {e}", file=sys.stderr)
+        
         # Path to locally stored chunks
         self.chunks_file = os.path.join(os.path.dirname(__file__), 'processed_chunks.json')
-        self.chunks_data = self.load_chunks_data()
+        # Serializes reloads; each request thread pins the snapshot it started with
+        self._reload_lock = threading.RLock()
+        self._pinned = threading.local()
+        self.reload_chunks()
+
+    def reload_chunks(self) -> None:
+        """(Re)load the chunk store, rebuild indexes and drop cached results.
 
-    def load_chunks_data(self) -> List[Dict[str, Any]]:
-        """Load processed chunks from local JSON file."""
+        The new chunks and indexes replace the old ones as a single snapshot.
+        Requests already running keep the snapshot they started with, so the
+        old chunk store is not closed here; it is unmapped once the last of
+        them lets go of it.
+        """
+        with self._reload_lock:
+            snapshot = IndexSnapshot(self._chunks_file_version(), self.load_chunks_data())
+            chunks_data = snapshot.chunks_data
+            snapshot.index = InvertedIndex.load(chunks_data)
+            if self.match_phrases and chunks_data:
+                snapshot.phrase_index = PhraseIndex.load(chunks_data, self.chunks_file)
+            if self.correct_typos and chunks_data:
+                snapshot.trigram_index = TrigramIndex(
+                    {term: len(postings) for term, postings in snapshot.index.token_postings.items()}
+                )
+            if self.section_candidates > 0 and chunks_data:
+                snapshot.section_index = SectionIndex(chunks_data)
+            if self.retrieval_mode in ('bm25', 'hybrid') and chunks_data:
+                snapshot.bm25_index = BM25Index.load(chunks_data, self.chunks_file)
+            if self.retrieval_mode in ('dense', 'hybrid') and chunks_data:
+                snapshot.dense_index = DenseIndex.load(chunks_data, self.chunks_file)
+            self._snapshot = snapshot
+            # Cache keys carry the chunks version, so rankings from the old snapshot cannot be reused
+            self.query_cache.invalidate()
+
+    def reload_if_changed(self) -> None:
+        """Reload when processed_chunks.json or its chunk store has been rewritten since it was loaded."""
+        if self._chunks_file_version() == self._snapshot.chunks_version:
+            return
+        with self._reload_lock:
+            # Another request may have reloaded while this one waited for the lock
+            if self._chunks_file_version() != self._snapshot.chunks_version:
+                self.reload_chunks()
+
+    @contextmanager
+    def _pinned_snapshot(self) -> Iterator[None]:
+        """Serve the rest of a request from one snapshot, even if a reload replaces it meanwhile."""
+        previous = getattr(self._pinned, 'snapshot', None)
+        self._pinned.snapshot = previous or self._snapshot
         try:
-            if os.path.exists(self.chunks_file):
-                with open(self.chunks_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            yield
+        finally:
+            self._pinned.snapshot = previous
+
+    @property
+    def snapshot(self) -> 'IndexSnapshot':
+        """The snapshot pinned by the current request, or else the latest one."""
+        return getattr(self._pinned, 'snapshot', None) or self._snapshot
+
+    @property
+    def chunks_version(self) -> Tuple[Optional[float], Optional[float]]:
+        return self.snapshot.chunks_version
+
+    @property
+    def chunks_data(self) -> Sequence[Dict[str, Any]]:
+        return self.snapshot.chunks_data
+
+    @property
+    def index(self) -> InvertedIndex:
+        return self.snapshot.index
+
+    @property
+    def phrase_index(self) -> Optional[PhraseIndex]:
+        return self.snapshot.phrase_index
+
+    @property
+    def trigram_index(self) -> Optional[TrigramIndex]:
+        return self.snapshot.trigram_index
+
+    @property
+    def section_index(self) -> Optional[SectionIndex]:
+        return self.snapshot.section_index
+
+    @property
+    def bm25_index(self) -> Optional[BM25Index]:
+        return self.snapshot.bm25_index
+
+    @property
+    def dense_index(self) -> Optional[DenseIndex]:
+        return self.snapshot.dense_index
+
+    def _chunks_file_version(self) -> Tuple[Optional[float], Optional[float]]:
+        # Ingest writes the store just after the JSON; watching both picks it up
+        versions = []
+        for path in (self.chunks_file, store_path(self.chunks_file)):
+            try:
+                versions.append(os.path.getmtime(path))
+            except OSError:
+                versions.append(None)
+        return tuple(versions)
+
+    def load_chunks_data(self) -> Sequence[Dict[str, Any]]:
+        """Load processed chunks from the memory-mapped store, or the local JSON file."""
+        try:
+            return load_chunks(self.chunks_file)
         except Exception as e:
             print(f"Error loading chunks data: {e}", file=sys.stderr)
         return []
@@ -61,55 +290,249 @@ class RAGService:
         }
         return [word for word in words if word not in stopwords and len(word) > 3]
 
-    def retrieve_relevant_chunks(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Retrieve most relevant chunks using keyword matching."""
+    def correct_query(self, query: str) -> Tuple[str, Dict[str, str]]:
+        """Replace misspelled query terms with their closest corpus terms.
+
+        Returns the corrected query and a map of each corrected term to its
+        replacement (empty when nothing was changed).
+        """
+        if self.trigram_index is None:
+            return query, {}
+        terms = [word for word in re.findall(r'[a-z]+', query.lower()) if word not in STOPWORDS]
+        corrections = self.trigram_index.correct(terms)
+        for term, replacement in corrections.items():
+            query = re.sub(rf'\b{term}\b', replacement, query, flags=re.IGNORECASE)
+        return query, corrections
+
+    def retrieve_relevant_chunks(self, query: str, top_k: int = 5, timings: Timings = None,
+                                 corrected_query: str = None) -> List[Dict[str, Any]]:
+        """Retrieve most relevant chunks using the configured retrieval mode.
+
+        Stage durations are added to timings when it is given. Callers that
+        already ran ``correct_query`` pass its result as corrected_query.
+        """
+        timings = timings or Timings()
+        with timings.span('reload_check'):
+            self.reload_if_changed()
+        with self._pinned_snapshot():
+            return self._retrieve(query, top_k, timings, corrected_query)
+
+    def _retrieve(self, query: str, top_k: int, timings: Timings,
+                  corrected_query: Optional[str]) -> List[Dict[str, Any]]:
         if not self.chunks_data:
             return self._get_fallback_chunks(query)
         
         try:
-            query_keywords = self.extract_query_keywords(query)
-            if not query_keywords:
+            if corrected_query is None:
+                with timings.span('correct'):
+                    corrected_query, _ = self.correct_query(query)
+            query = corrected_query
+            cache_key = self.query_cache_key(query, top_k)
+            if cache_key is None:
                 return self._get_fallback_chunks(query)
             
-            # Score chunks based on keyword matches
-            scored_chunks = []
-            for chunk in self.chunks_data:
-                score = 0
-                chunk_keywords = chunk.get('keywords', [])
-                chunk_content = chunk['content'].lower()
-                
-                # Direct keyword matches in keywords list
-                for keyword in query_keywords:
-                    if keyword in chunk_keywords:
-                        score += 2
-                    # Partial matches in content
-                    if keyword in chunk_content:
-                        score += 1
-                
-                # Boost score for medical terms
-                medical_terms = ['treatment', 'therapy', 'medicine', 'drug', 'dose', 
-                               'symptom', 'diagnosis', 'patient', 'disease', 'condition']
-                for term in medical_terms:
-                    if term in query.lower() and term in chunk_content:
-                        score += 3
-                
-                if score > 0:
-                    scored_chunks.append({
-                        'content': chunk['content'],
-                        'title': chunk['title'],
-                        'section': chunk['section'],
-                        'score': score,
-                        'id': chunk['id']
-                    })
+            with timings.span('rank'):
+                ranked = self.query_cache.get(cache_key)
+                if ranked is None:
+                    ranked = self._rank_chunks(query, top_k)
+                    self.query_cache.put(cache_key, ranked)
             
-            # Sort by score and return top_k
-            scored_chunks.sort(key=lambda x: x['score'], reverse=True)
-            return scored_chunks[:top_k]
+            if not ranked:
+                return self._get_fallback_chunks(query)
+            with timings.span('format'):
+                if self.section_index is not None:
+                    # Present neighbouring hits from one section as a single passage
+                    best = dict(ranked)
+                    return [self._format_passage(group, max(best[pos] for pos in group if pos in best))
+                            for group in self.section_index.merge_adjacent(ranked)]
+                return [self._format_chunk(position, score) for position, score in ranked]
             
         except Exception as e:
             print(f"Error retrieving chunks: {e}", file=sys.stderr)
             return self._get_fallback_chunks(query)
 
+    def retrieve_relevant_chunks_batch(self, queries: List[str], top_k: int = 5,
+                                       corrected_queries: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Retrieve chunks for many queries, ranking each distinct normalized query once."""
+        self.reload_if_changed()
+        if corrected_queries is None:
+            corrected_queries = [self._correct_query_safely(query)[0] for query in queries]
+        ranked_by_key: Dict[Tuple, List[Dict[str, Any]]] = {}
+        results = []
+        with self._pinned_snapshot():
+            for query, corrected_query in zip(queries, corrected_queries):
+                try:
+                    cache_key = self.query_cache_key(corrected_query, top_k)
+                except Exception as e:
+                    print(f"Error retrieving chunks: {e}", file=sys.stderr)
+                    cache_key = None
+                if cache_key is None:
+                    results.append(self._retrieve(query, top_k, Timings(), corrected_query))
+                    continue
+                if cache_key not in ranked_by_key:
+                    ranked_by_key[cache_key] = self._retrieve(query, top_k, Timings(), corrected_query)
+                results.append([dict(chunk) for chunk in ranked_by_key[cache_key]])
+        return results
+
+    def query_cache_key(self, query: str, top_k: int) -> Optional[Tuple]:
+        """Normalize a query to the retrieval cache key, or None if it has no usable terms.
+
+        Queries that differ only in word order or stopwords share a key.
+        """
+        quoted, detected, short_terms = self.extract_query_phrases(query)
+        # Section pruning sees every term, including the short and numeric ones
+        # the keyword extractor drops
+        sections = tuple(sorted(tokenize(query))) if self.section_index is not None else ()
+        if self.dense_index is not None:
+            # Dense features include word bigrams, so word order matters
+            terms = tokenize(query)
+            if not terms:
+                return None
+            return (self.chunks_version, self.retrieval_mode, tuple(terms), (), tuple(quoted), sections, top_k)
+        if self.bm25_index is not None:
+            terms = tokenize(query)
+            boosts = ()
+            phrases = tuple(quoted)
+            if not terms:
+                return None
+        else:
+            terms = self.extract_query_keywords(query)
+            query_lower = query.lower()
+            boosts = tuple(term for term in self.MEDICAL_TERMS if term in query_lower)
+            phrases = (tuple(quoted), tuple(detected), tuple(sorted(short_terms)))
+            if not terms and not short_terms and not quoted:
+                return None
+        return (self.chunks_version, self.retrieval_mode, tuple(sorted(terms)), boosts, phrases, sections, top_k)
+
+    def extract_query_phrases(self, query: str) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]], List[str]]:
+        """Find the phrase-level terms of a query.
+
+        Returns quoted phrases, phrases detected as runs of two or three
+        consecutive non-stopwords that occur verbatim in the guidelines, and
+        short terms (two or three letters, such as "uti" or "dka") that the
+        keyword extractor drops but that are rare enough to be meaningful.
+        """
+        if self.phrase_index is None:
+            return [], [], []
+        
+        quoted = []
+        for text in re.findall(r'"([^"]+)"', query):
+            tokens = tuple(PHRASE_TOKEN_PATTERN.findall(text.lower()))
+            if tokens:
+                quoted.append(tokens)
+        
+        tokens = PHRASE_TOKEN_PATTERN.findall(re.sub(r'"[^"]*"', ' ', query).lower())
+        detected = []
+        i = 0
+        while i < len(tokens):
+            for length in (3, 2):
+                phrase = tuple(tokens[i:i + length])
+                if (len(phrase) == length and not any(token in STOPWORDS for token in phrase) and
+                        self.phrase_index.phrase_matches(phrase)):
+                    detected.append(phrase)
+                    i += length
+                    break
+            else:
+                i += 1
+        
+        max_frequency = self.SHORT_TERM_MAX_SHARE * len(self.chunks_data)
+        short_terms = sorted({
+            token for token in tokens
+            if 2 <= len(token) <= 3 and token.isalpha() and token not in STOPWORDS and
+            0 < self.phrase_index.document_frequency(token) <= max_frequency
+        })
+        return quoted, detected, short_terms
+
+    def _rank_chunks(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Rank chunks with the configured retrieval mode."""
+        candidates = None
+        if self.section_index is not None:
+            candidates = self.section_index.candidate_chunks(query, self.section_candidates)
+            if not candidates:
+                return []
+        
+        # Quoted phrases restrict retrieval to chunks containing all of them
+        quoted, _, _ = self.extract_query_phrases(query)
+        if quoted:
+            required = set.intersection(*(self.phrase_index.phrase_matches(phrase) for phrase in quoted))
+            if required:
+                candidates = required if candidates is None else candidates & required
+                if not candidates:
+                    return []
+        
+        if self.retrieval_mode == 'hybrid':
+            return reciprocal_rank_fusion([
+                self.bm25_index.search(query, self.HYBRID_DEPTH, candidates),
+                self.dense_index.search(query, self.HYBRID_DEPTH, candidates)
+            ], top_k)
+        if self.dense_index is not None:
+            return self.dense_index.search(query, top_k, candidates)
+        if self.bm25_index is not None:
+            return self.bm25_index.search(query, top_k, candidates)
+        return self._rank_keyword_chunks(query, top_k, candidates)
+
+    def _rank_keyword_chunks(self, query: str, top_k: int,
+                             candidates: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Rank chunks by keyword overlap, returning (position, score) pairs."""
+        query_keywords = self.extract_query_keywords(query)
+        
+        # Score only chunks found in the posting lists of the query terms
+        scores: Dict[int, int] = {}
+        for keyword in query_keywords:
+            # Direct keyword matches in keywords list
+            for position in self.index.keyword_matches(keyword):
+                scores[position] = scores.get(position, 0) + 2
+            # Partial matches in content
+            for position in self.index.substring_matches(keyword):
+                scores[position] = scores.get(position, 0) + 1
+        
+        # Boost score for medical terms
+        query_lower = query.lower()
+        for term in self.MEDICAL_TERMS:
+            if term in query_lower:
+                for position in self.index.substring_matches(term):
+                    scores[position] = scores.get(position, 0) + 3
+        
+        # Boost whole phrases and short terms matched through the phrase index
+        quoted, detected, short_terms = self.extract_query_phrases(query)
+        for phrase in quoted + detected:
+            for position in self.phrase_index.phrase_matches(phrase):
+                scores[position] = scores.get(position, 0) + self.PHRASE_WEIGHT * len(phrase)
+        for term in short_terms:
+            for position in self.phrase_index.term_matches(term):
+                scores[position] = scores.get(position, 0) + 2
+        
+        if candidates is not None:
+            scores = {position: score for position, score in scores.items() if position in candidates}
+        
+        # Sort by score (ties keep file order) and return top_k
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def _format_chunk(self, position: int, score: float) -> Dict[str, Any]:
+        """Build the retrieval result for the chunk at a store position."""
+        chunk = self.chunks_data[position]
+        result = {
+            'content': chunk['content'],
+            'title': chunk['title'],
+            'section': chunk['section'],
+            'score': round(score, 4) if isinstance(score, float) else score,
+            'id': chunk['id']
+        }
+        if chunk.get('also_in'):
+            result['also_in'] = chunk['also_in']
+        return result
+
+    def _format_passage(self, positions: List[int], score: float) -> Dict[str, Any]:
+        """Build one retrieval result from consecutive chunks of a section."""
+        if len(positions) == 1:
+            return self._format_chunk(positions[0], score)
+        chunks = [self.chunks_data[position] for position in positions]
+        passage = self._format_chunk(positions[0], score)
+        passage['content'] = ' '.join(chunk['content'] for chunk in chunks)
+        passage['id'] = '+'.join(chunk['id'] for chunk in chunks)
+        return passage
+
     def _get_fallback_chunks(self, query: str) -> List[Dict[str, Any]]:
         """Provide fallback content when Pinecone is not available."""
         # This is a simplified fallback - in production, you'd want more comprehensive content
@@ -131,21 +554,16 @@ class RAGService:
         ]
         return fallback_content
 
-    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]]) -> str:
-        """Generate response using Mistral AI."""
-        if not self.mistral_client:
-            return self._create_manual_response(query, context_chunks)
+    def build_prompt(self, query: str, context_chunks: List[Dict[str, Any]],
+                     corrected_query: str = None) -> str:
+        """Build the Mistral prompt. Bump PROMPT_VERSION when changing it."""
+        # Best-matching sentences of all retrieved chunks, within the token budget
+        packing_query = corrected_query if corrected_query is not None else self.correct_query(query)[0]
+        context = self.context_packer.pack(packing_query, context_chunks,
+                                           self.query_term_weights(packing_query))
 
-        try:
-            # Limit chunk content length for clarity
-            trimmed_chunks = context_chunks[:3]
-            context = "\n\n".join([
-                f"{chunk['section']}:\n{chunk['content'][:500].strip()}..."
-                for chunk in trimmed_chunks
-            ])
-
-            # More directive prompt
-            prompt = f"""
+        # More directive prompt
+        return f"""
 Answer the following medical question strictly using the Ghana Standard Treatment Guidelines (7th Edition, 2017).
 
 Context:
@@ -157,17 +575,45 @@ Respond concisely and professionally with specific treatment instructions from t
 If context is insufficient, say: "The provided medical guidelines do not cover this question."
 """
 
-            # Debug logging
-            print("=== Mistral Prompt ===", file=sys.stderr)
-            print(prompt, file=sys.stderr)
-            print("=== End Prompt ===", file=sys.stderr)
+    def query_term_weights(self, query: str) -> Dict[str, float]:
+        """IDF weight of each query term over the chunk contents; unseen terms weigh most."""
+        snapshot = self.snapshot
+        total = len(snapshot.chunks_data)
+        return {term: math.log(1 + total / (1 + len(snapshot.index.token_postings.get(term, ()))))
+                for term in tokenize(query)}
 
-            response = self.mistral_client.chat(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=800
-            )
+    def answer_cache_key(self, query: str, context_chunks: List[Dict[str, Any]]) -> str:
+        return AnswerCache.make_key(query, [chunk['id'] for chunk in context_chunks],
+                                    self.MODEL, self.PROMPT_VERSION)
+
+    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]],
+                          use_cache: bool = True, timings: Timings = None,
+                          corrected_query: str = None) -> str:
+        """Generate response using Mistral AI, reusing cached answers when allowed."""
+        if not self.mistral_client:
+            return self._create_manual_response(query, context_chunks)
+
+        timings = timings or Timings()
+        cache_key = None
+        if use_cache and self.answer_cache is not None:
+            with timings.span('answer_cache'):
+                cache_key = self.answer_cache_key(query, context_chunks)
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            with timings.span('prompt'):
+                prompt = self.build_prompt(query, context_chunks, corrected_query)
+            log_prompt(prompt, self.prompt_log_rate)
+
+            with timings.span('llm'):
+                response = self.mistral_client.chat(
+                    model=self.MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=800
+                )
 
             content = response.choices[0].message.content.strip()
 
@@ -175,6 +621,9 @@ If context is insufficient, say: "The provided medical guidelines do not cover t
             if "consult" in content.lower() and "health" in content.lower():
                 print("⚠️ Warning: Fallback detected in Mistral response.", file=sys.stderr)
             
+            if cache_key is not None and content:
+                self.answer_cache.put(cache_key, content)
+            
             return content
 
         except Exception as e:
@@ -222,46 +671,352 @@ For accurate medical guidance, please:
 
 This is important for ensuring you receive appropriate, safe, and effective medical care based on the most current guidelines and your specific situation."""
 
-    def process_query(self, query: str) -> Dict[str, Any]:
-        """Main RAG pipeline."""
+    def process_query(self, query: str, use_cache: bool = True,
+                      timings: Timings = None) -> Dict[str, Any]:
+        """Main RAG pipeline. use_cache=False bypasses the answer cache.
+
+        The result carries a ``timings`` block with per-stage milliseconds.
+        """
+        timings = timings or Timings()
         try:
+            # Corrected once, then shared by retrieval, context packing and the result
+            with timings.span('correct'):
+                corrected_query, corrections = self._correct_query_safely(query)
+            
             # Retrieve relevant chunks
-            chunks = self.retrieve_relevant_chunks(query)
+            with timings.span('retrieve'):
+                chunks = self.retrieve_relevant_chunks(query, timings=timings, corrected_query=corrected_query)
             
             # Generate response
-            answer = self.generate_response(query, chunks)
+            with timings.span('generate'):
+                answer = self.generate_response(query, chunks, use_cache, timings, corrected_query)
             
-            # Format sources for frontend
-            sources = []
-            for i, chunk in enumerate(chunks[:3]):  # Limit to top 3 sources
-                sources.append({
-                    'id': str(i + 1),
-                    'title': chunk['section'],
-                    'content': chunk['content'][:200] + "..." if len(chunk['content']) > 200 else chunk['content'],
-                    'section': chunk['section']
-                })
-            
-            return {
+            result = {
                 'answer': answer,
-                'sources': sources
+                'sources': self._format_sources(chunks)
             }
+            self._add_corrections(result, corrections)
             
         except Exception as e:
             print(f"Error processing query: {e}", file=sys.stderr)
-            return {
+            result = {
                 'answer': self._get_fallback_response(query),
                 'sources': []
             }
+        
+        result['timings'] = timings.as_dict()
+        metrics_log.record('query', timings, mode=self.retrieval_mode, stream=False)
+        return result
+
+    def process_queries(self, queries: List[str], use_cache: bool = True,
+                        max_concurrency: int = None) -> List[Dict[str, Any]]:
+        """Answer a batch of queries; results are returned in input order.
+
+        A query that fails gets ``{'query': ..., 'error': ...}`` instead of an
+        answer, without affecting the rest of the batch.
+        """
+        results: List[Dict[str, Any]] = [None] * len(queries)
+        for position, result in self.iter_process_queries(queries, use_cache, max_concurrency):
+            results[position] = result
+        return results
+
+    def iter_process_queries(self, queries: List[str], use_cache: bool = True,
+                             max_concurrency: int = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Answer a batch of queries, yielding (position, result) pairs as they complete.
+
+        Retrieval runs for the whole batch up front; Mistral calls then run on a
+        bounded thread pool (RAG_BATCH_CONCURRENCY, default 4).
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('RAG_BATCH_CONCURRENCY', '4'))
+        
+        corrected = [self._correct_query_safely(query) for query in queries]
+        corrected_queries = [corrected_query for corrected_query, _ in corrected]
+        try:
+            batch_chunks = self.retrieve_relevant_chunks_batch(queries, corrected_queries=corrected_queries)
+        except Exception as e:
+            print(f"Error retrieving batch: {e}", file=sys.stderr)
+            batch_chunks = [None] * len(queries)
+        
+        def answer(position: int) -> Dict[str, Any]:
+            query = queries[position]
+            corrected_query, corrections = corrected[position]
+            try:
+                chunks = batch_chunks[position]
+                if chunks is None:
+                    chunks = self.retrieve_relevant_chunks(query, corrected_query=corrected_query)
+                result = {
+                    'query': query,
+                    'answer': self.generate_response(query, chunks, use_cache, corrected_query=corrected_query),
+                    'sources': self._format_sources(chunks)
+                }
+                self._add_corrections(result, corrections)
+                return result
+            except Exception as e:
+                print(f"Error processing batch query {position}: {e}", file=sys.stderr)
+                return {'query': query, 'error': str(e)}
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {executor.submit(answer, position): position for position in range(len(queries))}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def process_query_stream(self, query: str, use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """Streaming RAG pipeline.
+
+        Yields a ``sources`` event as soon as retrieval finishes, then ``delta``
+        events carrying answer text as Mistral produces it, and finally a
+        ``done`` event with the complete answer and its timings.
+        """
+        timings = Timings()
+        with timings.span('correct'):
+            corrected_query, corrections = self._correct_query_safely(query)
+        try:
+            with timings.span('retrieve'):
+                chunks = self.retrieve_relevant_chunks(query, timings=timings, corrected_query=corrected_query)
+        except Exception as e:
+            print(f"Error processing query: {e}", file=sys.stderr)
+            answer = self._get_fallback_response(query)
+            yield {'type': 'sources', 'sources': []}
+            yield {'type': 'delta', 'content': answer}
+            yield {'type': 'done', 'answer': answer, 'timings': timings.as_dict()}
+            return
+        
+        sources_event = {'type': 'sources', 'sources': self._format_sources(chunks)}
+        self._add_corrections(sources_event, corrections)
+        yield sources_event
+        
+        parts = []
+        generate_start = time.perf_counter()
+        for delta in self.generate_response_stream(query, chunks, use_cache, corrected_query):
+            if not parts:
+                timings.add('first_delta', (time.perf_counter() - generate_start) * 1000)
+            parts.append(delta)
+            yield {'type': 'delta', 'content': delta}
+        timings.add('generate', (time.perf_counter() - generate_start) * 1000)
+        
+        metrics_log.record('query', timings, mode=self.retrieval_mode, stream=True)
+        yield {'type': 'done', 'answer': ''.join(parts).strip(), 'timings': timings.as_dict()}
+
+    def generate_response_stream(self, query: str, context_chunks: List[Dict[str, Any]],
+                                 use_cache: bool = True, corrected_query: str = None) -> Iterator[str]:
+        """Yield answer text as it is generated, falling back like generate_response."""
+        if not self.mistral_client:
+            yield self._create_manual_response(query, context_chunks)
+            return
+
+        cache_key = None
+        if use_cache and self.answer_cache is not None:
+            cache_key = self.answer_cache_key(query, context_chunks)
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        try:
+            prompt = self.build_prompt(query, context_chunks, corrected_query)
+            log_prompt(prompt, self.prompt_log_rate)
+            stream = self.mistral_client.chat_stream(
+                model=self.MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=800
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                # Match generate_response, which strips leading whitespace
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                parts.append(delta)
+                yield delta
+
+        except Exception as e:
+            print(f"Error streaming response: {e}", file=sys.stderr)
+            if not parts:
+                yield self._create_manual_response(query, context_chunks)
+            return
+
+        content = ''.join(parts).strip()
+        if not content:
+            yield self._create_manual_response(query, context_chunks)
+        elif cache_key is not None:
+            self.answer_cache.put(cache_key, content)
+
+    def _correct_query_safely(self, query: str) -> Tuple[str, Dict[str, str]]:
+        """correct_query, leaving the query unchanged if correction fails."""
+        try:
+            return self.correct_query(query)
+        except Exception as e:
+            print(f"Error correcting query: {e}", file=sys.stderr)
+            return query, {}
+
+    def _add_corrections(self, result: Dict[str, Any], corrections: Dict[str, str]) -> None:
+        """Report corrected query terms in a result, if there were any."""
+        if corrections:
+            result['corrections'] = corrections
+
+    def _format_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Format retrieved chunks as sources for the frontend."""
+        sources = []
+        for i, chunk in enumerate(chunks[:3]):  # Limit to top 3 sources
+            sources.append({
+                'id': str(i + 1),
+                'title': chunk['section'],
+                'content': chunk['content'][:200] + "..." if len(chunk['content']) > 200 else chunk['content'],
+                'section': chunk['section']
+            })
+        return sources
+
+def serve(rag_service: RAGService, workers: int = 4) -> None:
+    """Answer newline-delimited JSON requests from stdin until EOF.
+
+    Each request is ``{"id": ..., "query": ...}``, optionally with
+    ``"no_cache": true`` to bypass the answer cache, or
+    ``{"id": ..., "command": "stats"}`` for cache counters. Each response line
+    is ``{"id": ..., "result": {...}}`` or ``{"id": ..., "error": "..."}``.
+    With ``"stream": true`` the ``sources`` and ``delta`` events are first
+    emitted as ``{"id": ..., "event": {...}}`` lines before the final result.
+    Up to ``workers`` queries are processed concurrently, so responses may
+    arrive out of order and must be matched on ``id``.
+    """
+    write_lock = threading.Lock()
+
+    def emit(message: Dict[str, Any]) -> None:
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def handle(request: Dict[str, Any]) -> None:
+        request_id = request.get('id')
+        try:
+            if request.get('command') == 'stats':
+                stats = {'query_cache': rag_service.query_cache.stats()}
+                if rag_service.mistral_client is not None:
+                    stats['mistral_circuit'] = rag_service.mistral_client.breaker.state
+                emit({'id': request_id, 'result': stats})
+                return
+            query = request.get('query')
+            if not isinstance(query, str) or not query.strip():
+                emit({'id': request_id, 'error': 'Request is missing a query'})
+                return
+            use_cache = not request.get('no_cache', False)
+            if request.get('stream'):
+                result = {'answer': '', 'sources': []}
+                for event in rag_service.process_query_stream(query, use_cache):
+                    if event['type'] == 'sources':
+                        result['sources'] = event['sources']
+                    elif event['type'] == 'done':
+                        result['answer'] = event['answer']
+                        result['timings'] = event['timings']
+                        break
+                    emit({'id': request_id, 'event': event})
+                emit({'id': request_id, 'result': result})
+                return
+            emit({'id': request_id, 'result': rag_service.process_query(query, use_cache)})
+        except Exception as e:
+            print(f"Error handling worker request {request_id}: {e}", file=sys.stderr)
+            emit({'id': request_id, 'error': str(e)})
+
+    # Signal the parent that the index and client are loaded
+    emit({'id': None, 'ready': True, 'chunks': len(rag_service.chunks_data)})
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                emit({'id': None, 'error': f"Invalid request: {e}"})
+                continue
+            executor.submit(handle, request)
+
+def run_batch(rag_service: RAGService, path: str, use_cache: bool = True,
+              concurrency: int = None) -> None:
+    """Answer queries from a JSONL file, printing one JSON result per line as each completes.
+
+    Each input line is either a JSON string or an object with a ``query`` and
+    an optional ``id``; results carry the ``id`` (or the line index) back.
+    """
+    ids = []
+    queries = []
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping invalid batch line: {e}", file=sys.stderr)
+                continue
+            if isinstance(item, str):
+                item = {'query': item}
+            if not isinstance(item, dict) or not isinstance(item.get('query'), str):
+                print("Skipping batch line without a query", file=sys.stderr)
+                continue
+            ids.append(item.get('id', len(ids)))
+            queries.append(item['query'])
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    
+    for position, result in rag_service.iter_process_queries(queries, use_cache, concurrency):
+        print(json.dumps({'id': ids[position], **result}), flush=True)
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python rag_service.py <query>", file=sys.stderr)
+    parser = argparse.ArgumentParser(description="Ghana STG RAG service")
+    parser.add_argument('query', nargs='?', help="Question to answer")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run as a long-lived worker speaking JSON lines on stdin/stdout")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('RAG_WORKER_THREADS', '4')),
+                        help="Concurrent queries per worker in --serve mode")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Bypass the answer cache for this query")
+    parser.add_argument('--stream', action='store_true',
+                        help="Emit sources and answer deltas as JSON lines")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="Answer queries from a JSONL file ('-' for stdin), writing JSONL results")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Concurrent Mistral calls in --batch mode")
+    parser.add_argument('--debug', action='store_true',
+                        help="Log every Mistral prompt to stderr")
+    args = parser.parse_args()
+    if args.debug:
+        os.environ['RAG_LOG_PROMPTS'] = 'on'
+    
+    if args.serve:
+        serve(RAGService(), args.workers)
+        return
+    
+    if args.batch:
+        run_batch(RAGService(), args.batch, not args.no_cache, args.concurrency)
+        return
+    
+    if not args.query:
+        print("Usage: python rag_service.py <query> | --serve [--workers N] | --batch FILE", file=sys.stderr)
         sys.exit(1)
     
-    query = sys.argv[1]
+    # A one-shot process also pays for interpreter imports and index loading
+    timings = Timings()
+    timings.add('imports', (timings.started - _IMPORT_START) * 1000)
+    with timings.span('init'):
+        rag_service = RAGService()
+    if args.stream:
+        for event in rag_service.process_query_stream(args.query, use_cache=not args.no_cache):
+            print(json.dumps(event), flush=True)
+        return
     
-    rag_service = RAGService()
-    result = rag_service.process_query(query)
+    result = rag_service.process_query(args.query, use_cache=not args.no_cache, timings=timings)
     
     # Output JSON response
     print(json.dumps(result))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark for the Ghana STG RAG service.
+Runs the checked-in query set (retrieval_benchmark.jsonl) through
+RAGService.retrieve_relevant_chunks for each retrieval mode with Mistral
+disabled, and reports latency percentiles, throughput, peak RSS, index build
+time and recall@k on the labeled queries as JSON, so runs can be compared
+across commits.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import List, Dict, Any
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retrieval_benchmark.jsonl')
+RECALL_CUTOFFS = (1, 3, 5)
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    """Read benchmark queries.
+
+    Labeled lines name the guideline section that answers the query and list
+    the ids of its chunks as ``relevant``.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                queries.append(json.loads(line))
+    return queries
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def is_relevant(chunk: Dict[str, Any], relevant: List[str]) -> bool:
+    """Whether a result (a chunk, or a passage of '+'-joined chunk ids) overlaps the labeled section."""
+    return any(chunk_id in relevant for chunk_id in chunk.get('id', '').split('+'))
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_mode(mode: str, queries: List[Dict[str, Any]], top_k: int, passes: int,
+             section_candidates: int) -> Dict[str, Any]:
+    """Benchmark one retrieval mode in the current process."""
+    # Retrieval only: no Mistral client, no answer or query caching
+    os.environ.pop('MISTRAL_API_KEY', None)
+    os.environ['RAG_QUERY_CACHE_SIZE'] = '0'
+    from rag_service import RAGService
+
+    start = time.perf_counter()
+    service = RAGService(retrieval_mode=mode, section_candidates=section_candidates)
+    load_seconds = time.perf_counter() - start
+
+    # Rebuild every index from a copy of the chunks that has no sidecar files
+    build_dir = tempfile.mkdtemp(prefix='stg-bench-')
+    try:
+        source_file = service.chunks_file
+        service.chunks_file = os.path.join(build_dir, os.path.basename(source_file))
+        shutil.copyfile(source_file, service.chunks_file)
+        start = time.perf_counter()
+        service.reload_chunks()
+        build_seconds = time.perf_counter() - start
+    finally:
+        service.chunks_file = source_file
+        service.reload_chunks()
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    latencies = []
+    hits = {cutoff: 0 for cutoff in RECALL_CUTOFFS if cutoff <= top_k}
+    labeled = [item for item in queries if item.get('relevant')]
+    run_start = time.perf_counter()
+    for pass_number in range(passes):
+        for item in queries:
+            start = time.perf_counter()
+            chunks = service.retrieve_relevant_chunks(item['query'], top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if pass_number == 0 and item.get('relevant'):
+                ranks = [rank for rank, chunk in enumerate(chunks, 1) if is_relevant(chunk, item['relevant'])]
+                for cutoff in hits:
+                    if ranks and ranks[0] <= cutoff:
+                        hits[cutoff] += 1
+    elapsed = time.perf_counter() - run_start
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'queries': len(latencies),
+        'load_seconds': round(load_seconds, 3),
+        'build_seconds': round(build_seconds, 3),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'queries_per_second': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'labeled_queries': len(labeled),
+        'recall': {f'@{cutoff}': round(count / len(labeled), 3) if labeled else None
+                   for cutoff, count in hits.items()}
+    }
+
+
+def available_modes() -> List[str]:
+    from dense_index import NUMPY_AVAILABLE
+    if NUMPY_AVAILABLE:
+        return ['keyword', 'bm25', 'dense', 'hybrid']
+    return ['keyword', 'bm25']
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval latency and recall")
+    parser.add_argument('--modes', default=None,
+                        help="Comma-separated retrieval modes (default: all available)")
+    parser.add_argument('--queries', default=DEFAULT_QUERIES, help="JSONL query set")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--passes', type=int, default=3, help="Times to run the query set per mode")
+    parser.add_argument('--section-candidates', type=int, default=0,
+                        help="Enable two-stage retrieval over the N best sections")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--single', metavar='MODE', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+
+    if args.single:
+        # Child process: one mode, so peak RSS is not shared with other modes
+        print(json.dumps(run_mode(args.single, queries, args.top_k, args.passes, args.section_candidates)))
+        return
+
+    modes = args.modes.split(',') if args.modes else available_modes()
+    results = []
+    for mode in modes:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--single', mode, '--queries', args.queries,
+             '--top-k', str(args.top_k), '--passes', str(args.passes),
+             '--section-candidates', str(args.section_candidates)],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(f"Benchmark for {mode} failed: {child.stderr.strip()}", file=sys.stderr)
+            continue
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode:8} p50 {result['p50_ms']:.3f}ms  p95 {result['p95_ms']:.3f}ms  "
+              f"p99 {result['p99_ms']:.3f}ms  {result['queries_per_second']:.0f} q/s  "
+              f"build {result['build_seconds']:.2f}s  rss {result['peak_rss_mb']}MB  "
+              f"recall {result['recall']}", file=sys.stderr)
+
+    report = json.dumps({
+        'revision': git_revision(),
+        'timestamp': round(time.time()),
+        'query_set': os.path.basename(args.queries),
+        'top_k': args.top_k,
+        'passes': args.passes,
+        'section_candidates': args.section_candidates,
+        'results': results
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,36 @@
 import type { Express } from "express";
 import { createServer, type Server } from "http";
 import { storage } from "./storage";
-import { chatRequestSchema, chatResponseSchema, generateCaseStudyRequestSchema, submitAnswersRequestSchema } from "@shared/schema";
+import { chatRequestSchema, chatResponseSchema, generateCaseStudyRequestSchema, submitAnswersRequestSchema, submitAnswersBatchRequestSchema } from "@shared/schema";
 import { spawn } from "child_process";
 import path from "path";
 import fs from "fs";
+import { PythonWorkerPool } from "./python-worker";
+
+// Persistent RAG workers keep the chunk index and Mistral client loaded
+// between requests. RAG_WORKER_PROCESSES=0 falls back to one process per query.
+const ragWorkerProcesses = parseInt(process.env.RAG_WORKER_PROCESSES ?? "1", 10);
+const ragWorkerPool = ragWorkerProcesses > 0
+  ? new PythonWorkerPool(
+      'RAG',
+      path.join(process.cwd(), 'server', 'rag_service.py'),
+      ['--serve', '--workers', process.env.RAG_WORKER_THREADS ?? '4'],
+      ragWorkerProcesses,
+    )
+  : null;
+
+// Persistent case study workers keep the chunks, illness index and pool open,
+// so generating and scoring skip the process spawn and index load per request;
+// CASE_STUDY_WORKER_PROCESSES=0 falls back to one process per request.
+const caseStudyWorkerProcesses = parseInt(process.env.CASE_STUDY_WORKER_PROCESSES ?? "1", 10);
+const caseStudyWorkerPool = caseStudyWorkerProcesses > 0
+  ? new PythonWorkerPool(
+      'Case study',
+      path.join(process.cwd(), 'server', 'case_study_service.py'),
+      ['serve', '--workers', process.env.CASE_STUDY_WORKER_THREADS ?? '4'],
+      caseStudyWorkerProcesses,
+    )
+  : null;
 
 export async function registerRoutes(app: Express): Promise<Server> {
   // Enable CORS for frontend access
@@ -33,6 +59,31 @@ export async function registerRoutes(app: Express): Promise<Server> {
         sources: null,
       });
 
+      // Stream sources and answer deltas as server-sent events when requested
+      if (req.headers.accept?.includes('text/event-stream')) {
+        res.writeHead(200, {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache',
+          'Connection': 'keep-alive',
+        });
+        const sendEvent = (event: string, data: any) => {
+          res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+        };
+
+        const response = await streamRAGService(question, (event) => sendEvent(event.type, event));
+
+        await storage.addChatMessage({
+          sessionId,
+          role: 'assistant',
+          content: response.answer,
+          sources: response.sources,
+        });
+
+        sendEvent('done', { answer: response.answer, sources: response.sources, sessionId });
+        res.end();
+        return;
+      }
+
       // Call Python RAG service
       const response = await callRAGService(question);
       
@@ -53,9 +104,13 @@ export async function registerRoutes(app: Express): Promise<Server> {
       res.json(chatResponse);
     } catch (error) {
       console.error('Chat endpoint error:', error);
-      res.status(500).json({ 
-        message: "Unable to process your medical question. Please try again." 
-      });
+      const message = "Unable to process your medical question. Please try again.";
+      if (res.headersSent) {
+        res.write(`event: error\ndata: ${JSON.stringify({ message })}\n\n`);
+        res.end();
+        return;
+      }
+      res.status(500).json({ message });
     }
   });
 
@@ -77,8 +132,9 @@ export async function registerRoutes(app: Express): Promise<Server> {
       const validatedData = generateCaseStudyRequestSchema.parse(req.body);
       const { sessionId = generateSessionId() } = validatedData;
 
-      // Call case study generator service
-      const caseStudyData = await callCaseStudyGenerator("generate");
+      // Call the case study worker; it serves a pre-generated case this
+      // session has not seen when the pool has one
+      const caseStudyData = await callCaseStudyGenerator(sessionId);
       
       // Store case study in database
       const caseStudy = await storage.addCaseStudy({
@@ -147,6 +203,64 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Submit answers for many case studies at once, e.g. a whole class at the
+  // end of a session; submissions are scored concurrently in one worker call
+  app.post("/api/case-study/submit-batch", async (req, res) => {
+    try {
+      const { submissions } = submitAnswersBatchRequestSchema.parse(req.body);
+
+      const caseStudies = await Promise.all(
+        submissions.map((submission) => storage.getCaseStudyById(submission.caseStudyId))
+      );
+      const found = submissions.flatMap((submission, index) => {
+        const caseStudy = caseStudies[index];
+        return caseStudy ? [{ submission, caseStudy }] : [];
+      });
+
+      const evaluations = found.length > 0
+        ? await callCaseStudyBatchEvaluator(found.map(({ submission, caseStudy }) => ({
+            id: submission.caseStudyId,
+            correct_diagnosis: caseStudy.correctDiagnosis,
+            correct_treatment: caseStudy.correctTreatment,
+            user_diagnosis: submission.diagnosis,
+            user_treatment: submission.treatment,
+          })))
+        : [];
+
+      const results = await Promise.all(submissions.map(async (submission, index) => {
+        if (!caseStudies[index]) {
+          return { caseStudyId: submission.caseStudyId, error: "Case study not found" };
+        }
+        const evaluation = evaluations[found.findIndex((item) => item.submission === submission)];
+        if (!evaluation || evaluation.error) {
+          return { caseStudyId: submission.caseStudyId, error: evaluation?.error ?? "Evaluation failed" };
+        }
+        const updatedCaseStudy = await storage.updateCaseStudy(submission.caseStudyId, {
+          userDiagnosis: submission.diagnosis,
+          userTreatment: submission.treatment,
+          diagnosisScore: evaluation.diagnosis_score,
+          treatmentScore: evaluation.treatment_score,
+          feedback: evaluation.feedback,
+          isCompleted: true,
+        });
+        return {
+          caseStudyId: submission.caseStudyId,
+          diagnosisScore: updatedCaseStudy.diagnosisScore!,
+          treatmentScore: updatedCaseStudy.treatmentScore!,
+          feedback: updatedCaseStudy.feedback!,
+          correctDiagnosis: updatedCaseStudy.correctDiagnosis,
+          correctTreatment: updatedCaseStudy.correctTreatment,
+          isCompleted: updatedCaseStudy.isCompleted!,
+        };
+      }));
+
+      res.json({ results });
+    } catch (error) {
+      console.error("Error submitting case study answers in batch:", error);
+      res.status(500).json({ message: "Failed to submit answers" });
+    }
+  });
+
   // Get case studies for a session
   app.get("/api/case-study/:sessionId", async (req, res) => {
     try {
@@ -169,6 +283,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
 
   // Initialize document processing on startup
   initializeDocumentProcessing();
+  startCaseStudyPoolRefill();
 
   const httpServer = createServer(app);
   return httpServer;
@@ -179,9 +294,20 @@ function generateSessionId(): string {
 }
 
 async function callRAGService(question: string): Promise<any> {
+  if (ragWorkerPool) {
+    try {
+      return await ragWorkerPool.request({ query: question });
+    } catch (error) {
+      console.error('RAG worker request failed, spawning a one-off process:', error);
+    }
+  }
+  return spawnRAGService(question);
+}
+
+async function spawnRAGService(question: string): Promise<any> {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(process.cwd(), 'server', 'rag_service.py');
-    const pythonProcess = spawn('python3', [pythonScript, question]);
+    const pythonProcess = spawn('python3', [pythonScript, '--', question]);
     
     let output = '';
     let errorOutput = '';
@@ -213,10 +339,96 @@ async function callRAGService(question: string): Promise<any> {
   });
 }
 
-async function callCaseStudyGenerator(command: string): Promise<any> {
+async function streamRAGService(question: string, onEvent: (event: any) => void): Promise<any> {
+  let eventsSent = 0;
+  const forward = (event: any) => {
+    eventsSent++;
+    onEvent(event);
+  };
+
+  if (ragWorkerPool) {
+    try {
+      return await ragWorkerPool.request({ query: question, stream: true }, forward);
+    } catch (error) {
+      // Retrying after partial output would repeat events the client already has
+      if (eventsSent > 0) throw error;
+      console.error('RAG worker stream failed, spawning a one-off process:', error);
+    }
+  }
+  return spawnRAGServiceStream(question, forward);
+}
+
+async function spawnRAGServiceStream(question: string, onEvent: (event: any) => void): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const pythonScript = path.join(process.cwd(), 'server', 'rag_service.py');
+    const pythonProcess = spawn('python3', [pythonScript, '--stream', '--', question]);
+
+    let buffered = '';
+    let errorOutput = '';
+    const result = { answer: '', sources: [] as any[] };
+
+    const handleLine = (line: string) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line);
+      if (event.type === 'sources') {
+        result.sources = event.sources;
+      } else if (event.type === 'done') {
+        result.answer = event.answer;
+        return;
+      }
+      onEvent(event);
+    };
+
+    pythonProcess.stdout.on('data', (data) => {
+      buffered += data.toString();
+      const lines = buffered.split('\n');
+      buffered = lines.pop() ?? '';
+      try {
+        lines.forEach(handleLine);
+      } catch (error) {
+        pythonProcess.kill();
+        reject(new Error(`Failed to parse RAG service stream: ${error}`));
+      }
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorOutput += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      if (code === 0) {
+        try {
+          handleLine(buffered);
+          resolve(result);
+        } catch (error) {
+          reject(new Error(`Failed to parse RAG service stream: ${error}`));
+        }
+      } else {
+        reject(new Error(`RAG service failed with code ${code}: ${errorOutput}`));
+      }
+    });
+
+    pythonProcess.on('error', (error) => {
+      reject(new Error(`Failed to start RAG service: ${error.message}`));
+    });
+  });
+}
+
+async function callCaseStudyGenerator(sessionId: string): Promise<any> {
+  if (caseStudyWorkerPool) {
+    try {
+      return await caseStudyWorkerPool.request({ command: 'generate', session_id: sessionId });
+    } catch (error) {
+      console.error('Case study worker request failed, spawning a one-off process:', error);
+    }
+  }
+  return spawnCaseStudyGenerator(sessionId);
+}
+
+async function spawnCaseStudyGenerator(sessionId: string): Promise<any> {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(process.cwd(), 'server', 'case_study_service.py');
-    const pythonProcess = spawn('python3', [pythonScript, command]);
+    const pythonProcess = spawn('python3', [pythonScript, 'generate', '--session', sessionId]);
     
     let output = '';
     let errorOutput = '';
@@ -249,6 +461,23 @@ async function callCaseStudyGenerator(command: string): Promise<any> {
 }
 
 async function callCaseStudyEvaluator(correctDiagnosis: string, correctTreatment: string, userDiagnosis: string, userTreatment: string): Promise<any> {
+  if (caseStudyWorkerPool) {
+    try {
+      return await caseStudyWorkerPool.request({
+        command: 'evaluate',
+        correct_diagnosis: correctDiagnosis,
+        correct_treatment: correctTreatment,
+        user_diagnosis: userDiagnosis,
+        user_treatment: userTreatment,
+      });
+    } catch (error) {
+      console.error('Case study worker request failed, spawning a one-off process:', error);
+    }
+  }
+  return spawnCaseStudyEvaluator(correctDiagnosis, correctTreatment, userDiagnosis, userTreatment);
+}
+
+async function spawnCaseStudyEvaluator(correctDiagnosis: string, correctTreatment: string, userDiagnosis: string, userTreatment: string): Promise<any> {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(process.cwd(), 'server', 'case_study_service.py');
     const pythonProcess = spawn('python3', [pythonScript, 'evaluate', correctDiagnosis, correctTreatment, userDiagnosis, userTreatment]);
@@ -283,18 +512,93 @@ async function callCaseStudyEvaluator(correctDiagnosis: string, correctTreatment
   });
 }
 
+async function callCaseStudyBatchEvaluator(submissions: Record<string, any>[]): Promise<any[]> {
+  if (caseStudyWorkerPool) {
+    try {
+      const response = await caseStudyWorkerPool.request({ command: 'evaluate_batch', submissions });
+      return response.results;
+    } catch (error) {
+      console.error('Case study worker batch request failed, spawning a one-off process:', error);
+    }
+  }
+  return spawnCaseStudyBatchEvaluator(submissions);
+}
+
+async function spawnCaseStudyBatchEvaluator(submissions: Record<string, any>[]): Promise<any[]> {
+  return new Promise((resolve, reject) => {
+    const pythonScript = path.join(process.cwd(), 'server', 'case_study_service.py');
+    const pythonProcess = spawn('python3', [pythonScript, 'evaluate-batch', '-']);
+    
+    let output = '';
+    let errorOutput = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      output += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorOutput += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      if (code === 0) {
+        try {
+          resolve(output.split('\n').filter((line) => line.trim()).map((line) => JSON.parse(line)));
+        } catch (error) {
+          reject(new Error(`Failed to parse batch evaluation response: ${error}`));
+        }
+      } else {
+        reject(new Error(`Batch evaluation service failed with code ${code}: ${errorOutput}`));
+      }
+    });
+
+    pythonProcess.on('error', (error) => {
+      reject(new Error(`Failed to start batch evaluation service: ${error.message}`));
+    });
+
+    pythonProcess.stdin.end(submissions.map((submission) => JSON.stringify(submission)).join('\n') + '\n');
+  });
+}
+
+// Keeps the case study pool topped up in the background, pacing its Mistral
+// calls; the worker exits when its stdin closes with this process
+function startCaseStudyPoolRefill() {
+  const poolSetting = (process.env.CASE_STUDY_POOL ?? 'on').toLowerCase();
+  if (['off', 'false', '0'].includes(poolSetting) || !process.env.MISTRAL_CASE_STUDY_API_KEY) {
+    return;
+  }
+
+  const pythonScript = path.join(process.cwd(), 'server', 'case_study_service.py');
+  const refillProcess = spawn('python3', [pythonScript, 'refill', '--watch'], {
+    stdio: ['pipe', 'ignore', 'inherit'],
+  });
+
+  refillProcess.on('close', (code) => {
+    console.error(`Case study pool refill worker exited with code ${code}`);
+  });
+
+  refillProcess.on('error', (error) => {
+    console.error(`Failed to start case study pool refill worker: ${error.message}`);
+  });
+}
+
 function initializeDocumentProcessing() {
   const pythonScript = path.join(process.cwd(), 'server', 'simple_document_processor.py');
   const docPath = path.join(process.cwd(), 'attached_assets', 'pharmacy_guide.docx');
   
-  // Check if chunks already exist
   const chunksFile = path.join(process.cwd(), 'server', 'processed_chunks.json');
-  if (fs.existsSync(chunksFile)) {
-    console.log('Document chunks already processed');
+  if (!fs.existsSync(docPath)) {
+    if (fs.existsSync(chunksFile)) {
+      console.log('Document chunks already processed');
+    } else {
+      console.error(`Guideline document not found: ${docPath}`);
+    }
     return;
   }
-  
-  const pythonProcess = spawn('python3', [pythonScript, docPath]);
+
+  // Exits at once when the document is unchanged; otherwise sections whose
+  // content hash changed are re-chunked and every index file is rebuilt
+  const pythonProcess = spawn('python3', [pythonScript, '--reuse-chunks', docPath]);
   
   pythonProcess.on('close', (code) => {
     if (code === 0) {
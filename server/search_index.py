@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Search index structures for the Ghana Standard Treatment Guidelines knowledge base.
+Builds term -> posting-list indexes over processed chunks so retrieval only touches
+chunks that share a term with the query. Also provides BM25 statistics for ranked
+retrieval, a section-level index for two-stage retrieval, a positional phrase
+index and a trigram index for typo-tolerant term lookup.
+"""
+
+import os
+import sys
+import json
+import math
+import heapq
+import re
+from typing import List, Dict, Any, Set, Tuple, Optional
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Maximal runs of letters in lowercased chunk content. Any letters-only query
+# term that occurs in the content as a substring lies inside one of these runs.
+TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+# Tokens for phrase matching; unlike ranked retrieval, short terms are kept
+PHRASE_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Upper bound on memoized substring lookups kept by a long-lived index
+SUBSTRING_CACHE_SIZE = 4096
+
+
+def chunk_ids(chunks: List[Dict[str, Any]]) -> List[str]:
+    """Ids of all chunks; a ChunkStore provides them without decoding each chunk."""
+    ids = getattr(chunks, 'ids', None)
+    return ids() if ids is not None else [chunk.get('id') for chunk in chunks]
+
+
+class InvertedIndex:
+    def __init__(self, chunks: List[Dict[str, Any]]):
+        # keyword -> chunk positions whose stored keyword list contains it
+        self.keyword_postings: Dict[str, List[int]] = {}
+        # content token -> chunk positions whose content contains the token
+        self.token_postings: Dict[str, List[int]] = {}
+        self._substring_cache: Dict[str, Set[int]] = {}
+        self.build(chunks)
+
+    @classmethod
+    def load(cls, chunks: List[Dict[str, Any]]) -> 'InvertedIndex':
+        """Use the posting lists stored in a ChunkStore, building them from chunks otherwise."""
+        stored = getattr(chunks, 'postings', None)
+        postings = stored() if stored is not None else None
+        if postings is None:
+            return cls(chunks)
+        index = cls([])
+        index.keyword_postings, index.token_postings = postings
+        return index
+
+    def build(self, chunks: List[Dict[str, Any]]) -> None:
+        """Build posting lists for every chunk, in chunk order."""
+        self.keyword_postings.clear()
+        self.token_postings.clear()
+        self._substring_cache.clear()
+
+        for position, chunk in enumerate(chunks):
+            for keyword in set(chunk.get('keywords', [])):
+                self.keyword_postings.setdefault(keyword, []).append(position)
+            for token in set(TOKEN_PATTERN.findall(chunk.get('content', '').lower())):
+                self.token_postings.setdefault(token, []).append(position)
+
+    def keyword_matches(self, keyword: str) -> List[int]:
+        """Chunks whose keyword list contains the keyword exactly."""
+        return self.keyword_postings.get(keyword, [])
+
+    def substring_matches(self, term: str) -> Set[int]:
+        """Chunks whose lowercased content contains the letters-only term as a substring."""
+        matches = self._substring_cache.get(term)
+        if matches is None:
+            matches = set()
+            for token, postings in self.token_postings.items():
+                if term in token:
+                    matches.update(postings)
+            if len(self._substring_cache) >= SUBSTRING_CACHE_SIZE:
+                self._substring_cache.clear()
+            self._substring_cache[term] = matches
+        return matches
+
+
+# Words ignored when tokenizing for ranked retrieval
+STOPWORDS = {
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
+    'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his',
+    'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy',
+    'did', 'its', 'let', 'put', 'say', 'she', 'too', 'use', 'with', 'this',
+    'that', 'from', 'they', 'know', 'want', 'been', 'good', 'much', 'some',
+    'time', 'very', 'when', 'come', 'here', 'just', 'like', 'long', 'make',
+    'many', 'over', 'such', 'take', 'than', 'them', 'well', 'were', 'what',
+    'will', 'into', 'should', 'which', 'there', 'their', 'these', 'those',
+    'also', 'may', 'other', 'any', 'per', 'is', 'of', 'in', 'to', 'or', 'be',
+    'as', 'at', 'by', 'if', 'on', 'an', 'it', 'e', 'g', 'i', 'a'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric terms for ranked retrieval."""
+    return [
+        token for token in re.findall(r'[a-z0-9]+', text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def write_stats(stats: Dict[str, Any], path: str) -> None:
+    """Write ingest-time index statistics as compact JSON, atomically replacing any existing file."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # dumps rather than dump: only one-shot encoding uses the C encoder
+        f.write(json.dumps(stats, separators=(',', ':')))
+    os.replace(tmp_path, path)
+
+
+def read_stats(path: str, chunks: List[Dict[str, Any]], label: str) -> Optional[Dict[str, Any]]:
+    """Read ingest-time statistics, or None if missing or built for other chunks."""
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            if stats.get('chunk_ids') == chunk_ids(chunks):
+                return stats
+    except Exception as e:
+        print(f"Error loading {label}: {e}", file=sys.stderr)
+    return None
+
+
+class BM25Index:
+    """Okapi BM25 ranking over the chunk store.
+
+    Term statistics are computed once at ingest (see ``build_stats``) and
+    stored next to ``processed_chunks.json``; query scoring then reduces to
+    summing precomputed per-term weight vectors.
+    """
+
+    def __init__(self, stats: Dict[str, Any]):
+        self.k1 = stats['k1']
+        self.b = stats['b']
+        self.num_chunks = len(stats['doc_lengths'])
+        self.idf: Dict[str, float] = {}
+        # term -> (chunk positions, BM25 weight of the term in each chunk)
+        self.weights: Dict[str, Any] = {}
+
+        avgdl = stats['avgdl'] or 1.0
+        doc_lengths = stats['doc_lengths']
+        for term, (positions, freqs) in stats['postings'].items():
+            df = len(positions)
+            idf = math.log(1 + (self.num_chunks - df + 0.5) / (df + 0.5))
+            self.idf[term] = idf
+            term_weights = [
+                idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_lengths[pos] / avgdl))
+                for pos, tf in zip(positions, freqs)
+            ]
+            if NUMPY_AVAILABLE:
+                self.weights[term] = (np.asarray(positions, dtype=np.int32),
+                                      np.asarray(term_weights, dtype=np.float32))
+            else:
+                self.weights[term] = (positions, term_weights)
+
+    @staticmethod
+    def build_stats(chunks: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75) -> Dict[str, Any]:
+        """Compute per-term postings, term frequencies and chunk lengths."""
+        postings: Dict[str, List[List[int]]] = {}
+        doc_lengths = []
+        for position, chunk in enumerate(chunks):
+            tokens = tokenize(chunk.get('content', ''))
+            doc_lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                entry = postings.setdefault(token, [[], []])
+                entry[0].append(position)
+                entry[1].append(tf)
+
+        return {
+            'k1': k1,
+            'b': b,
+            'avgdl': sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0,
+            'doc_lengths': doc_lengths,
+            'chunk_ids': [chunk.get('id') for chunk in chunks],
+            'postings': postings
+        }
+
+    @staticmethod
+    def stats_path(chunks_file: str) -> str:
+        """Location of the BM25 statistics stored alongside a chunks file."""
+        return os.path.splitext(chunks_file)[0] + '.bm25.json'
+
+    @staticmethod
+    def save_stats(stats: Dict[str, Any], path: str) -> None:
+        write_stats(stats, path)
+
+    @classmethod
+    def load(cls, chunks: List[Dict[str, Any]], chunks_file: str) -> 'BM25Index':
+        """Load ingest-time statistics, rebuilding them if missing or stale."""
+        stats = read_stats(cls.stats_path(chunks_file), chunks, 'BM25 statistics')
+        return cls(stats if stats is not None else cls.build_stats(chunks))
+
+    def search(self, query: str, top_k: int = 5,
+               candidates: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Return (chunk position, score) pairs for the best matching chunks.
+
+        When candidates is given, only those chunk positions are ranked.
+        """
+        terms = [term for term in tokenize(query) if term in self.weights]
+        if not terms:
+            return []
+
+        if NUMPY_AVAILABLE:
+            scores = np.zeros(self.num_chunks, dtype=np.float32)
+            for term in terms:
+                positions, term_weights = self.weights[term]
+                scores[positions] += term_weights
+            if candidates is not None:
+                allowed = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                matched = allowed[scores[allowed] > 0]
+            else:
+                matched = np.flatnonzero(scores)
+            if len(matched) > top_k:
+                top = np.argpartition(-scores[matched], top_k - 1)[:top_k]
+                matched = matched[top]
+            ranked = sorted(matched.tolist(), key=lambda pos: (-scores[pos], pos))
+            return [(pos, float(scores[pos])) for pos in ranked]
+
+        totals: Dict[int, float] = {}
+        for term in terms:
+            positions, term_weights = self.weights[term]
+            for pos, weight in zip(positions, term_weights):
+                if candidates is None or pos in candidates:
+                    totals[pos] = totals.get(pos, 0.0) + weight
+        return heapq.nsmallest(top_k, totals.items(), key=lambda item: (-item[1], item[0]))
+
+
+class SectionIndex:
+    """Section-level BM25 index for two-stage retrieval.
+
+    Each guideline section (all chunks sharing a section title) is indexed as
+    one pseudo-document made of its title, repeated for weight, and the
+    aggregated vocabulary of its chunks. Retrieval first picks the best
+    sections, then only their chunks are scored.
+    """
+
+    # Repetitions of the section title in its pseudo-document
+    TITLE_WEIGHT = 3
+
+    def __init__(self, chunks: List[Dict[str, Any]]):
+        self.section_ids: Dict[str, int] = {}
+        self.sections: List[str] = []
+        # section id -> chunk positions in document order
+        self.members: List[List[int]] = []
+        self.chunk_sections: List[int] = []
+
+        contents: List[List[str]] = []
+
+        def section_id_for(section: str) -> int:
+            section_id = self.section_ids.get(section)
+            if section_id is None:
+                section_id = self.section_ids[section] = len(self.sections)
+                self.sections.append(section)
+                self.members.append([])
+                contents.append([section] * self.TITLE_WEIGHT)
+            return section_id
+
+        for position, chunk in enumerate(chunks):
+            section_id = section_id_for(chunk.get('section', ''))
+            self.members[section_id].append(position)
+            self.chunk_sections.append(section_id)
+            contents[section_id].append(chunk.get('content', ''))
+            # A chunk kept for near-duplicates also belongs to their sections
+            for reference in chunk.get('also_in', ()):
+                other_id = section_id_for(reference.get('section', ''))
+                if other_id != section_id:
+                    self.members[other_id].append(position)
+                    contents[other_id].append(chunk.get('content', ''))
+
+        pseudo_documents = [
+            {'id': section, 'content': ' '.join(parts)}
+            for section, parts in zip(self.sections, contents)
+        ]
+        self.bm25 = BM25Index(BM25Index.build_stats(pseudo_documents))
+
+    def top_sections(self, query: str, num_sections: int) -> List[int]:
+        """Ids of the sections that best match the query."""
+        return [section_id for section_id, _ in self.bm25.search(query, num_sections)]
+
+    def candidate_chunks(self, query: str, num_sections: int) -> Set[int]:
+        """Positions of every chunk inside the best matching sections."""
+        candidates: Set[int] = set()
+        for section_id in self.top_sections(query, num_sections):
+            candidates.update(self.members[section_id])
+        return candidates
+
+    def merge_adjacent(self, ranked: List[Tuple[int, float]], max_gap: int = 1) -> List[List[int]]:
+        """Group ranked chunk positions into runs of nearby chunks from the same section.
+
+        Hits in the same section separated by at most max_gap chunks are merged
+        together with the chunks between them. Groups keep the rank of their
+        best hit.
+        """
+        groups: List[List[int]] = []
+        for position, _ in ranked:
+            section_id = self.chunk_sections[position]
+            for group in groups:
+                if (self.chunk_sections[group[0]] == section_id and
+                        group[0] - max_gap - 1 <= position <= group[-1] + max_gap + 1):
+                    start, end = min(group[0], position), max(group[-1], position)
+                    group[:] = [pos for pos in range(start, end + 1)
+                                if self.chunk_sections[pos] == section_id]
+                    break
+            else:
+                groups.append([position])
+        return groups
+
+
+class PhraseIndex:
+    """Positional index for exact multi-word phrase lookup.
+
+    Records where every token (including short ones such as "uti" or "dka")
+    occurs in each chunk, so "severe malaria" or "peptic ulcer disease" can be
+    matched as consecutive words rather than as independent tokens.
+    """
+
+    def __init__(self, stats: Dict[str, Any]):
+        # token -> flat [chunk, count, offset, ...] postings as stored
+        self._flat: Dict[str, List[int]] = stats['postings']
+        # token -> {chunk position -> token offsets within the chunk}, decoded on first use
+        self.postings: Dict[str, Dict[int, Set[int]]] = {}
+
+    def _positions(self, token: str) -> Optional[Dict[int, Set[int]]]:
+        chunk_positions = self.postings.get(token)
+        if chunk_positions is None:
+            flat = self._flat.get(token)
+            if flat is None:
+                return None
+            chunk_positions = {}
+            i = 0
+            while i < len(flat):
+                position, count = flat[i], flat[i + 1]
+                chunk_positions[position] = set(flat[i + 2:i + 2 + count])
+                i += 2 + count
+            self.postings[token] = chunk_positions
+        return chunk_positions
+
+    @staticmethod
+    def build_stats(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compute token offsets per chunk.
+
+        Each token's postings are stored flat as [chunk, count, offset, ...].
+        """
+        postings: Dict[str, List[int]] = {}
+        for position, chunk in enumerate(chunks):
+            offsets: Dict[str, List[int]] = {}
+            for offset, token in enumerate(PHRASE_TOKEN_PATTERN.findall(chunk.get('content', '').lower())):
+                offsets.setdefault(token, []).append(offset)
+            for token, token_offsets in offsets.items():
+                postings.setdefault(token, []).extend([position, len(token_offsets)] + token_offsets)
+        return {
+            'chunk_ids': [chunk.get('id') for chunk in chunks],
+            'postings': postings
+        }
+
+    @staticmethod
+    def stats_path(chunks_file: str) -> str:
+        """Location of the phrase index stored alongside a chunks file."""
+        return os.path.splitext(chunks_file)[0] + '.phrases.json'
+
+    @staticmethod
+    def save_stats(stats: Dict[str, Any], path: str) -> None:
+        write_stats(stats, path)
+
+    @classmethod
+    def load(cls, chunks: List[Dict[str, Any]], chunks_file: str) -> 'PhraseIndex':
+        """Load the ingest-time phrase index, rebuilding it if missing or stale."""
+        stats = read_stats(cls.stats_path(chunks_file), chunks, 'phrase index')
+        return cls(stats if stats is not None else cls.build_stats(chunks))
+
+    def document_frequency(self, token: str) -> int:
+        return len(self._positions(token) or ())
+
+    def term_matches(self, token: str) -> Set[int]:
+        """Chunks containing the token as a whole word."""
+        return set(self._positions(token) or ())
+
+    def phrase_matches(self, tokens: Tuple[str, ...]) -> Set[int]:
+        """Chunks containing the tokens as consecutive words."""
+        if not tokens:
+            return set()
+        token_postings = [self._positions(token) for token in tokens]
+        if not all(token_postings):
+            return set()
+        # Intersect chunk sets starting from the rarest token
+        chunks = set(min(token_postings, key=len))
+        for chunk_positions in token_postings:
+            chunks.intersection_update(chunk_positions)
+            if not chunks:
+                return chunks
+        if len(tokens) == 1:
+            return chunks
+        return {
+            position for position in chunks
+            if any(all(start + i in token_postings[i][position] for i in range(1, len(tokens)))
+                   for start in token_postings[0][position])
+        }
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent transpositions as one edit (optimal string alignment).
+
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if (before_previous is not None and j > 1 and
+                    char_a == b[j - 2] and a[i - 2] == char_b):
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """Character-trigram index over the corpus vocabulary for typo-tolerant lookup.
+
+    Maps a misspelled term ("amoxcillin", "diarrhea") to the closest corpus
+    term by first gathering terms that share trigrams with it, then verifying
+    only those few candidates with a bounded edit distance.
+    """
+
+    # Shorter terms are too ambiguous to correct ("kids" is one edit from "aids")
+    MIN_LENGTH = 5
+    # Minimum Dice overlap of trigram sets for a candidate to be verified
+    MIN_SIMILARITY = 0.4
+    # Candidates with the highest overlap that are verified by edit distance
+    MAX_CANDIDATES = 12
+
+    def __init__(self, term_frequencies: Dict[str, int]):
+        self.terms: List[str] = []
+        self.frequencies: List[int] = []
+        self.trigram_counts: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for term, frequency in term_frequencies.items():
+            if len(term) < self.MIN_LENGTH:
+                continue
+            term_id = len(self.terms)
+            grams = self.trigrams(term)
+            self.terms.append(term)
+            self.frequencies.append(frequency)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(term_id)
+        self.vocabulary = set(term_frequencies)
+        self._closest_cache: Dict[str, Optional[str]] = {}
+
+    @staticmethod
+    def trigrams(term: str) -> Set[str]:
+        padded = f"${term}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def max_edits(term: str) -> int:
+        return 1 if len(term) <= 7 else 2
+
+    def closest(self, term: str) -> Optional[str]:
+        """Closest corpus term to a term missing from the vocabulary, if any is close enough."""
+        grams = self.trigrams(term)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for term_id in self.postings.get(gram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        size = len(grams)
+        similar = [
+            (2 * overlap / (size + self.trigram_counts[term_id]), term_id)
+            for term_id, overlap in shared.items()
+            if 2 * overlap >= self.MIN_SIMILARITY * (size + self.trigram_counts[term_id])
+        ]
+        similar = heapq.nlargest(self.MAX_CANDIDATES, similar)
+
+        limit = self.max_edits(term)
+        best = None
+        for _, term_id in similar:
+            candidate = self.terms[term_id]
+            distance = edit_distance(term, candidate, limit)
+            if distance > limit:
+                continue
+            rank = (distance, -self.frequencies[term_id], candidate)
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best else None
+
+    def correct(self, terms: List[str]) -> Dict[str, str]:
+        """Map each unknown term to its correction; known or uncorrectable terms are omitted."""
+        corrections = {}
+        for term in terms:
+            if len(term) < self.MIN_LENGTH or term in self.vocabulary or term in corrections:
+                continue
+            if term not in self._closest_cache:
+                if len(self._closest_cache) >= SUBSTRING_CACHE_SIZE:
+                    self._closest_cache.clear()
+                self._closest_cache[term] = self.closest(term)
+            replacement = self._closest_cache[term]
+            if replacement:
+                corrections[term] = replacement
+        return corrections
@@ -10,66 +10,39 @@ import json
 import hashlib
 import re
 from pathlib import Path
-from typing import List, Dict, Any
-
-try:
-    import docx
-except ImportError:
-    print("Installing python-docx...")
-    os.system("pip install python-docx")
-    import docx
+from typing import List, Dict, Any, Iterable, Iterator
+from near_duplicates import deduplicate_chunks
+from dense_index import DenseIndex, dense_retrieval_configured
+from docx_stream import iter_sections
+from ingest_manifest import IngestManifest, manifest_path, section_hash
+from index_writer import write_index
 
 class SimpleDocumentProcessor:
+    # Share of chunks that may be folded into the dense index before it is refitted
+    DENSE_REFIT_SHARE = 0.2
+
     def __init__(self):
         self.processed_chunks_file = os.path.join(os.path.dirname(__file__), 'processed_chunks.json')
 
-    def extract_text_from_docx(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text content from DOCX file with metadata."""
+    def extract_text_from_docx(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Stream sections from a DOCX file, split at its heading-styled paragraphs."""
         try:
-            doc = docx.Document(file_path)
-            sections = []
-            current_section = ""
-            current_title = "Introduction"
-            
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if not text:
-                    continue
-                
-                # Detect chapter/section headers (simple heuristic)
-                if (text.startswith('Chapter') or 
-                    text.startswith('CHAPTER') or
-                    len(text) < 100 and 
-                    any(keyword in text.upper() for keyword in ['DISORDERS', 'DISEASE', 'TREATMENT', 'CARE'])):
-                    
-                    if current_section:
-                        sections.append({
-                            'title': current_title,
-                            'content': current_section.strip(),
-                            'type': 'section'
-                        })
-                    current_title = text
-                    current_section = ""
-                else:
-                    current_section += f"\n{text}"
-            
-            # Add the last section
-            if current_section:
-                sections.append({
-                    'title': current_title,
-                    'content': current_section.strip(),
-                    'type': 'section'
-                })
-            
-            return sections
-            
+            yield from iter_sections(file_path, is_heading=self.is_heading)
         except Exception as e:
             print(f"Error extracting text from DOCX: {e}")
-            return []
+            raise
+
+    @staticmethod
+    def is_heading(text: str) -> bool:
+        """Header heuristic for documents without heading styles."""
+        return (text.startswith('Chapter') or
+                text.startswith('CHAPTER') or
+                len(text) < 100 and
+                any(keyword in text.upper() for keyword in ['DISORDERS', 'DISEASE', 'TREATMENT', 'CARE']))
 
-    def create_chunks(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Split sections into smaller chunks."""
-        chunks = []
+    def create_chunks(self, sections: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Split sections into smaller chunks as they stream in."""
+        chunk_count = 0
         
         for section in sections:
             content = section['content']
@@ -83,15 +56,14 @@ class SimpleDocumentProcessor:
                 chunk_text = '. '.join([s.strip() for s in chunk_sentences if s.strip()])
                 
                 if len(chunk_text) > 50:  # Only keep meaningful chunks
-                    chunks.append({
+                    yield {
                         'content': chunk_text + '.',
                         'title': section['title'],
                         'section': section['title'],
-                        'chunk_id': f"{len(chunks)}",
+                        'chunk_id': f"{chunk_count}",
                         'type': section['type']
-                    })
-        
-        return chunks
+                    }
+                    chunk_count += 1
 
     def extract_keywords(self, text: str) -> List[str]:
         """Extract important keywords from text."""
@@ -111,67 +83,128 @@ class SimpleDocumentProcessor:
         keywords = [word for word in words if word not in stopwords and len(word) > 3]
         return list(set(keywords))[:20]  # Limit to top 20 unique keywords
 
-    def store_chunks_locally(self, chunks: List[Dict[str, Any]]) -> bool:
+    def process_chunk(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the content hash id and keywords to a chunk."""
+        return {
+            'id': hashlib.md5(chunk['content'].encode()).hexdigest(),
+            'content': chunk['content'],
+            'title': chunk['title'],
+            'section': chunk['section'],
+            'chunk_id': chunk['chunk_id'],
+            'type': chunk['type'],
+            'keywords': self.extract_keywords(chunk['content'])
+        }
+
+    def deduplicate(self, processed_chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Collapse near-duplicate chunks (repeated dosing tables, referral notes)."""
+        dedup_threshold = float(os.getenv('RAG_DEDUP_THRESHOLD', '0.8'))
+        if dedup_threshold > 0:
+            # Copies, since the kept chunks gain also_in references
+            return deduplicate_chunks([dict(chunk) for chunk in processed_chunks], dedup_threshold)
+        return processed_chunks
+
+    def store_chunks_locally(self, chunks: Iterable[Dict[str, Any]]) -> bool:
         """Store chunks locally in JSON format."""
         try:
-            processed_chunks = []
-            for chunk in chunks:
-                chunk_id = hashlib.md5(chunk['content'].encode()).hexdigest()
-                processed_chunk = {
-                    'id': chunk_id,
-                    'content': chunk['content'],
-                    'title': chunk['title'],
-                    'section': chunk['section'],
-                    'chunk_id': chunk['chunk_id'],
-                    'type': chunk['type'],
-                    'keywords': self.extract_keywords(chunk['content'])
-                }
-                processed_chunks.append(processed_chunk)
+            processed_chunks = [self.process_chunk(chunk) for chunk in chunks]
+            if not processed_chunks:
+                print("No content extracted from document")
+                return False
             
-            # Save to local JSON file
-            with open(self.processed_chunks_file, 'w', encoding='utf-8') as f:
-                json.dump(processed_chunks, f, ensure_ascii=False, indent=2)
-            
-            print(f"Successfully stored {len(processed_chunks)} chunks locally")
+            self.write_index(self.deduplicate(processed_chunks))
             return True
             
         except Exception as e:
             print(f"Error storing chunks locally: {e}")
             return False
 
-    def process_document(self, file_path: str) -> bool:
-        """Main processing pipeline."""
+    def write_index(self, processed_chunks: List[Dict[str, Any]], dense_index: DenseIndex = None) -> None:
+        """Write the chunks and their search sidecars (see index_writer.write_index)."""
+        write_index(processed_chunks, self.processed_chunks_file, dense_index)
+
+    def process_document(self, file_path: str, reuse_chunks: bool = False) -> bool:
+        """Main processing pipeline.
+
+        With reuse_chunks set, an unchanged document is skipped entirely, and
+        sections whose hash matches the last ingest reuse their recorded chunks
+        instead of being re-chunked. The document is still parsed in full and
+        every sidecar is rebuilt, since they are whole-corpus statistics.
+        """
         print(f"Processing document: {file_path}")
         
         if not os.path.exists(file_path):
             print(f"File not found: {file_path}")
             return False
         
-        # Extract text from DOCX
-        sections = self.extract_text_from_docx(file_path)
-        if not sections:
-            print("No content extracted from document")
-            return False
-        
-        print(f"Extracted {len(sections)} sections")
-        
-        # Create chunks
-        chunks = self.create_chunks(sections)
-        print(f"Created {len(chunks)} chunks")
-        
-        # Store chunks locally
-        success = self.store_chunks_locally(chunks)
+        manifest = IngestManifest(manifest_path(self.processed_chunks_file))
+        fingerprint = IngestManifest.fingerprint(file_path)
+        if reuse_chunks and os.path.exists(self.processed_chunks_file) and manifest.source_unchanged(fingerprint):
+            print(f"Document unchanged since index version {manifest.version}")
+            return True
         
-        return success
+        try:
+            # Paragraphs stream from the DOCX through chunking and keyword
+            # extraction; only the finished chunks are held for the index writes
+            cached = manifest.chunks_by_hash() if reuse_chunks else {}
+            sections = []
+            changed = 0
+            for section in self.extract_text_from_docx(file_path):
+                digest = section_hash(section)
+                chunks = cached.get(digest)
+                if chunks is None:
+                    changed += 1
+                    chunks = [self.process_chunk(chunk) for chunk in self.create_chunks([section])]
+                sections.append({'title': section['title'], 'hash': digest, 'chunks': chunks})
+            
+            # Number chunks across the whole document, as a full rebuild would
+            processed_chunks = []
+            for section in sections:
+                for chunk in section['chunks']:
+                    chunk = dict(chunk, chunk_id=f"{len(processed_chunks)}")
+                    processed_chunks.append(chunk)
+            if not processed_chunks:
+                print("No content extracted from document")
+                return False
+            
+            previous_ids = manifest.chunk_ids()
+            current_ids = {chunk['id'] for chunk in processed_chunks}
+            print(f"Extracted {len(sections)} sections ({changed} new or changed), "
+                  f"created {len(processed_chunks)} chunks "
+                  f"({len(current_ids - previous_ids)} added, {len(previous_ids - current_ids)} removed)")
+            
+            processed_chunks = self.deduplicate(processed_chunks)
+            
+            # Fold new chunks into the existing LSA model; refit once too many have been folded in
+            dense_index = None
+            dense_folded = 0
+            previous_dense = DenseIndex.read(self.processed_chunks_file) if reuse_chunks and dense_retrieval_configured() else None
+            if previous_dense is not None:
+                indexed = set(previous_dense.chunk_ids)
+                folded = manifest.dense_folded + sum(1 for chunk in processed_chunks if chunk['id'] not in indexed)
+                if folded <= self.DENSE_REFIT_SHARE * len(processed_chunks):
+                    dense_index = previous_dense.fold_in(processed_chunks)
+                    dense_folded = folded
+            
+            self.write_index(processed_chunks, dense_index)
+            manifest.save(fingerprint, sections, dense_folded)
+            print(f"Wrote index version {manifest.version}")
+            return True
+            
+        except Exception as e:
+            print(f"Error storing chunks locally: {e}")
+            return False
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python simple_document_processor.py <docx_file_path>")
+    args = sys.argv[1:]
+    reuse_chunks = '--reuse-chunks' in args
+    args = [arg for arg in args if arg != '--reuse-chunks']
+    if len(args) != 1:
+        print("Usage: python simple_document_processor.py [--reuse-chunks] <docx_file_path>")
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args[0]
     processor = SimpleDocumentProcessor()
-    success = processor.process_document(file_path)
+    success = processor.process_document(file_path, reuse_chunks=reuse_chunks)
     
     if success:
         print("Document processing completed successfully")
@@ -71,6 +71,10 @@ export const submitAnswersRequestSchema = z.object({
   treatment: z.string().min(1).max(1000),
 });
 
+export const submitAnswersBatchRequestSchema = z.object({
+  submissions: z.array(submitAnswersRequestSchema).min(1).max(200),
+});
+
 export const caseStudyResponseSchema = z.object({
   id: z.number(),
   sessionId: z.string(),
@@ -119,5 +123,6 @@ export type ChatResponse = z.infer<typeof chatResponseSchema>;
 export type Source = z.infer<typeof sourceSchema>;
 export type GenerateCaseStudyRequest = z.infer<typeof generateCaseStudyRequestSchema>;
 export type SubmitAnswersRequest = z.infer<typeof submitAnswersRequestSchema>;
+export type SubmitAnswersBatchRequest = z.infer<typeof submitAnswersBatchRequestSchema>;
 export type CaseStudyResponse = z.infer<typeof caseStudyResponseSchema>;
 export type CaseStudyResult = z.infer<typeof caseStudyResultSchema>;
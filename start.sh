@@ -6,8 +6,24 @@ echo "Starting Ghana Health AI application..."
 # Install Python dependencies if not already installed
 if [ ! -d ".pythonlibs" ]; then
     echo "Installing Python dependencies..."
-    pip3 install fastapi uvicorn python-docx langchain openai pinecone-client mistralai python-dotenv typing-extensions
+    pip3 install fastapi uvicorn python-docx langchain openai pinecone-client mistralai python-dotenv typing-extensions numpy
 fi
 
+# Rebuild the chunk store if it is missing or older than the chunks it was built from
+if [ server/processed_chunks.bin -ot server/processed_chunks.json ]; then
+    echo "Building chunk store..."
+    python3 server/chunk_store.py build server/processed_chunks.json
+fi
+
+# Dense and hybrid retrieval read embeddings built from the same chunks
+case "${RAG_RETRIEVAL_MODE:-keyword}" in
+    dense|hybrid)
+        if [ server/processed_chunks.dense.npy -ot server/processed_chunks.json ]; then
+            echo "Building dense index..."
+            python3 server/dense_index.py server/processed_chunks.json
+        fi
+        ;;
+esac
+
 # Start the Node.js application
 node dist/index.js
\ No newline at end of file
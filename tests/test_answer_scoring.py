@@ -0,0 +1,60 @@
+from answer_scoring import AnswerPrescorer, ScoreMemo
+
+KEY_DIAGNOSIS = "Uncomplicated malaria"
+KEY_TREATMENT = "Artemether-lumefantrine twice daily for 3 days"
+
+
+def prescore(user_diagnosis, user_treatment):
+    return AnswerPrescorer().prescore(KEY_DIAGNOSIS, KEY_TREATMENT, user_diagnosis, user_treatment)
+
+
+def test_exact_answers_are_decided_high():
+    result = prescore(KEY_DIAGNOSIS, KEY_TREATMENT)
+    assert result is not None
+    assert result['diagnosis_score'] >= AnswerPrescorer.HIGH_SCORE
+    assert result['treatment_score'] >= AnswerPrescorer.HIGH_SCORE
+
+
+def test_blank_answers_score_zero():
+    result = prescore("", "  ")
+    assert result['diagnosis_score'] == 0
+    assert result['treatment_score'] == 0
+
+
+def test_blank_diagnosis_alone_is_not_decided():
+    # A blank diagnosis scores 0, but a partial treatment still needs the LLM
+    assert AnswerPrescorer().score_diagnosis(KEY_DIAGNOSIS, "") == (0, "Diagnosis: no diagnosis was given.")
+    assert prescore("", "Give ACT") is None
+
+
+def test_negated_answers_are_escalated():
+    assert prescore("Not malaria", KEY_TREATMENT) is None
+    assert prescore(KEY_DIAGNOSIS, "No artemether-lumefantrine") is None
+
+
+def test_wrong_drug_is_decided_low():
+    result = prescore(KEY_DIAGNOSIS, "Amoxicillin")
+    assert result is not None
+    assert result['treatment_score'] <= AnswerPrescorer.LOW_SCORE
+    assert "does not match" in result['feedback']
+
+
+def test_drug_class_without_named_drug_is_escalated():
+    assert AnswerPrescorer().score_treatment(KEY_TREATMENT, "Give ACT") is None
+
+
+def test_related_diagnosis_is_escalated():
+    # A low diagnosis may be a related condition worth partial credit
+    assert AnswerPrescorer().score_diagnosis(KEY_DIAGNOSIS, "Typhoid fever") is None
+
+
+def test_score_memo_evicts_least_recently_used():
+    memo = ScoreMemo(max_size=2)
+    keys = [ScoreMemo.key(KEY_DIAGNOSIS, KEY_TREATMENT, answer, "") for answer in ("a", "b", "c")]
+    memo.put(keys[0], {'diagnosis_score': 0})
+    memo.put(keys[1], {'diagnosis_score': 1})
+    assert memo.get(keys[0]) is not None
+    memo.put(keys[2], {'diagnosis_score': 2})
+    assert memo.get(keys[1]) is None
+    assert memo.get(keys[0]) is not None
+    assert memo.stats()['size'] == 2
@@ -0,0 +1,58 @@
+import time
+
+from case_study_pool import CaseStudyPool
+
+
+def make_case(illness="Malaria", n=0):
+    return {
+        "illness": illness,
+        "case_description": f"{illness} case {n}",
+        "correct_diagnosis": illness,
+        "correct_treatment": f"Treatment for {illness}"
+    }
+
+
+def test_claim_serves_unserved_cases_first(tmp_path):
+    pool = CaseStudyPool(str(tmp_path / 'pool.sqlite3'))
+    pool.add(make_case(n=1), seen_by='a')
+    pool.add(make_case(n=2))
+    assert pool.claim('b')['case_description'] == "Malaria case 2"
+    assert pool.stats()['fresh'] == 0
+
+
+def test_claim_never_repeats_a_case_for_a_session(tmp_path):
+    pool = CaseStudyPool(str(tmp_path / 'pool.sqlite3'))
+    pool.add(make_case(n=1), seen_by='a')
+    pool.add(make_case(n=2))
+    assert pool.claim('a')['case_description'] == "Malaria case 2"
+    assert pool.claim('a') is None
+    # Another session may reuse both once they have been served
+    served = {pool.claim('b')['case_description'], pool.claim('b')['case_description']}
+    assert served == {"Malaria case 1", "Malaria case 2"}
+    assert pool.claim('b') is None
+
+
+def test_claim_filters_by_illness(tmp_path):
+    pool = CaseStudyPool(str(tmp_path / 'pool.sqlite3'))
+    pool.add(make_case("Malaria"))
+    pool.add(make_case("Pneumonia"))
+    assert pool.claim('a', 'Pneumonia')['illness'] == "Pneumonia"
+    assert pool.claim('a', 'Pneumonia') is None
+    assert pool.fresh_counts() == {"Malaria": 1}
+
+
+def test_expired_cases_are_dropped(tmp_path):
+    pool = CaseStudyPool(str(tmp_path / 'pool.sqlite3'), max_age_seconds=0.05)
+    pool.add(make_case())
+    time.sleep(0.1)
+    assert pool.claim('a') is None
+    assert pool.stats()['cases'] == 0
+
+
+def test_neediest_picks_the_emptiest_illness(tmp_path):
+    pool = CaseStudyPool(str(tmp_path / 'pool.sqlite3'))
+    pool.add(make_case("Malaria"))
+    pool.add(make_case("Malaria", 1))
+    pool.add(make_case("Pneumonia"))
+    assert pool.neediest(["Malaria", "Pneumonia", "Hypertension"], depth=2) == "Hypertension"
+    assert pool.neediest(["Malaria"], depth=2) is None
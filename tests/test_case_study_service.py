@@ -0,0 +1,85 @@
+import pytest
+
+from case_study_service import CaseStudyGenerator
+
+
+@pytest.fixture
+def generator(monkeypatch, tmp_path):
+    monkeypatch.delenv('MISTRAL_CASE_STUDY_API_KEY', raising=False)
+    monkeypatch.setenv('CASE_STUDY_POOL_PATH', str(tmp_path / 'pool.sqlite3'))
+    monkeypatch.setattr(CaseStudyGenerator, 'load_chunks_data', lambda self: [])
+    generator = CaseStudyGenerator()
+    yield generator
+    generator.llm_executor.shutdown()
+
+
+def submission(id, user_diagnosis, user_treatment="Amoxicillin", correct_diagnosis="Malaria"):
+    return {
+        'id': id,
+        'correct_diagnosis': correct_diagnosis,
+        'correct_treatment': "Artemether-lumefantrine",
+        'user_diagnosis': user_diagnosis,
+        'user_treatment': user_treatment
+    }
+
+
+def test_evaluate_batch_scores_identical_answers_once(generator, monkeypatch):
+    calls = []
+
+    def evaluate_answers(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment):
+        calls.append((correct_diagnosis, user_diagnosis))
+        return {'diagnosis_score': 50, 'treatment_score': 50, 'feedback': '', 'source': 'llm'}
+
+    monkeypatch.setattr(generator, 'evaluate_answers', evaluate_answers)
+    results = generator.evaluate_batch([
+        submission('a', "Malaria"),
+        submission('b', "  malaria "),
+        submission('c', "Typhoid"),
+        submission('d', "Malaria", correct_diagnosis="Pneumonia")
+    ])
+    assert [result['id'] for result in results] == ['a', 'b', 'c', 'd']
+    assert sorted(calls) == [("Malaria", "Malaria"), ("Malaria", "Typhoid"), ("Pneumonia", "Malaria")]
+
+
+def test_evaluate_batch_isolates_failures_to_their_group(generator, monkeypatch):
+    def evaluate_answers(correct_diagnosis, correct_treatment, user_diagnosis, user_treatment):
+        if user_diagnosis == "Typhoid":
+            raise RuntimeError("boom")
+        return {'diagnosis_score': 100, 'treatment_score': 0, 'feedback': '', 'source': 'local'}
+
+    monkeypatch.setattr(generator, 'evaluate_answers', evaluate_answers)
+    results = generator.evaluate_batch([
+        submission('a', "Typhoid"),
+        submission('b', "Malaria"),
+        submission('c', "Typhoid"),
+        {'id': 'd', 'user_diagnosis': "Malaria"}
+    ])
+    assert results[0] == {'id': 'a', 'error': "Evaluation failed: boom"}
+    assert results[2] == {'id': 'c', 'error': "Evaluation failed: boom"}
+    assert results[1]['diagnosis_score'] == 100
+    assert results[3]['id'] == 'd' and 'error' in results[3]
+
+
+
+def test_cases_with_a_fallback_answer_key_are_not_pooled(generator, monkeypatch):
+    def generate(illness, timings):
+        return {
+            "illness": illness,
+            "case_description": f"{illness} case",
+            "correct_diagnosis": illness,
+            "correct_treatment": "Treatment",
+            "source": 'llm',
+            "key_source": key_source
+        }
+
+    monkeypatch.setattr(generator, '_generate_case_study', generate)
+    key_source = 'fallback'
+    assert generator.generate_case_study("Malaria", session_id='a')['key_source'] == 'fallback'
+    assert generator.case_pool.stats()['cases'] == 0
+
+    key_source = 'llm'
+    generator.generate_case_study("Malaria", session_id='a')
+    assert generator.case_pool.stats()['cases'] == 1
+    # Served to another session from the pool, but never back to the first
+    assert generator.generate_case_study("Malaria", session_id='b')['source'] == 'pool'
+    assert generator.generate_case_study("Malaria", session_id='a')['source'] == 'llm'
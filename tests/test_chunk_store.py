@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from chunk_store import ChunkStore, load_chunks, store_path
+from search_index import InvertedIndex
+
+CHUNKS = [
+    {'id': 'a1', 'content': 'Malaria: give Artemether-lumefantrine.', 'title': 'STG', 'section': 'Malaria',
+     'chunk_id': '0', 'type': 'text', 'keywords': ['malaria', 'artemether']},
+    {'id': 'b2', 'content': 'Pneumonia in children: amoxicillin. Ghana café', 'title': 'STG',
+     'section': 'Pneumonia', 'chunk_id': '1', 'type': 'text', 'keywords': ['pneumonia'],
+     'also_in': [{'section': 'Childhood illness', 'chunk_id': '7'}]},
+    {'id': 'c3', 'content': '', 'title': 'STG', 'section': 'Malaria', 'chunk_id': '2', 'type': 'table',
+     'keywords': []}
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'processed_chunks.bin')
+    ChunkStore.write(CHUNKS, path)
+    store = ChunkStore(path)
+    yield store
+    store.close()
+
+
+def test_round_trip(store):
+    assert len(store) == len(CHUNKS)
+    assert list(store) == CHUNKS
+    assert store[-1] == CHUNKS[-1]
+    assert store[0:2] == CHUNKS[0:2]
+    assert store.ids() == ['a1', 'b2', 'c3']
+    assert store.section_id(0) == store.section_id(2)
+    with pytest.raises(IndexError):
+        store[len(CHUNKS)]
+
+
+def test_stored_postings_match_built_index(store):
+    built = InvertedIndex(CHUNKS)
+    loaded = InvertedIndex.load(store)
+    assert loaded.keyword_postings == built.keyword_postings
+    assert loaded.token_postings == built.token_postings
+
+
+def test_load_chunks_prefers_a_fresh_store(tmp_path):
+    chunks_file = str(tmp_path / 'processed_chunks.json')
+    with open(chunks_file, 'w', encoding='utf-8') as f:
+        json.dump(CHUNKS, f)
+    # Missing store: the JSON is read and no store is written
+    assert load_chunks(chunks_file) == CHUNKS
+    assert not os.path.exists(store_path(chunks_file))
+
+    ChunkStore.write(CHUNKS, store_path(chunks_file))
+    chunks = load_chunks(chunks_file)
+    assert isinstance(chunks, ChunkStore)
+    chunks.close()
+
+    # A store older than the JSON is stale
+    stat = os.stat(chunks_file)
+    os.utime(chunks_file, (stat.st_atime, stat.st_mtime + 10))
+    assert isinstance(load_chunks(chunks_file), list)
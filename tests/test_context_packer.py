@@ -0,0 +1,33 @@
+from context_packer import ContextPacker, split_sentences
+
+
+def chunk(section, content):
+    return {'section': section, 'content': content}
+
+
+def test_numeric_near_miss_is_not_deduplicated():
+    packed = ContextPacker(300).pack('paracetamol dose', [
+        chunk('Fever', "Paracetamol dose for adults: 1500 mg daily in divided doses."),
+        chunk('Fever', "Paracetamol dose for children: 500 mg.")
+    ])
+    assert "1500 mg daily" in packed
+    assert packed.endswith("500 mg.")
+
+
+def test_overlapping_sentences_are_packed_once():
+    sentence = "Give artemether-lumefantrine twice daily for 3 days."
+    packed = ContextPacker(300).pack('artemether dose', [
+        chunk('Malaria', "Uncomplicated malaria. " + sentence),
+        chunk('Malaria', sentence + " Review after 3 days.")
+    ])
+    assert packed.count(sentence) == 1
+
+
+def test_budget_is_respected():
+    content = ' '.join(f"Malaria dose line {i} with artemether." for i in range(50))
+    packed = ContextPacker(40).pack('malaria dose', [chunk('Malaria', content)])
+    assert 0 < len(packed) <= 40 * 4 + len('Malaria:\n') + 40
+
+
+def test_split_sentences_keeps_dosage_lines():
+    assert split_sentences("Dose: 10 mg/kg.\nMax 4 doses\nRe") == ["Dose:", "10 mg/kg.", "Max 4 doses"]
@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+from dense_index import NUMPY_AVAILABLE, DenseIndex
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="dense retrieval needs NumPy")
+
+CHUNKS = [
+    {'id': 'a', 'content': "Diarrhoea in children: give oral rehydration salts and zinc."},
+    {'id': 'b', 'content': "Uncomplicated malaria: artemether-lumefantrine twice daily."},
+    {'id': 'c', 'content': "Hypertension: lifestyle advice, then amlodipine."}
+]
+
+
+def test_load_builds_in_memory_without_writing(tmp_path):
+    chunks_file = tmp_path / 'processed_chunks.json'
+    chunks_file.write_text(json.dumps(CHUNKS), encoding='utf-8')
+    index = DenseIndex.load(CHUNKS, str(chunks_file))
+    assert index.search("loose stools diarrhea", 1)[0][0] == 0
+    assert sorted(os.listdir(tmp_path)) == ['processed_chunks.json']
+
+
+def test_load_reads_saved_embeddings_for_the_same_chunks(tmp_path):
+    chunks_file = str(tmp_path / 'processed_chunks.json')
+    DenseIndex.build(CHUNKS).save(chunks_file)
+    assert DenseIndex.read(chunks_file).chunk_ids == ['a', 'b', 'c']
+    assert DenseIndex.load(CHUNKS, chunks_file).chunk_ids == ['a', 'b', 'c']
+    DenseIndex.remove(chunks_file)
+    assert DenseIndex.read(chunks_file) is None
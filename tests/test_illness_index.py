@@ -0,0 +1,35 @@
+import json
+import os
+
+from illness_index import IllnessIndex
+
+CHUNKS = [
+    {'id': 'a', 'section': 'Hypertension', 'content': "Hypertension: start amlodipine."},
+    {'id': 'b', 'section': 'Malaria', 'content': "Uncomplicated malaria: artemether-lumefantrine."},
+    {'id': 'c', 'section': 'Malaria', 'content': "Severe malaria: IV artesunate."}
+]
+ILLNESSES = ["Malaria", "Hypertension"]
+
+
+def chunks_file(tmp_path):
+    path = tmp_path / 'processed_chunks.json'
+    path.write_text(json.dumps(CHUNKS), encoding='utf-8')
+    return str(path)
+
+
+def test_missing_index_ranks_on_demand_without_writing(tmp_path):
+    path = chunks_file(tmp_path)
+    index = IllnessIndex.load(CHUNKS, path, ILLNESSES)
+    assert index.lookup("Hypertension") == [0]
+    assert set(index.lookup("Malaria")) == {1, 2}
+    assert os.listdir(tmp_path) == ['processed_chunks.json']
+
+
+def test_saved_index_is_used_when_it_matches(tmp_path):
+    path = chunks_file(tmp_path)
+    stats = IllnessIndex.build_stats(CHUNKS, ILLNESSES)
+    IllnessIndex.save_stats(stats, IllnessIndex.stats_path(path))
+    assert IllnessIndex.load(CHUNKS, path, ILLNESSES).ranked == stats['ranked']
+    # Built for other illnesses or other chunks: ignored
+    assert IllnessIndex.load(CHUNKS, path, ["Malaria"]).ranked == {}
+    assert IllnessIndex.load(CHUNKS[:2], path, ILLNESSES).ranked == {}
@@ -0,0 +1,56 @@
+import os
+
+from ingest_manifest import IngestManifest, manifest_path, section_hash
+
+SECTIONS = [
+    {'hash': 'h1', 'chunks': [{'id': 'c1', 'content': 'one'}, {'id': 'c2', 'content': 'two'}]},
+    {'hash': 'h2', 'chunks': [{'id': 'c3', 'content': 'three'}]}
+]
+
+
+def saved_manifest(tmp_path):
+    source = tmp_path / 'guidelines.docx'
+    source.write_bytes(b'guidelines v1')
+    manifest = IngestManifest(manifest_path(str(tmp_path / 'processed_chunks.json')))
+    manifest.save(IngestManifest.fingerprint(str(source)), SECTIONS, dense_folded=3)
+    return source, manifest
+
+
+def test_save_round_trips(tmp_path):
+    _, manifest = saved_manifest(tmp_path)
+    loaded = IngestManifest(manifest.path)
+    assert loaded.version == 1
+    assert loaded.dense_folded == 3
+    assert loaded.chunks_by_hash() == {'h1': SECTIONS[0]['chunks'], 'h2': SECTIONS[1]['chunks']}
+    assert loaded.chunk_ids() == {'c1', 'c2', 'c3'}
+    loaded.save(loaded.source, SECTIONS, dense_folded=0)
+    assert IngestManifest(manifest.path).version == 2
+
+
+def test_missing_manifest_is_empty(tmp_path):
+    manifest = IngestManifest(str(tmp_path / 'missing.json'))
+    assert manifest.version == 0
+    assert manifest.chunks_by_hash() == {}
+    assert not manifest.source_unchanged({'path': 'x', 'size': 0, 'mtime': 0})
+
+
+def test_source_unchanged_hashes_touched_files(tmp_path):
+    source, manifest = saved_manifest(tmp_path)
+    assert manifest.source_unchanged(IngestManifest.fingerprint(str(source)))
+
+    stat = source.stat()
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+    assert manifest.source_unchanged(IngestManifest.fingerprint(str(source)))
+
+    source.write_bytes(b'guidelines v2')
+    os.utime(source, (stat.st_atime, stat.st_mtime + 20))
+    assert not manifest.source_unchanged(IngestManifest.fingerprint(str(source)))
+
+    source.write_bytes(b'guidelines v10')
+    assert not manifest.source_unchanged(IngestManifest.fingerprint(str(source)))
+
+
+def test_section_hash_depends_on_content():
+    section = {'title': 'Malaria', 'content': 'Give artemether-lumefantrine'}
+    assert section_hash(section) == section_hash(dict(section))
+    assert section_hash(section) != section_hash(dict(section, content='Give amoxicillin'))
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+from mistralai.exceptions import MistralAPIException, MistralException
+
+from llm_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LLMClient, is_retryable
+
+
+class FakeClient:
+    """Stands in for MistralClient, raising the queued errors before answering."""
+
+    def __init__(self, errors=(), delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+
+    def chat(self, model, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'response'
+
+
+def make_client(fake, threshold=5, cooldown=30.0, deadline=2.0, max_retries=2):
+    client = LLMClient('test-key', deadline=deadline, max_retries=max_retries, backoff_base=0.001,
+                       breaker=CircuitBreaker(threshold=threshold, cooldown=cooldown))
+    client.client = fake
+    return client
+
+
+def api_error(status):
+    return MistralAPIException(f"HTTP {status}", http_status=status)
+
+
+def test_upstream_errors_are_retryable():
+    assert is_retryable(MistralException("ReadTimeout"))
+    assert is_retryable(api_error(429))
+    assert is_retryable(api_error(501))
+    assert not is_retryable(api_error(400))
+    assert not is_retryable(ValueError("bad argument"))
+
+
+def test_retries_upstream_failures_until_success():
+    fake = FakeClient([MistralException("RemoteProtocolError"), api_error(503)])
+    client = make_client(fake)
+    assert client.chat('model', []) == 'response'
+    assert fake.calls == 3
+    assert client.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries_and_counts_a_failure():
+    fake = FakeClient([MistralException("connection reset")] * 3)
+    client = make_client(fake)
+    with pytest.raises(MistralException):
+        client.chat('model', [])
+    assert fake.calls == 3
+    assert client.breaker.failures == 1
+
+
+def test_client_errors_are_not_retried_and_leave_the_breaker_alone():
+    client = make_client(FakeClient([api_error(503)]), max_retries=0)
+    with pytest.raises(MistralAPIException):
+        client.chat('model', [])
+    client.client = FakeClient([api_error(400)])
+    with pytest.raises(MistralAPIException):
+        client.chat('model', [])
+    assert client.client.calls == 1
+    assert client.breaker.failures == 1
+
+
+def test_deadline_bounds_a_stalled_call():
+    client = make_client(FakeClient(delay=1.0), deadline=0.1, max_retries=0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client.chat('model', [])
+    assert time.monotonic() - started < 0.5
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    fake = FakeClient([api_error(502)] * 2)
+    client = make_client(fake, threshold=2, cooldown=0.1, max_retries=0)
+    for _ in range(2):
+        with pytest.raises(MistralAPIException):
+            client.chat('model', [])
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.chat('model', [])
+    assert fake.calls == 2
+
+    time.sleep(0.15)
+    assert client.breaker.state == 'half-open'
+    assert client.breaker.allow()
+    # Only one trial call at a time while half-open
+    assert not client.breaker.allow()
+    client.breaker.release_trial()
+    assert client.chat('model', []) == 'response'
+    assert client.breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_breaker():
+    client = make_client(FakeClient([api_error(500)] * 2), threshold=1, cooldown=0.1, max_retries=0)
+    with pytest.raises(MistralAPIException):
+        client.chat('model', [])
+    time.sleep(0.15)
+    with pytest.raises(MistralAPIException):
+        client.chat('model', [])
+    assert client.breaker.state == 'open'
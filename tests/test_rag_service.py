@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chunk_store import ChunkStore, store_path
+from rag_service import RAGService
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.delenv('MISTRAL_API_KEY', raising=False)
+
+    def make_service(**kwargs):
+        kwargs.setdefault('retrieval_mode', 'keyword')
+        kwargs.setdefault('section_candidates', 0)
+        kwargs.setdefault('correct_typos', False)
+        kwargs.setdefault('match_phrases', False)
+        return RAGService(**kwargs)
+
+    return make_service
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'data', 'keyword_rankings.jsonl')
+
+
+def test_keyword_rankings_match_the_original_scan(make_service):
+    # Recorded with the linear keyword scan the inverted index replaced
+    service = make_service()
+    with open(BASELINE, encoding='utf-8') as f:
+        for line in f:
+            expected = json.loads(line)
+            ranking = service.retrieve_relevant_chunks(expected['query'])
+            assert [[chunk['id'], chunk['score']] for chunk in ranking] == expected['ranking'], expected['query']
+
+
+def test_query_cache_hits_once_per_distinct_query(make_service):
+    service = make_service()
+    first = service.retrieve_relevant_chunks("malaria treatment in children")
+    assert service.query_cache.stats() == {'hits': 0, 'misses': 1, 'size': 1}
+    # Word order and stopwords do not change the key
+    assert service.retrieve_relevant_chunks("children with malaria treatment") == first
+    assert service.query_cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+    service.retrieve_relevant_chunks("malaria treatment in adults")
+    assert service.query_cache.stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_typos_are_corrected_before_ranking(make_service):
+    service = make_service(correct_typos=True)
+    corrected, corrections = service.correct_query("malria treatmnet in childern")
+    assert corrected == "malaria treatment in children"
+    assert corrections == {'malria': 'malaria', 'treatmnet': 'treatment', 'childern': 'children'}
+    assert service.retrieve_relevant_chunks("malria treatmnet in childern") == \
+        service.retrieve_relevant_chunks("malaria treatment in children")
+
+
+def test_quoted_phrase_restricts_results(make_service):
+    def contains_phrase(chunk):
+        return "oral rehydration" in ' '.join(chunk['content'].lower().split())
+
+    service = make_service(match_phrases=True)
+    unquoted = service.retrieve_relevant_chunks("oral rehydration for diarrhoea")
+    assert not all(contains_phrase(chunk) for chunk in unquoted)
+    quoted = service.retrieve_relevant_chunks('"oral rehydration" for diarrhoea')
+    assert quoted and all(contains_phrase(chunk) for chunk in quoted)
+
+
+def test_section_pruning_terms_are_part_of_the_cache_key(make_service):
+    # The extra terms are dropped by the keyword extractor but move the section pruning
+    query = "treatment of anaemia in pregnancy iron"
+    service = make_service(section_candidates=3)
+    service.retrieve_relevant_chunks(query)
+    cached = service.retrieve_relevant_chunks(query + " hiv art")
+    assert service.query_cache.stats()['hits'] == 0
+    assert cached == make_service(section_candidates=3).retrieve_relevant_chunks(query + " hiv art")
+
+
+def write_corpus(path, chunks):
+    path.write_text(json.dumps(chunks), encoding='utf-8')
+    ChunkStore.write(chunks, store_path(str(path)))
+
+
+def corpus(label):
+    return [{'id': f'{label}{i}', 'content': f"Malaria treatment {label} line {i}", 'title': 'STG',
+             'section': 'Malaria', 'chunk_id': str(i), 'type': 'text', 'keywords': ['malaria']}
+            for i in range(3)]
+
+
+@pytest.fixture
+def local_service(make_service, tmp_path):
+    chunks_file = tmp_path / 'processed_chunks.json'
+    write_corpus(chunks_file, corpus('old'))
+    service = make_service()
+    service.chunks_file = str(chunks_file)
+    service.reload_chunks()
+    return service, chunks_file
+
+
+def rewrite(chunks_file, label):
+    write_corpus(chunks_file, corpus(label))
+    # Make the change visible even on filesystems with coarse mtimes
+    later = time.time() + 5
+    os.utime(chunks_file, (later, later))
+    os.utime(store_path(str(chunks_file)), (later, later))
+
+
+def test_concurrent_requests_reload_once(local_service, monkeypatch):
+    service, chunks_file = local_service
+    loads = []
+    load_chunks_data = service.load_chunks_data
+
+    def slow_load():
+        loads.append(threading.get_ident())
+        time.sleep(0.05)
+        return load_chunks_data()
+
+    monkeypatch.setattr(service, 'load_chunks_data', slow_load)
+    rewrite(chunks_file, 'new')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: service.retrieve_relevant_chunks("malaria treatment"), range(8)))
+    assert len(loads) == 1
+    assert all(result[0]['id'].startswith('new') for result in results)
+
+
+def test_request_keeps_its_snapshot_across_a_reload(local_service):
+    service, chunks_file = local_service
+    with service._pinned_snapshot():
+        old_chunks = service.chunks_data
+        rewrite(chunks_file, 'new')
+        service.reload_chunks()
+        # The old store stays readable for the request that still holds it
+        assert service.chunks_data is old_chunks
+        assert old_chunks[0]['id'] == 'old0'
+    assert service.chunks_data[0]['id'] == 'new0'
+    assert service.retrieve_relevant_chunks("malaria treatment")[0]['id'].startswith('new')